@@ -0,0 +1,307 @@
+"""
+Host benchmark for the rotary quadrature decoder.
+
+Replays a CLK/DT edge trace at increasing step rates through a simple
+interrupt model and reports the highest rate at which every detent is
+decoded, for the current decoder (src/rotary.py) and the previous
+list-table decoder (kept below as LegacyRotary).
+
+Interrupt model: every edge requests the IRQ. If the handler is still
+running when more edges arrive, it runs once more when it finishes
+(the pending bit of the GPIO interrupt) and reads the pins at that
+moment, so intermediate edges are lost. The handler cost is the
+measured host cost per call times --slowdown, an estimate of how much
+slower the interpreter is on the ESP32; use --cost-us to give measured
+on-device costs instead. On the host the native decorator is
+not available, so the comparison shows the effect of the table layout,
+the early exit and the precomputed range handling only.
+
+Usage:
+    python3 benchmarks/bench_rotary.py [--trace FILE] [--slowdown 50]
+
+A trace file has one edge per line: "time_us clk dt", recorded at any
+speed; it is rescaled to each test rate. Without --trace a synthetic
+trace with contact bounce is generated.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+_micropython = types.ModuleType('micropython')
+_micropython.const = lambda value: value
+_micropython.native = lambda function: function
+sys.modules.setdefault('micropython', _micropython)
+
+import rotary  # noqa: E402
+
+
+CW_STEP = (2, 0, 1, 3)
+CCW_STEP = (1, 0, 2, 3)
+
+
+class PinsMixin:
+    pins = 3
+
+    def _hal_get_clk_value(self):
+        return self.pins >> 1
+
+    def _hal_get_dt_value(self):
+        return self.pins & 1
+
+    def _hal_enable_irq(self):
+        pass
+
+    def _hal_disable_irq(self):
+        pass
+
+
+class CurrentRotary(PinsMixin, rotary.Rotary):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Previous decoder: list-of-lists tables, range mode branches in the IRQ
+# ---------------------------------------------------------------------------
+_DIR_CW = 0x10
+_DIR_CCW = 0x20
+_legacy_table = [
+    [0x0, 0x4, 0x1, 0x0],
+    [0x2, 0x0, 0x1, 0x0],
+    [0x2, 0x3, 0x1, 0x0],
+    [0x2, 0x3, 0x0, 0x0 | _DIR_CW],
+    [0x5, 0x4, 0x0, 0x0],
+    [0x5, 0x4, 0x6, 0x0],
+    [0x5, 0x0, 0x6, 0x0 | _DIR_CCW],
+    [0x0, 0x0, 0x0, 0x0]]
+
+
+class LegacyRotary(PinsMixin):
+    RANGE_UNBOUNDED = 1
+    RANGE_WRAP = 2
+    RANGE_BOUNDED = 3
+
+    def __init__(self, min_val, max_val, incr, reverse, range_mode):
+        self._min_val = min_val
+        self._max_val = max_val
+        self._incr = incr
+        self._reverse = -1 if reverse else 1
+        self._range_mode = range_mode
+        self._value = min_val
+        self._state = 0
+        self._half_step = False
+        self._invert = False
+        self._listener = []
+
+    def add_listener(self, l):
+        self._listener.append(l)
+
+    def _process_rotary_pins(self, pin):
+        old_value = self._value
+        clk_dt_pins = (self._hal_get_clk_value() << 1) | self._hal_get_dt_value()
+        if self._invert:
+            clk_dt_pins = ~clk_dt_pins & 0x03
+        self._state = _legacy_table[self._state & 0x07][clk_dt_pins]
+        direction = self._state & 0x30
+        incr = 0
+        if direction == _DIR_CW:
+            incr = self._incr
+        elif direction == _DIR_CCW:
+            incr = -self._incr
+        incr *= self._reverse
+        if self._range_mode == self.RANGE_WRAP:
+            value = self._value + incr
+            span = self._max_val - self._min_val + 1
+            self._value = self._min_val + (value - self._min_val) % span
+        elif self._range_mode == self.RANGE_BOUNDED:
+            self._value = min(self._max_val, max(self._min_val, self._value + incr))
+        else:
+            self._value = self._value + incr
+        try:
+            if old_value != self._value and len(self._listener) != 0:
+                for listener in self._listener:
+                    listener(self._value)
+        except:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Traces and replay
+# ---------------------------------------------------------------------------
+def synthetic_trace(detents=200, bounce=0.3, seed=1):
+    """One detent per 1000 us, first half clockwise, second half back. Returns (edges, cw, ccw)."""
+    rnd = random.Random(seed)
+    edges = []
+    t = 0
+    levels = 3
+    for i in range(detents):
+        sequence = CW_STEP if i < detents // 2 else CCW_STEP
+        for pins in sequence:
+            t += 250
+            if rnd.random() < bounce:
+                # the changing contact chatters for a few microseconds
+                edges.append((t, pins >> 1, pins & 1))
+                edges.append((t + 3, levels >> 1, levels & 1))
+                t += 6
+            edges.append((t, pins >> 1, pins & 1))
+            levels = pins
+    return edges, detents // 2, detents - detents // 2
+
+
+def load_trace(path):
+    """Load "time_us clk dt" lines; the expected steps are decoded at a slow rate."""
+    edges = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                t, clk, dt = line.split()
+                edges.append((float(t), int(clk), int(dt)))
+    return edges
+
+
+def make_decoders():
+    current = CurrentRotary(0, 0, 1, False, rotary.Rotary.RANGE_UNBOUNDED, False, False)
+    legacy = LegacyRotary(0, 0, 1, False, LegacyRotary.RANGE_UNBOUNDED)
+    return {'legacy': legacy, 'current': current}
+
+
+def count_steps(decoder):
+    counts = {'cw': 0, 'ccw': 0, 'last': decoder.value() if hasattr(decoder, 'value') else decoder._value}
+
+    def listener(value, delta=None):
+        if value > counts['last']:
+            counts['cw'] += 1
+        else:
+            counts['ccw'] += 1
+        counts['last'] = value
+
+    decoder.add_listener(listener)
+    return counts
+
+
+def replay(decoder, edges, time_scale, cost_us):
+    """Run edges through the interrupt model. time_scale < 1 compresses the trace."""
+    busy_until = -1.0
+    pending = False
+    levels = 3
+
+    def run(at):
+        decoder.pins = levels
+        decoder._process_rotary_pins(None)
+        return at + cost_us
+
+    for t, clk, dt in edges:
+        t *= time_scale
+        while pending and busy_until <= t:
+            pending = False
+            busy_until = run(busy_until)
+        levels = (clk << 1) | dt
+        if t >= busy_until:
+            busy_until = run(t)
+        else:
+            pending = True
+    while pending:
+        pending = False
+        busy_until = run(busy_until)
+
+
+def measure_cost_ns(factory, edges, rounds=100, repeats=5):
+    """Best-of-repeats mean handler cost per edge on this host."""
+    best = None
+    for _ in range(repeats):
+        decoder = factory()
+        start = time.perf_counter_ns()
+        for _ in range(rounds):
+            for _, clk, dt in edges:
+                decoder.pins = (clk << 1) | dt
+                decoder._process_rotary_pins(None)
+        cost = (time.perf_counter_ns() - start) / (rounds * len(edges))
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def decodes_all(name, edges, nominal_rate, rate, cost_us, cw, ccw):
+    decoder = make_decoders()[name]
+    counts = count_steps(decoder)
+    replay(decoder, edges, nominal_rate / rate, cost_us)
+    return counts['cw'] == cw and counts['ccw'] == ccw, counts['cw'] + counts['ccw']
+
+
+def max_lossless_rate(name, edges, nominal_rate, cost_us, cw, ccw, low=10.0, high=200000.0):
+    """Bisect for the highest rate (within 1 %) that decodes every detent."""
+    if not decodes_all(name, edges, nominal_rate, low, cost_us, cw, ccw)[0]:
+        return 0.0
+    while high / low > 1.01:
+        mid = (low * high) ** 0.5
+        if decodes_all(name, edges, nominal_rate, mid, cost_us, cw, ccw)[0]:
+            low = mid
+        else:
+            high = mid
+    return low
+
+
+def expected_steps(edges):
+    decoder = make_decoders()['current']
+    counts = count_steps(decoder)
+    replay(decoder, edges, 1.0, 0)
+    return counts['cw'], counts['ccw']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--trace', help='edge trace file ("time_us clk dt" per line)')
+    parser.add_argument('--slowdown', type=float, default=50.0,
+                        help='device/host interpreter speed ratio applied to measured costs')
+    parser.add_argument('--cost-us', type=float, nargs=2, metavar=('LEGACY', 'CURRENT'),
+                        help='use these per-edge handler costs instead of measuring')
+    args = parser.parse_args()
+
+    if args.trace:
+        edges = load_trace(args.trace)
+        cw, ccw = expected_steps(edges)
+    else:
+        edges, cw, ccw = synthetic_trace()
+    duration_us = edges[-1][0] - edges[0][0]
+    detents = cw + ccw
+    nominal_rate = detents / (duration_us / 1e6)
+
+    if args.cost_us:
+        costs = {'legacy': args.cost_us[0], 'current': args.cost_us[1]}
+    else:
+        costs = {
+            name: measure_cost_ns(lambda name=name: make_decoders()[name], edges) / 1000 * args.slowdown
+            for name in ('legacy', 'current')
+        }
+
+    print(f"trace: {len(edges)} edges, {detents} detents ({cw} cw, {ccw} ccw)")
+    for name in ('legacy', 'current'):
+        print(f"handler cost {name:>7}: {costs[name]:.1f} us per edge (modelled)")
+    print()
+    print(f"{'steps/s':>8}  {'legacy':>10}  {'current':>10}")
+
+    rate = 100.0
+    while rate <= 50000:
+        row = []
+        for name in ('legacy', 'current'):
+            ok, decoded = decodes_all(name, edges, nominal_rate, rate, costs[name], cw, ccw)
+            row.append(f"{decoded:>4}/{detents}{'  ' if ok else ' !'}")
+        print(f"{rate:>8.0f}  {row[0]:>10}  {row[1]:>10}")
+        rate *= 1.5
+
+    print()
+    best = {}
+    for name in ('legacy', 'current'):
+        best[name] = max_lossless_rate(name, edges, nominal_rate, costs[name], cw, ccw)
+        print(f"max lossless rate {name:>7}: {best[name]:.0f} steps/s")
+    if best['legacy']:
+        print(f"speedup: {best['current'] / best['legacy']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
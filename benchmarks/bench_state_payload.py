@@ -0,0 +1,76 @@
+"""
+Parse time and heap churn of the msb/state payload formats.
+
+Compares json.loads on the JSON payload with state_codec.decode_state on
+the 4-byte binary payload. Runs on the host and on the device:
+
+    python3 benchmarks/bench_state_payload.py
+    mpremote run benchmarks/bench_state_payload.py   (with src/ on the device)
+
+On MicroPython the allocation column is gc.mem_alloc() growth per parse
+with the collector disabled; on CPython it is the tracemalloc peak per
+parse, which is a rough stand-in.
+"""
+
+import gc
+import json
+import sys
+import time
+
+try:
+    sys.path.insert(0, __file__.rsplit('/', 2)[0] + '/src')
+except NameError:
+    pass
+
+from state_codec import decode_state, encode_state  # noqa: E402
+
+STATE = {"open": True, "openUntil": "22:30"}
+ITERATIONS = 2000
+
+
+def _ticks_us():
+    if hasattr(time, 'ticks_us'):
+        return time.ticks_us()
+    return time.perf_counter_ns() // 1000
+
+
+def measure_time_us(parse, payload):
+    start = _ticks_us()
+    for _ in range(ITERATIONS):
+        parse(payload)
+    return (_ticks_us() - start) / ITERATIONS
+
+
+def measure_alloc_bytes(parse, payload):
+    if hasattr(gc, 'mem_alloc'):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for _ in range(100):
+            parse(payload)
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used / 100
+    import tracemalloc
+    tracemalloc.start()
+    parse(payload)
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    parse(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+
+def main():
+    payloads = (
+        ("json", json.loads, json.dumps(STATE).encode()),
+        ("binary", decode_state, encode_state(STATE)),
+    )
+    print("format   bytes   us/parse   bytes allocated/parse")
+    for name, parse, payload in payloads:
+        print("{:8s} {:5d} {:10.2f} {:12.0f}".format(
+            name, len(payload), measure_time_us(parse, payload), measure_alloc_bytes(parse, payload)))
+
+
+main()
@@ -0,0 +1,189 @@
+import time
+
+import logger
+from event_queue import EVT_BUTTON, EVT_ROTARY
+from time_slots import ClosingTimeSlots
+from timezone import TimeZone, CENTRAL_EUROPE
+
+
+# Local time zone used for the clock and the closing time picker
+zone = TimeZone(CENTRAL_EUROPE)
+# Closing times offered for rotary counters 0..80
+slots = ClosingTimeSlots(zone)
+
+
+def set_timezone(rule):
+    """Switch the local time zone to a POSIX TZ rule, e.g. "EST5EDT,M3.2.0,M11.1.0"."""
+    global zone, slots
+    zone = TimeZone(rule)
+    slots = ClosingTimeSlots(zone)
+
+
+def time_from_counter(counter):
+    """Return the "HH:MM" closing time selected by the rotary counter."""
+    return slots.lookup(counter)
+
+
+def getTimeString():
+    return zone.hhmm()
+
+
+class App:
+    """
+    Application state shared by the blocking (main.py) and asyncio
+    (main_async.py) entry points.
+
+    Modes: 'normal', 'setting time', 'requestSent', 'screensaver'.
+    Input and MQTT callbacks only change state; update() handles the
+    timeouts and render() draws the current mode.
+
+    With a StateStore a click shows the new closing time at once and
+    returns to 'normal'; the store confirms or rolls it back later.
+    """
+
+    ACTION_TIMEOUT = 5  # seconds before 'setting time' falls back to normal
+    STATUS_LOG_INTERVAL = 60  # Log status every 60 seconds
+
+    def __init__(self, display, mqtt_service, rotary, send_time, screensaver_timeout=300, state_store=None):
+        self.display = display
+        self.mqtt_service = mqtt_service
+        self.state_store = state_store
+        # Source of the displayed state: the store overlays pending requests
+        self.states = state_store if state_store is not None else mqtt_service
+        self.rotary = rotary
+        self.send_time = send_time
+        self.screensaver_timeout = screensaver_timeout
+
+        self.mode = 'normal'
+        self.last_action = None
+        self.last_activity = time.time()  # Track last user activity for screensaver
+        self.screensaver_frame = 0
+        self.selected_time_string = ""
+        self.counter = 0
+        self.last_logged_mode = None
+        self.last_status_log = 0
+        self.last_drawn = None  # what the display currently shows, see render()
+        self.skipped_frames = 0
+
+    def rotary_turned(self, value, delta=None):
+        self.last_activity = time.time()  # Reset screensaver timer
+        logger.debug("ROTARY", f"Rotary turned, value={value}, current mode={self.mode}")
+        if self.mode == 'screensaver':
+            logger.info("MODE", "Exiting screensaver via rotary")
+            self.mode = 'normal'
+            return
+        self.mode = 'setting time'
+        self.last_action = time.time()
+        self.select_time(value)
+        logger.debug("ROTARY", f"Mode changed to 'setting time'")
+
+    def button_clicked(self):
+        self.last_activity = time.time()  # Reset screensaver timer
+        logger.debug("BUTTON", f"Button clicked, current mode={self.mode}")
+        if self.mode == 'screensaver':
+            logger.info("MODE", "Exiting screensaver via button")
+            self.mode = 'normal'
+            return
+        if self.mode != 'setting time':
+            logger.debug("BUTTON", f"Ignoring click - not in 'setting time' mode")
+            return
+        self.counter += 1
+        logger.info("BUTTON", f"Setting time to {self.selected_time_string}")
+        self.send_time(self.selected_time_string)
+        if self.state_store is not None:
+            # The next frame shows the requested time, no message needed
+            self.state_store.request(self.selected_time_string)
+            self.last_action = None
+            self.mode = 'normal'
+            self.rotary.reset()  # the next turn starts from the first slot again
+            return
+        self.display.message('setting time until ' + self.selected_time_string)
+        self.mode = 'requestSent'
+        logger.debug("MODE", "Mode changed to 'requestSent'")
+
+    def mqtt_status_changed(self, status=None):
+        logger.info("MQTT", f"Status changed: {status}")
+        if self.mode == 'requestSent':
+            logger.info("MODE", "Request confirmed, returning to normal mode")
+            self.mode = 'normal'
+
+    def request_finished(self, time_string, ok, status=None):
+        """Completion of a closing time request (RequestWorker listener)."""
+        if ok:
+            logger.info("API", f"Closing time {time_string} accepted")
+            return
+        logger.error("API", f"Setting closing time {time_string} failed ({status})")
+        if self.state_store is not None:
+            self.state_store.rollback(time_string)
+        if self.mode == 'requestSent':
+            self.mode = 'normal'  # no MQTT confirmation will come
+
+    def handle_event(self, code, arg):
+        """Dispatch an input event drained from the EventQueue."""
+        if code == EVT_ROTARY:
+            self.rotary_turned(arg)
+        elif code == EVT_BUTTON:
+            self.button_clicked()
+
+    def select_time(self, counter):
+        self.selected_time_string = time_from_counter(counter)
+        logger.debug("TIME", f"Selected time string: {self.selected_time_string}")
+        return self.selected_time_string
+
+    def update(self):
+        """Apply timeouts and screensaver activation. Call once per frame."""
+        if self.state_store is not None:
+            self.state_store.poll()  # rolls back unconfirmed closing times
+        now = time.time()
+        if self.last_action is not None and self.last_action + self.ACTION_TIMEOUT < now:
+            self.last_action = None
+            logger.debug("MODE", "Timeout - returning to normal mode")
+            self.mode = 'normal'
+            self.rotary.reset()
+
+        # Check for screensaver activation
+        if self.mode == 'normal' and now - self.last_activity > self.screensaver_timeout:
+            logger.info("MODE", "Activating screensaver after inactivity")
+            self.mode = 'screensaver'
+            self.screensaver_frame = 0  # Reset animation
+
+        # Log mode changes
+        if self.mode != self.last_logged_mode:
+            logger.info("MODE", f"Mode: {self.mode}")
+            self.last_logged_mode = self.mode
+
+    def invalidate(self):
+        """Force a redraw after something else drew on the display."""
+        self.last_drawn = None
+
+    def render(self):
+        status = self.states.get_state()
+
+        # Periodic status logging (every 60 seconds in normal mode)
+        current_time = time.time()
+        if self.mode == 'normal' and current_time - self.last_status_log > self.STATUS_LOG_INTERVAL:
+            logger.debug("STATUS", f"Time: {getTimeString()}, MQTT status: {status}")
+            self.last_status_log = current_time
+
+        if self.mode == 'screensaver':
+            self.display.screensaver(self.screensaver_frame, status)
+            self.screensaver_frame += 1
+            self.last_drawn = None
+            return
+
+        # Static screens are only redrawn when their content changes
+        if self.mode == 'normal':
+            drawn = (self.mode, getTimeString(), self.states.get_state_version())
+        else:
+            drawn = (self.mode, self.selected_time_string)
+        if drawn == self.last_drawn:
+            self.skipped_frames += 1
+            return
+        self.last_drawn = drawn
+
+        if self.mode == 'normal':
+            self.display.status(drawn[1], status)
+        elif self.mode == 'requestSent':
+            self.display.message('setting time until ' + self.selected_time_string)
+        else:
+            self.display.selectTime(self.selected_time_string)
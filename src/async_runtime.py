@@ -0,0 +1,137 @@
+"""
+Cooperative runtime: WiFi supervision, MQTT, API requests, rendering and
+input run as concurrent asyncio tasks so the display keeps updating and
+input keeps working while the network reconnects.
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+import logger
+
+
+class AsyncRuntime:
+
+    RENDER_INTERVAL = 0.05  # seconds between frames
+    INPUT_INTERVAL = 0.01  # seconds between input polls
+    TIME_SYNC_INTERVAL = 0.1  # seconds between time sync polls
+    COMMAND_INTERVAL = 0.05  # seconds between closing time command polls
+
+    def __init__(self, app, wifi_manager, mqtt_service, state_manager, button=None, rotary=None, events=None,
+                 time_sync=None, time_command=None):
+        self.app = app
+        self.wifi_manager = wifi_manager
+        self.mqtt_service = mqtt_service
+        self.state_manager = state_manager
+        self.button = button
+        self.rotary = rotary
+        self.events = events
+        self.time_sync = time_sync
+        self.time_command = time_command
+        self.tasks = []
+        self.pending_requests = []
+        self.frames = 0
+        self._stop = asyncio.Event()
+        self._last_rotary = rotary.value() if rotary is not None else None
+        self._last_presses = button.button_press_count if button is not None else 0
+
+    def send_time(self, time_string):
+        """Used as App.send_time: schedules the API request and returns at once."""
+        self.submit(self.state_manager.sendTimeAsync(time_string))
+
+    def submit(self, coro):
+        task = asyncio.create_task(coro)
+        self.pending_requests.append(task)
+        self.pending_requests = [t for t in self.pending_requests if not t.done()]
+        return task
+
+    async def render_task(self):
+        while True:
+            try:
+                self._update_app()
+                self.app.render()
+                self.frames += 1
+            except Exception as e:
+                logger.error("MAIN", f"Render failed: {e}")
+            await asyncio.sleep(self.RENDER_INTERVAL)
+
+    async def input_task(self):
+        """Hand input to the app outside of the IRQ: drain the event queue, or poll the drivers."""
+        while True:
+            if self.button is not None:
+                self.button.poll()
+            if self.rotary is not None:
+                self.rotary.poll()
+            if self.events is not None:
+                self.events.drain(self.app.handle_event)
+                if self.events.new_overflows():
+                    logger.warn("INPUT", f"Event queue overflowed, {self.events.overflows} events dropped in total")
+            else:
+                self._poll_drivers()
+            await asyncio.sleep(self.INPUT_INTERVAL)
+
+    async def time_sync_task(self):
+        while True:
+            try:
+                self.time_sync.poll(self.wifi_manager.is_connected())
+            except Exception as e:
+                logger.error("NTP", f"Time sync failed: {e}")
+            await asyncio.sleep(self.TIME_SYNC_INTERVAL)
+
+    async def time_command_task(self):
+        while True:
+            try:
+                self.time_command.poll()
+            except Exception as e:
+                logger.error("API", f"Command poll failed: {e}")
+            await asyncio.sleep(self.COMMAND_INTERVAL)
+
+    def _poll_drivers(self):
+        if self.rotary is not None:
+            value = self.rotary.value()
+            if value != self._last_rotary:
+                self._last_rotary = value
+                self.app.rotary_turned(value)
+        if self.button is not None:
+            presses = self.button.button_press_count
+            if presses != self._last_presses:
+                self._last_presses = presses
+                self.app.button_clicked()
+
+    def _update_app(self):
+        if self.rotary is None:
+            self.app.update()
+            return
+        before = self.rotary.value()
+        self.app.update()
+        after = self.rotary.value()
+        # App.update() may reset the encoder; that is not user input
+        if after != before:
+            self._last_rotary = after
+
+    def start(self):
+        self.tasks = [
+            asyncio.create_task(self.wifi_manager.supervise()),
+            asyncio.create_task(self.mqtt_service.supervise(self.wifi_manager.is_connected)),
+            asyncio.create_task(self.render_task()),
+            asyncio.create_task(self.input_task()),
+        ]
+        if self.time_sync is not None:
+            self.tasks.append(asyncio.create_task(self.time_sync_task()))
+        if self.time_command is not None:
+            self.tasks.append(asyncio.create_task(self.time_command_task()))
+
+    def stop(self):
+        self._stop.set()
+
+    async def run(self):
+        logger.info("MAIN", "Starting async runtime")
+        self.start()
+        await self._stop.wait()
+        for task in self.tasks + self.pending_requests:
+            task.cancel()
+        self.tasks = []
+        self.pending_requests = []
+        logger.info("MAIN", "Async runtime stopped")
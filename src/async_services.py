@@ -0,0 +1,84 @@
+"""
+asyncio variants of the WiFi, MQTT and API services.
+
+Each class keeps the behaviour of its blocking parent but replaces the
+waits with awaits, so the other tasks of AsyncRuntime keep running
+while a service connects or waits for the network.
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from http_client import split_url
+import logger
+from mqtt_service import MQTTService
+from state_manager import StateManager
+from wifi_manager import WifiManager
+
+
+class AsyncWifiManager(WifiManager):
+
+    POLL_INTERVAL = 0.5  # seconds between supervision steps while connecting
+    CHECK_INTERVAL = 2  # seconds between link checks while connected
+
+    async def supervise(self):
+        """Keep the station connected. Runs forever."""
+        while True:
+            self.poll()
+            connected = self.step == self.WIFI_CONNECTED
+            await asyncio.sleep(self.CHECK_INTERVAL if connected else self.POLL_INTERVAL)
+
+
+class AsyncMQTTService(MQTTService):
+
+    POLL_INTERVAL = 0.05  # seconds between check_msg() calls
+
+    async def supervise(self, is_online):
+        """
+        Poll for messages and reconnect with backoff. Runs forever.
+        is_online() gates all network access so nothing is attempted
+        while WiFi is down.
+        """
+        while True:
+            if is_online():
+                self.check_msg()
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+
+class AsyncStateManager(StateManager):
+
+    REQUEST_TIMEOUT = 10  # seconds for the whole request
+
+    async def sendTimeAsync(self, time):
+        """Send the closing time without blocking. Returns the HTTP status or None."""
+        url = self.time_url + time
+        logger.debug("API", f"Sending request: {url}")
+        try:
+            status = await asyncio.wait_for(self._get(url), self.REQUEST_TIMEOUT)
+        except Exception as e:
+            logger.error("API", f"Request failed: {e}")
+            return None
+        logger.info("API", f"Response: {status}")
+        return status
+
+    async def _get(self, url):
+        use_ssl, host, port, path = split_url(url)
+        reader, writer = await asyncio.open_connection(host, port, ssl=True if use_ssl else None)
+        try:
+            writer.write((
+                "GET {} HTTP/1.0\r\n"
+                "Host: {}\r\n"
+                "msb-key: {}\r\n"
+                "\r\n"
+            ).format(path, host, self.api_key).encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            status = int(status_line.split(None, 2)[1])
+            body = await reader.read(-1)
+            logger.debug("API", f"Response body: {body}")
+            return status
+        finally:
+            writer.close()
+            await writer.wait_closed()
@@ -1,19 +1,101 @@
 import machine
 import time
 
+from event_queue import (EventQueue, EVT_BUTTON, EVT_BUTTON_PRESS, EVT_BUTTON_RELEASE,
+                         EVT_BUTTON_LONG, EVT_BUTTON_DOUBLE)
+
+# Gestures reported by GestureDecoder; they double as event queue codes
+PRESS = EVT_BUTTON_PRESS
+RELEASE = EVT_BUTTON_RELEASE
+CLICK = EVT_BUTTON
+LONG_PRESS = EVT_BUTTON_LONG
+DOUBLE_CLICK = EVT_BUTTON_DOUBLE
+
+
+class GestureDecoder:
+    """
+    Turns debounced button edges into gestures. Runs outside the IRQ.
+
+    emit(gesture, duration_ms) is called for PRESS, RELEASE, CLICK,
+    LONG_PRESS and DOUBLE_CLICK. A release after a long press gives no
+    click; the second click within double_click ms gives DOUBLE_CLICK
+    instead of CLICK. cooldown_period only limits CLICKs.
+    """
+
+    def __init__(self, debounce_delay=50, cooldown_period=0, long_press=800, double_click=300, active_level=0):
+        self.debounce_delay = debounce_delay
+        self.cooldown_period = cooldown_period
+        self.long_press = long_press
+        self.double_click = double_click
+        self.active_level = active_level
+        self.pressed = False
+        self.last_edge = None
+        self.press_time = 0
+        self.long_sent = False
+        self.last_release = None
+        self.last_click = None
+
+    def feed(self, level, t, emit):
+        """Process one edge recorded at ticks_ms() time t."""
+        if self.last_edge is not None and time.ticks_diff(t, self.last_edge) < self.debounce_delay:
+            return
+        pressed = level == self.active_level
+        if pressed == self.pressed:
+            return
+        self.last_edge = t
+        self.pressed = pressed
+        if pressed:
+            self.press_time = t
+            self.long_sent = False
+            emit(PRESS, 0)
+            return
+
+        duration = time.ticks_diff(t, self.press_time)
+        emit(RELEASE, duration)
+        if self.long_sent:
+            return
+        if self.last_release is not None and time.ticks_diff(self.press_time, self.last_release) <= self.double_click:
+            self.last_release = None
+            emit(DOUBLE_CLICK, duration)
+            return
+        self.last_release = t
+        if self.last_click is None or time.ticks_diff(t, self.last_click) > self.cooldown_period:
+            self.last_click = t
+            emit(CLICK, duration)
+
+    def tick(self, now, level, emit):
+        """Emit LONG_PRESS while held and resync to the pin level if an edge was lost."""
+        if self.last_edge is not None and time.ticks_diff(now, self.last_edge) >= self.debounce_delay:
+            if (level == self.active_level) != self.pressed:
+                self.feed(level, now, emit)
+        if self.pressed and not self.long_sent and time.ticks_diff(now, self.press_time) >= self.long_press:
+            self.long_sent = True
+            emit(LONG_PRESS, time.ticks_diff(now, self.press_time))
+
+
 class ButtonHandler:
-    def __init__(self, pin_number, debounce_delay=50, cooldown_period=5000):
+    """
+    The IRQ only stores (level, ticks_ms) of each edge in a preallocated
+    ring buffer. poll() must be called from the main loop; it decodes the
+    edges into gestures and either pushes them into event_queue or calls
+    the listeners (CLICK) and gesture listeners (all gestures).
+    """
+
+    def __init__(self, pin_number, debounce_delay=50, cooldown_period=5000, event_queue=None,
+                 long_press=800, double_click=300, edge_buffer=16):
         self.button_pin = machine.Pin(pin_number, machine.Pin.IN, machine.Pin.PULL_UP)
-        self.last_button_state = self.button_pin.value()
-        self.last_debounce_time = 0
-        self.debounce_delay = debounce_delay
+        self.decoder = GestureDecoder(debounce_delay, cooldown_period, long_press, double_click)
         self.button_press_count = 0
-        self.button_pressed = False
-        self.cooldown_period = cooldown_period
         self.last_press_time = 0
-        self.button_pin.irq(trigger=machine.Pin.IRQ_FALLING, handler=self.button_interrupt_handler)
+        self.event_queue = event_queue
         self.click_callback = None
         self.listener = []
+        self.gesture_listener = []
+        self._edges = EventQueue(edge_buffer)
+        self._emit_ref = self._emit
+        self.button_pin.irq(trigger=machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING,
+                            handler=self.button_interrupt_handler)
+
     def set_click_callback(self, click_callback):
         self.click_callback = click_callback
 
@@ -25,23 +107,39 @@ class ButtonHandler:
             raise ValueError('{} is not an installed listener'.format(l))
         self.listener.remove(l)
 
+    def add_gesture_listener(self, listener):
+        """listener(gesture, duration_ms) for PRESS, RELEASE, CLICK, LONG_PRESS, DOUBLE_CLICK."""
+        self.gesture_listener.append(listener)
+
+    def dropped_edges(self):
+        return self._edges.overflows
+
     def _trigger(self):
         for listener in self.listener:
             listener()
 
+    def _emit(self, gesture, duration):
+        if gesture == CLICK:
+            self.button_press_count += 1
+            self.last_press_time = time.ticks_ms()
+        if self.event_queue is not None:
+            self.event_queue.push(gesture, duration)
+            return
+        for listener in self.gesture_listener:
+            listener(gesture, duration)
+        if gesture == CLICK:
+            self._trigger()
+            if self.click_callback is not None:
+                self.click_callback(self.button_pin)
+
+    def poll(self):
+        """Decode recorded edges into gestures. Call from the main loop."""
+        edge = self._edges.pop()
+        while edge is not None:
+            self.decoder.feed(edge[0], edge[1], self._emit_ref)
+            edge = self._edges.pop()
+        self.decoder.tick(time.ticks_ms(), self.button_pin.value(), self._emit_ref)
+
     def button_interrupt_handler(self, pin):
-        print('button interrupt')
-        current_time = time.ticks_ms()
-        print('time diff: ', time.ticks_diff(current_time, self.last_debounce_time))
-        print('button state', pin.value())
-
-        if time.ticks_diff(current_time, self.last_debounce_time) > self.debounce_delay:
-            if time.ticks_diff(current_time, self.last_press_time) > self.cooldown_period:
-                self.button_press_count += 1
-                print("Button pressed! Count:", self.button_press_count)
-                self.last_press_time = current_time
-                self._trigger()
-                if (self.click_callback is not None):
-                    self.click_callback(pin)
-            else:
-                print("Button pressed, but on cooldown")
\ No newline at end of file
+        # No allocation, no printing: just record the edge
+        self._edges.push(pin.value(), time.ticks_ms())
@@ -0,0 +1,111 @@
+"""
+IRQ-safe event queue.
+
+Interrupt handlers push compact (code, arg) events into a preallocated
+ring buffer; the main loop drains it and runs the application logic.
+push() does not allocate, so it is safe to call from a hard interrupt.
+When the buffer is full the new event is dropped and counted.
+"""
+
+import array
+
+try:
+    from micropython import const, schedule
+except ImportError:
+    schedule = None
+
+    def const(value):
+        return value
+
+
+# Event codes (one byte each)
+EVT_NONE = const(0)
+EVT_BUTTON = const(1)  # click, arg: press duration in ms
+EVT_ROTARY = const(2)  # arg: new rotary value
+EVT_BUTTON_PRESS = const(3)  # arg: 0
+EVT_BUTTON_RELEASE = const(4)  # arg: press duration in ms
+EVT_BUTTON_LONG = const(5)  # arg: held time in ms
+EVT_BUTTON_DOUBLE = const(6)  # arg: press duration in ms
+
+
+class EventQueue:
+
+    def __init__(self, size=32, use_schedule=False):
+        # One slot is kept free to tell "full" from "empty"
+        self._size = size + 1
+        self._codes = bytearray(self._size)
+        self._args = array.array('i', [0] * self._size)
+        self._head = 0  # next slot to read, only written by drain()
+        self._tail = 0  # next slot to write, only written by push()
+        self.overflows = 0
+        self._reported_overflows = 0
+        self._handler = None
+        self._scheduled = False
+        self._use_schedule = use_schedule and schedule is not None
+        self._drain_ref = self._scheduled_drain  # bound once, schedule() must not allocate
+
+    def set_handler(self, handler):
+        """Handler for use_schedule mode, called as handler(code, arg)."""
+        self._handler = handler
+
+    def push(self, code, arg=0):
+        """Add an event. Safe to call from an interrupt handler."""
+        tail = self._tail
+        nxt = tail + 1
+        if nxt == self._size:
+            nxt = 0
+        if nxt == self._head:
+            self.overflows += 1
+            return False
+        self._codes[tail] = code
+        self._args[tail] = arg
+        self._tail = nxt
+        if self._use_schedule and not self._scheduled:
+            self._scheduled = True
+            try:
+                schedule(self._drain_ref, None)
+            except RuntimeError:
+                # schedule queue full; the next push or a poll will retry
+                self._scheduled = False
+        return True
+
+    def pending(self):
+        return (self._tail - self._head) % self._size
+
+    def is_empty(self):
+        return self._head == self._tail
+
+    def pop(self):
+        """Return the oldest (code, arg) or None if the queue is empty."""
+        head = self._head
+        if head == self._tail:
+            return None
+        event = (self._codes[head], self._args[head])
+        head += 1
+        if head == self._size:
+            head = 0
+        self._head = head
+        return event
+
+    def drain(self, handler=None, limit=None):
+        """Pop events and call handler(code, arg) for each. Returns the number handled."""
+        handler = handler or self._handler
+        count = 0
+        while limit is None or count < limit:
+            event = self.pop()
+            if event is None:
+                break
+            count += 1
+            if handler is not None:
+                handler(event[0], event[1])
+        return count
+
+    def new_overflows(self):
+        """Overflows since the last call, for periodic reporting outside the IRQ."""
+        new = self.overflows - self._reported_overflows
+        self._reported_overflows = self.overflows
+        return new
+
+    def _scheduled_drain(self, _):
+        self._scheduled = False
+        self.drain()
@@ -0,0 +1,260 @@
+"""
+Minimal HTTP/1.1 client keeping one connection alive.
+
+HTTPConnection sends requests over a socket it keeps open between calls,
+so repeated requests to the API skip DNS, the TCP handshake and, for
+https, the TLS handshake. A connection idle for longer than
+idle_timeout is closed before the next request instead of risking one
+the server already dropped; a reused connection that turns out to be
+closed is reopened and the request sent again.
+"""
+
+import socket
+import time
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+import logger
+
+
+def split_url(url):
+    """Split an http(s) URL into (use_ssl, host, port, path)."""
+    parts = url.split('/', 3)
+    use_ssl = parts[0] == 'https:'
+    host = parts[2]
+    path = '/' + parts[3] if len(parts) > 3 else '/'
+    port = 443 if use_ssl else 80
+    if ':' in host:
+        host, port = host.split(':', 1)
+        port = int(port)
+    return use_ssl, host, port, path
+
+
+class HTTPResponse:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers  # lower-case names
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode()
+
+
+class HTTPConnection:
+
+    def __init__(self, host, port=None, use_ssl=False, idle_timeout=30, timeout=10):
+        self.host = host
+        self.use_ssl = use_ssl
+        self.port = port or (443 if use_ssl else 80)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._sock = None
+        self._recv = None
+        self._stream = None  # set instead of _recv for sockets without recv()
+        self._send = None
+        self._buffer = b""
+        self._address = None
+        self._tls_session = None
+        self._last_used = 0
+
+        # Metrics
+        self.requests = 0
+        self.connections = 0  # sockets opened
+        self.reuses = 0  # requests sent over an already open connection
+        self.reconnects = 0  # reused connections found closed and reopened
+        self.tls_resumed = 0
+        self.last_response_ms = None
+
+    def request(self, method, path, headers=None, body=None):
+        """Send a request and read the whole response. Raises OSError on network errors."""
+        started = time.ticks_ms()
+        if self._sock is not None and time.ticks_diff(started, self._last_used) >= self.idle_timeout * 1000:
+            logger.debug("HTTP", "Connection idle too long, reopening")
+            self.close()
+        reused = self._sock is not None
+        try:
+            response = self._exchange(method, path, headers, body, reused)
+        except OSError:
+            self.close()
+            if not reused:
+                raise
+            # The server closed the kept connection; a fresh one gets one more try
+            self.reconnects += 1
+            reused = False
+            response = self._exchange(method, path, headers, body, reused)
+        if reused:
+            self.reuses += 1
+        self.requests += 1
+        self._last_used = time.ticks_ms()
+        self.last_response_ms = time.ticks_diff(self._last_used, started)
+        if response.headers.get('connection', '').lower() == 'close':
+            self.close()
+        return response
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+        self._buffer = b""
+
+    def _exchange(self, method, path, headers, body, reused):
+        if not reused:
+            self._connect()
+        lines = ["{} {} HTTP/1.1".format(method, path), "Host: " + self.host]
+        if headers:
+            for name, value in headers.items():
+                lines.append("{}: {}".format(name, value))
+        if body is not None:
+            lines.append("Content-Length: {}".format(len(body)))
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode()
+        if body is not None:
+            request += body
+        self._write(request)
+        try:
+            return self._read_response(method)
+        except ValueError as e:
+            # A bad status code or chunk size leaves the stream out of sync
+            raise OSError("Malformed response: {}".format(e))
+
+    def _connect(self):
+        if self._address is None:
+            self._address = socket.getaddrinfo(self.host, self.port)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self._address)
+        except OSError:
+            sock.close()
+            self._address = None
+            raise
+        if self.use_ssl:
+            sock = self._wrap_tls(sock)
+        self._sock = sock
+        if hasattr(sock, 'recv'):
+            self._recv = sock.recv
+            self._stream = None
+        else:
+            # MicroPython's TLS sockets are streams with only read(), readline()
+            # and write(). read(n) waits for all n bytes, so never ask a
+            # kept-alive stream for more than the response still holds.
+            self._recv = None
+            self._stream = sock
+        self._send = sock.send if hasattr(sock, 'send') else sock.write
+        self._buffer = b""
+        self.connections += 1
+
+    def _wrap_tls(self, sock):
+        if hasattr(ssl, 'SSLContext'):
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            if hasattr(context, 'load_default_certs'):
+                context.load_default_certs()
+            else:
+                context.verify_mode = ssl.CERT_NONE  # as urequests on MicroPython
+            try:
+                # Session resumption saves most of the handshake where the port supports it
+                sock = context.wrap_socket(sock, server_hostname=self.host, session=self._tls_session)
+            except TypeError:
+                sock = context.wrap_socket(sock, server_hostname=self.host)
+        else:
+            sock = ssl.wrap_socket(sock, server_hostname=self.host)
+        if getattr(sock, 'session_reused', False):
+            self.tls_resumed += 1
+        self._tls_session = getattr(sock, 'session', None)
+        return sock
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            sent = self._send(view)
+            if sent is None:
+                sent = len(view)
+            view = view[sent:]
+
+    def _fill(self):
+        chunk = self._recv(512)
+        if not chunk:
+            raise OSError("Connection closed by server")
+        self._buffer += chunk
+
+    def _read_line(self):
+        if self._stream is not None:
+            line = self._stream.readline()
+            if not line.endswith(b"\n"):
+                raise OSError("Connection closed by server")
+            return line.rstrip(b"\r\n")
+        while True:
+            end = self._buffer.find(b"\r\n")
+            if end >= 0:
+                line = self._buffer[:end]
+                self._buffer = self._buffer[end + 2:]
+                return line
+            self._fill()
+
+    def _read_exact(self, size):
+        if self._stream is not None:
+            data = b""
+            while len(data) < size:
+                chunk = self._stream.read(size - len(data))
+                if not chunk:
+                    raise OSError("Connection closed by server")
+                data += chunk
+            return data
+        while len(self._buffer) < size:
+            self._fill()
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+    def _read_response(self, method):
+        status_line = self._read_line()
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise OSError("Invalid status line: {}".format(status_line))
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = self._read_line()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower().decode()] = value.strip().decode()
+        if parts[0] == b"HTTP/1.0" and headers.get('connection', '').lower() != 'keep-alive':
+            headers['connection'] = 'close'
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b""
+            while True:
+                size = int(self._read_line().split(b";")[0], 16)
+                if size == 0:
+                    while self._read_line():
+                        pass  # trailers
+                    break
+                body += self._read_exact(size)
+                self._read_line()
+        elif 'content-length' in headers:
+            body = self._read_exact(int(headers['content-length']))
+        else:
+            # Body runs until the server closes the connection
+            body = self._buffer
+            try:
+                while True:
+                    chunk = self._stream.read(512) if self._stream is not None else self._recv(512)
+                    if not chunk:
+                        break
+                    body += chunk
+            except OSError:
+                pass
+            self._buffer = b""
+            headers['connection'] = 'close'
+        return HTTPResponse(status, headers, body)
@@ -1,5 +1,3 @@
-import math
-import random
 import time
 
 import secrets
@@ -10,14 +8,20 @@ import machine
 import sh1106
 #import ssd1306
 
+from app import App, set_timezone
 from MSBDisplay import MSBDisplay
 from button_handler import ButtonHandler
+from event_queue import EventQueue, EVT_ROTARY
 from mqtt_service import MQTTService
 from rotary_irq_esp import RotaryIRQ
-import ntptime
-from utime import localtime
+from rotary_pcnt_esp import RotaryPCNT
 
+from socket_waiter import SocketWaiter
+from request_worker import RequestWorker
 from state_manager import StateManager
+from state_store import StateStore
+from time_command import MQTTTimeCommand
+from time_sync import TimeSync
 import logger
 
 # =============================================================================
@@ -25,54 +29,33 @@ import logger
 # =============================================================================
 LOG_LEVEL = 1  # 0=DEBUG, 1=INFO, 2=WARN, 3=ERROR
 SCREENSAVER_TIMEOUT = 20  # Seconds of inactivity before screensaver (300 = 5 min)
+TIMEZONE = "CET-1CEST,M3.5.0,M10.5.0/3"  # POSIX TZ rule for the local clock
+NTP_SERVER = "pool.ntp.org"
+NTP_MIN_INTERVAL = 300      # Seconds between resyncs, doubled after each good sync...
+NTP_MAX_INTERVAL = 6 * 3600  # ...up to this
+MQTT_PERSISTENT_SESSION = True  # Broker keeps subscriptions and queues state changes across reconnects
+MQTT_PING_INTERVAL = 20  # Seconds without broker traffic before a PINGREQ checks the link
+TIME_COMMAND_TRANSPORT = 'http'  # 'mqtt': publish to msb/cmd/openUntil, HTTP only as fallback
+REQUEST_DEADLINE = 30  # Seconds the API request for a closing time is retried
+# Seconds a requested closing time is shown before msb/state must confirm it;
+# longer than the retries, so a late success is not rolled back first
+CONFIRM_TIMEOUT = REQUEST_DEADLINE + 10
+WIFI_CACHE_FILE = 'wifi.json'  # Last good BSSID and channel for fast reconnects, None to always scan
+WIFI_PRIORITIES = {}  # SSID -> number; the higher one wins between access points of similar signal
 
 # Display brightness (0-255)
 BRIGHTNESS_INIT = 50        # During startup/initialization
 BRIGHTNESS_NORMAL = 200     # Normal operation
 BRIGHTNESS_SCREENSAVER = 5 # Screensaver mode
 
+EVENT_QUEUE_SIZE = 32  # Input events buffered between main loop iterations
+FRAME_INTERVAL_MS = 50  # Main loop period; sleeps in select.poll on the MQTT socket in between
+ROTARY_BACKEND = 'irq'  # 'irq' = GPIO interrupts, 'pcnt' = ESP32 pulse counter
+
 # Apply log level
 logger.set_level(LOG_LEVEL)
 
 
-def get_cet_offset():
-    """
-    Returns the correct offset for Central European Time in seconds.
-    CET (winter): UTC+1 = 3600 seconds
-    CEST (summer): UTC+2 = 7200 seconds
-
-    DST rules for Central Europe:
-    - Starts: Last Sunday of March at 2:00 UTC
-    - Ends: Last Sunday of October at 3:00 UTC (2:00 UTC standard)
-    """
-    now = time.gmtime()
-    year, month, day, hour = now[0], now[1], now[2], now[3]
-
-    # Calculate last Sunday of March
-    # March has 31 days, find what day of week March 31 is
-    march_31 = time.mktime((year, 3, 31, 0, 0, 0, 0, 0))
-    march_31_weekday = time.localtime(march_31)[6]  # 0=Monday, 6=Sunday
-    dst_start_day = 31 - ((march_31_weekday + 1) % 7)
-
-    # Calculate last Sunday of October
-    # October has 31 days
-    oct_31 = time.mktime((year, 10, 31, 0, 0, 0, 0, 0))
-    oct_31_weekday = time.localtime(oct_31)[6]
-    dst_end_day = 31 - ((oct_31_weekday + 1) % 7)
-
-    # DST start: last Sunday of March at 2:00 UTC
-    dst_start = time.mktime((year, 3, dst_start_day, 2, 0, 0, 0, 0))
-    # DST end: last Sunday of October at 1:00 UTC (3:00 local becomes 2:00)
-    dst_end = time.mktime((year, 10, dst_end_day, 1, 0, 0, 0, 0))
-
-    current_time = time.time()
-
-    if dst_start <= current_time < dst_end:
-        return 2 * 3600  # CEST: UTC+2
-    else:
-        return 1 * 3600  # CET: UTC+1
-
-
 from wifi_manager import WifiManager
 
 
@@ -85,11 +68,17 @@ logger.info("INIT", f"Device ID: {machine.unique_id().hex()}")
 logger.debug("INIT", "Initializing I2C bus")
 i2c = I2C(0, scl=Pin(7), sda=Pin(6))
 
+# Input interrupts only queue events; the main loop handles them
+events = EventQueue(EVENT_QUEUE_SIZE)
+
 logger.debug("INIT", "Initializing button handler on pin 8")
-button = ButtonHandler(8, cooldown_period=1000)
+button = ButtonHandler(8, cooldown_period=1000, event_queue=events)
 
 logger.debug("INIT", "Initializing rotary encoder on pins 2, 1")
-rotary = RotaryIRQ(2, 1, pull_up=True, reverse=True, min_val=0, max_val=80, range_mode=RotaryIRQ.RANGE_BOUNDED)
+RotaryDriver = RotaryPCNT if ROTARY_BACKEND == 'pcnt' else RotaryIRQ
+rotary = RotaryDriver(2, 1, pull_up=True, reverse=True, min_val=0, max_val=80, range_mode=RotaryDriver.RANGE_BOUNDED,
+                      delivery=RotaryDriver.DELIVERY_LATEST)
+rotary.set_event_queue(events, EVT_ROTARY)
 
 logger.debug("INIT", "Initializing SH1106 OLED display (128x64)")
 oledDisplay = sh1106.SH1106_I2C(128, 64, i2c)
@@ -101,69 +90,50 @@ display = MSBDisplay(
     brightness_screensaver=BRIGHTNESS_SCREENSAVER
 )
 
-logger.debug("INIT", "Initializing state manager")
-stateManager = StateManager(API_KEY)
-
 display.rotate(True)
 logger.info("INIT", "Display rotated 180 degrees")
 
 logger.debug("INIT", "Initializing MQTT service")
-mqtt_service = MQTTService(secrets.mqtt_server, secrets.mqtt_user, secrets.mqtt_pass, "msb_timing_button"  + machine.unique_id().hex())
+mqtt_service = MQTTService(secrets.mqtt_server, secrets.mqtt_user, secrets.mqtt_pass, "msb_timing_button"  + machine.unique_id().hex(),
+                            persistent_session=MQTT_PERSISTENT_SESSION, ping_interval=MQTT_PING_INTERVAL)
+
+logger.debug("INIT", "Initializing state manager")
+stateManager = StateManager(API_KEY, mqtt_service)  # polls the state API while MQTT is down
+
+logger.debug("INIT", "Initializing NTP time sync")
+time_sync = TimeSync(NTP_SERVER, min_interval=NTP_MIN_INTERVAL, max_interval=NTP_MAX_INTERVAL)
 
 logger.debug("INIT", "Initializing WiFi manager")
-wifi_manager = WifiManager(wifi_access)
+wifi_manager = WifiManager(wifi_access, cache_file=WIFI_CACHE_FILE, priorities=WIFI_PRIORITIES)
 
 logger.info("INIT", "Hardware initialization complete")
 
 
 
-mode = 'normal'
-lastAction = None
-lastActivity = time.time()  # Track last user activity for screensaver
-screensaverFrame = 0
-
-def rotary_turned(value):
-    global mode, lastAction, lastActivity
-    lastActivity = time.time()  # Reset screensaver timer
-    logger.debug("ROTARY", f"Rotary turned, value={value}, current mode={mode}")
-    if mode == 'screensaver':
-        logger.info("MODE", "Exiting screensaver via rotary")
-        mode = 'normal'
-        return
-    mode = 'setting time'
-    lastAction = time.time()
-    time_from_counter(value)
-    logger.debug("ROTARY", f"Mode changed to 'setting time'")
-
-def button_clicked():
-    global counter, mode, selectedTimeString, display, lastActivity
-    lastActivity = time.time()  # Reset screensaver timer
-    logger.debug("BUTTON", f"Button clicked, current mode={mode}")
-    if mode == 'screensaver':
-        logger.info("MODE", "Exiting screensaver via button")
-        mode = 'normal'
-        return
-    if mode != 'setting time':
-        logger.debug("BUTTON", f"Ignoring click - not in 'setting time' mode")
-        return
-    counter = counter+1
-    logger.info("BUTTON", f"Setting time to {selectedTimeString}")
-    display.message('setting time until ' + selectedTimeString)
-    stateManager.sendTime(selectedTimeString)
-    mode = 'requestSent'
-    logger.debug("MODE", "Mode changed to 'requestSent'")
-
-def mqtt_status_changed(status = None):
-    global mode
-    logger.info("MQTT", f"Status changed: {status}")
-    if mode == 'requestSent':
-        logger.info("MODE", "Request confirmed, returning to normal mode")
-        mode = 'normal'
+# API requests run on a worker thread so a slow server never stalls the display
+request_worker = RequestWorker(stateManager.sendTime, deadline=REQUEST_DEADLINE)
+stateManager.worker = request_worker  # the state polls run on the same thread
+time_command = None
+send_time = request_worker.submit
+if TIME_COMMAND_TRANSPORT == 'mqtt':
+    time_command = MQTTTimeCommand(mqtt_service, fallback=request_worker.submit)
+    send_time = time_command
+
+state_store = StateStore(mqtt_service, confirm_timeout=CONFIRM_TIMEOUT)
+set_timezone(TIMEZONE)
+app = App(
+    display=display,
+    mqtt_service=mqtt_service,
+    rotary=rotary,
+    send_time=send_time,
+    screensaver_timeout=SCREENSAVER_TIMEOUT,
+    state_store=state_store
+)
 
 logger.debug("INIT", "Registering event listeners")
-rotary.add_listener(rotary_turned)
-button.add_listener(button_clicked)
-mqtt_service.add_listener(mqtt_status_changed)
+mqtt_service.add_listener(app.mqtt_status_changed)
+request_worker.add_listener(app.request_finished)
+request_worker.start()
 logger.info("INIT", "Event listeners registered")
 
 display.logo()
@@ -171,7 +141,14 @@ time.sleep(1)
 
 logger.info("WIFI", "Starting WiFi connection")
 display.message('Initializing')
-wifi_manager.addListener(lambda message: display.message(message))
+
+
+def show_wifi_message(message):
+    display.message(message)
+    app.invalidate()  # the next frame redraws over the message
+
+
+wifi_manager.addListener(show_wifi_message)
 wifi_manager.connect_wifi()
 logger.info("WIFI", "WiFi connected")
 
@@ -181,83 +158,47 @@ mqtt_service.connect_and_subscribe()
 logger.info("MQTT", "MQTT connected and subscribed")
 
 
-selectedTimeString = ""
-
-def time_from_counter(counter):
-    global selectedTimeString
-    now = time.localtime(time.time() + get_cet_offset() + (counter + 2) * 60*15)
-    x = (now[0],now[1],now[2],now[3],math.floor(now[4]/15)*15,now[5],now[6],now[7])
-    now = time.localtime(time.mktime(x))
-    logger.debug("TIME", f"Calculated time tuple: {now}")
-    selectedTimeString = "{:02d}:{:02d}".format(now[3],now[4])
-    logger.debug("TIME", f"Selected time string: {selectedTimeString}")
-    return selectedTimeString
-
-
-logger.info("NTP", "Syncing time with NTP server")
-ntptime.settime()
-
-dateTimeObj = localtime()
-Dyear, Dmonth, Dday, Dhour, Dmin, Dsec, Dweekday, Dyearday = (dateTimeObj)
-logger.info("NTP", f"Time synced: {Dday}/{Dmonth}/{Dyear} {Dhour}:{Dmin}")
-
-def getTimeString():
-    now = time.localtime(time.time() + get_cet_offset())
-    timeString = "{:02d}:{:02d}".format(now[3], now[4])
-    return timeString
-
-time_from_counter(0)
-
-
-def should_execute():
-    return random.randint(1, 1000) == 1
+app.select_time(0)
 
 logger.info("MAIN", "Entering main loop")
-counter = 0
-last_logged_mode = None
-last_status_log = 0
-STATUS_LOG_INTERVAL = 60  # Log status every 60 seconds
 
-while True:
-    if lastAction is not None and lastAction + 5 < time.time():
-        lastAction = None
-        logger.debug("MODE", "Timeout - returning to normal mode")
-        mode = 'normal'
-        rotary.reset()
-
-    # Check for screensaver activation (5 minutes of inactivity)
-    if mode == 'normal' and time.time() - lastActivity > SCREENSAVER_TIMEOUT:
-        logger.info("MODE", "Activating screensaver after inactivity")
-        mode = 'screensaver'
-        screensaverFrame = 0  # Reset animation
-
-    wifi_manager.check_and_reconnect()
+waiter = SocketWaiter()
+next_frame = time.ticks_ms()
 
-    mqtt_service.check_msg()
-    status = mqtt_service.get_state()
-
-    # Log mode changes
-    if mode != last_logged_mode:
-        logger.info("MODE", f"Mode: {mode}")
-        last_logged_mode = mode
-
-    # Periodic status logging (every 60 seconds in normal mode)
-    current_time = time.time()
-    if mode == 'normal' and current_time - last_status_log > STATUS_LOG_INTERVAL:
-        logger.debug("STATUS", f"Time: {getTimeString()}, MQTT status: {status}")
-        last_status_log = current_time
-
-    if mode == 'screensaver':
-        display.screensaver(screensaverFrame, status)
-        screensaverFrame += 1
-    elif mode == 'normal':
-        display.status(getTimeString(), status)
-    elif mode == 'requestSent':
-        display.message('setting time until ' + selectedTimeString)
-    else:
-        display.selectTime(selectedTimeString)
+while True:
+    button.poll()
+    rotary.poll()  # one coalesced rotary event per frame
+    events.drain(app.handle_event)
+    if events.new_overflows():
+        logger.warn("INPUT", f"Event queue overflowed, {events.overflows} events dropped in total")
 
+    app.update()
 
+    wifi_manager.check_and_reconnect()
 
+    time_sync.poll(wifi_manager.is_connected())
+    stateManager.poll_state(wifi_manager.is_connected())
 
+    if time_command is not None:
+        time_command.poll()  # HTTP fallback for unacknowledged commands
+    request_worker.poll()  # completions of background API requests and state polls
 
+    if mqtt_service.socket() is None:
+        mqtt_service.check_msg()  # reconnects with backoff
+    else:
+        mqtt_service.keepalive()  # pings an idle link, drops a dead one
+        mqtt_service.flush()  # one batch of queued publishes per frame
+
+    app.render()
+
+    # Sleep until the next frame, waking up for every broker message
+    next_frame = time.ticks_add(next_frame, FRAME_INTERVAL_MS)
+    if time.ticks_diff(next_frame, time.ticks_ms()) < 0:
+        next_frame = time.ticks_ms()  # fell behind, don't try to catch up
+    waiter.watch(mqtt_service.socket())
+    while True:
+        remaining = time.ticks_diff(next_frame, time.ticks_ms())
+        if remaining <= 0 or not waiter.wait(remaining):
+            break
+        mqtt_service.check_msg()
+        waiter.watch(mqtt_service.socket())
@@ -0,0 +1,119 @@
+"""
+asyncio entry point. Same hardware and behaviour as main.py, but WiFi,
+MQTT, API requests, rendering and input run as concurrent tasks.
+
+To use it on the device, import it from main.py (or rename it to main.py).
+"""
+
+import time
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+import secrets
+
+from machine import Pin, I2C
+import machine
+
+import sh1106
+
+from app import App, set_timezone
+from async_runtime import AsyncRuntime
+from async_services import AsyncMQTTService, AsyncStateManager, AsyncWifiManager
+from MSBDisplay import MSBDisplay
+from button_handler import ButtonHandler
+from event_queue import EventQueue, EVT_ROTARY
+from state_store import StateStore
+from time_command import MQTTTimeCommand
+from time_sync import TimeSync
+from rotary_irq_esp import RotaryIRQ
+from rotary_pcnt_esp import RotaryPCNT
+import logger
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+LOG_LEVEL = 1  # 0=DEBUG, 1=INFO, 2=WARN, 3=ERROR
+SCREENSAVER_TIMEOUT = 20  # Seconds of inactivity before screensaver (300 = 5 min)
+TIMEZONE = "CET-1CEST,M3.5.0,M10.5.0/3"  # POSIX TZ rule for the local clock
+NTP_SERVER = "pool.ntp.org"
+NTP_MIN_INTERVAL = 300      # Seconds between resyncs, doubled after each good sync...
+NTP_MAX_INTERVAL = 6 * 3600  # ...up to this
+MQTT_PERSISTENT_SESSION = True  # Broker keeps subscriptions and queues state changes across reconnects
+MQTT_PING_INTERVAL = 20  # Seconds without broker traffic before a PINGREQ checks the link
+TIME_COMMAND_TRANSPORT = 'http'  # 'mqtt': publish to msb/cmd/openUntil, HTTP only as fallback
+CONFIRM_TIMEOUT = 15  # Seconds a requested closing time is shown before msb/state must confirm it
+WIFI_CACHE_FILE = 'wifi.json'  # Last good BSSID and channel for fast reconnects, None to always scan
+WIFI_PRIORITIES = {}  # SSID -> number; the higher one wins between access points of similar signal
+
+# Display brightness (0-255)
+BRIGHTNESS_INIT = 50        # During startup/initialization
+BRIGHTNESS_NORMAL = 200     # Normal operation
+BRIGHTNESS_SCREENSAVER = 5 # Screensaver mode
+
+EVENT_QUEUE_SIZE = 32  # Input events buffered between input task runs
+ROTARY_BACKEND = 'irq'  # 'irq' = GPIO interrupts, 'pcnt' = ESP32 pulse counter
+
+# Apply log level
+logger.set_level(LOG_LEVEL)
+
+
+logger.info("INIT", "Starting MSB State Time Button (async)")
+logger.info("INIT", f"Device ID: {machine.unique_id().hex()}")
+
+i2c = I2C(0, scl=Pin(7), sda=Pin(6))
+events = EventQueue(EVENT_QUEUE_SIZE)
+button = ButtonHandler(8, cooldown_period=1000, event_queue=events)
+RotaryDriver = RotaryPCNT if ROTARY_BACKEND == 'pcnt' else RotaryIRQ
+rotary = RotaryDriver(2, 1, pull_up=True, reverse=True, min_val=0, max_val=80, range_mode=RotaryDriver.RANGE_BOUNDED,
+                      delivery=RotaryDriver.DELIVERY_LATEST)
+rotary.set_event_queue(events, EVT_ROTARY)
+
+oledDisplay = sh1106.SH1106_I2C(128, 64, i2c)
+display = MSBDisplay(
+    i2c=i2c,
+    display=oledDisplay,
+    brightness_init=BRIGHTNESS_INIT,
+    brightness_normal=BRIGHTNESS_NORMAL,
+    brightness_screensaver=BRIGHTNESS_SCREENSAVER
+)
+display.rotate(True)
+
+stateManager = AsyncStateManager(secrets.API_key)
+mqtt_service = AsyncMQTTService(secrets.mqtt_server, secrets.mqtt_user, secrets.mqtt_pass, "msb_timing_button"  + machine.unique_id().hex(),
+                                 persistent_session=MQTT_PERSISTENT_SESSION, ping_interval=MQTT_PING_INTERVAL)
+wifi_manager = AsyncWifiManager(secrets.wifi_access, cache_file=WIFI_CACHE_FILE, priorities=WIFI_PRIORITIES)
+time_sync = TimeSync(NTP_SERVER, min_interval=NTP_MIN_INTERVAL, max_interval=NTP_MAX_INTERVAL)
+
+state_store = StateStore(mqtt_service, confirm_timeout=CONFIRM_TIMEOUT)
+set_timezone(TIMEZONE)
+app = App(
+    display=display,
+    mqtt_service=mqtt_service,
+    rotary=rotary,
+    send_time=None,
+    screensaver_timeout=SCREENSAVER_TIMEOUT,
+    state_store=state_store
+)
+time_command = None
+if TIME_COMMAND_TRANSPORT == 'mqtt':
+    time_command = MQTTTimeCommand(mqtt_service)
+runtime = AsyncRuntime(app, wifi_manager, mqtt_service, stateManager, button=button, rotary=rotary, events=events,
+                       time_sync=time_sync, time_command=time_command)
+app.send_time = runtime.send_time
+if time_command is not None:
+    time_command.fallback = runtime.send_time
+    app.send_time = time_command
+mqtt_service.add_listener(app.mqtt_status_changed)
+
+logger.info("INIT", "Hardware initialization complete")
+
+
+display.logo()
+time.sleep(1)
+
+
+app.select_time(0)
+asyncio.run(runtime.run())
@@ -0,0 +1,236 @@
+"""
+umqtt.simple.MQTTClient with a non-blocking connect and subscribe.
+
+connect_start() opens a non-blocking TCP connection and queues the
+CONNECT packet; connect_poll() sends and receives whatever the socket
+allows and returns None until the CONNACK is in. subscribe_start() and
+subscribe_poll() do the same for SUBSCRIBE/SUBACK, with any number of
+topics in one packet. Packets the broker sends before the SUBACK, such
+as messages queued for a persistent session, are read whole and handed
+to the callback as check_msg() would. After that the client is used like a normal umqtt
+client (check_msg, publish, ping); wait_msg() additionally counts the
+packets received and the PINGRESPs among them for keepalive tracking.
+"""
+
+import select
+import socket
+import struct
+
+from umqtt.simple import MQTTClient, MQTTException
+
+# errno values for "not done yet" on a non-blocking socket
+# (EAGAIN, EINPROGRESS and EALREADY on lwIP and Linux)
+_WOULD_BLOCK = (11, 115, 114, 119)
+
+
+def _length_prefixed(value):
+    if isinstance(value, str):
+        value = value.encode()
+    return struct.pack("!H", len(value)) + value
+
+
+def _packet(first_byte, body):
+    header = bytearray((first_byte,))
+    size = len(body)
+    while size > 0x7F:
+        header.append((size & 0x7F) | 0x80)
+        size >>= 7
+    header.append(size)
+    return bytes(header) + body
+
+
+def _remaining_length(data):
+    """(remaining length, header size) of the packet starting data, (None, None) if incomplete."""
+    size, shift = 0, 0
+    for i in range(1, len(data)):
+        size |= (data[i] & 0x7F) << shift
+        shift += 7
+        if not data[i] & 0x80:
+            return size, i + 1
+    return None, None
+
+
+class NonBlockingMQTTClient(MQTTClient):
+
+    packets_received = 0
+    pingresps = 0
+
+    def connect_start(self, clean_session=True):
+        """Begin connecting; DNS resolution still blocks."""
+        self._out = b""
+        self._in = b""
+        self._blocking = bool(self.ssl)
+        if self._blocking:
+            # A TLS handshake cannot be resumed step by step; fall back to
+            # the blocking umqtt calls
+            self._session_present = self.connect(clean_session)
+            self._expect = 0
+            return
+        address = socket.getaddrinfo(self.server, self.port)[0][-1]
+        self.sock = socket.socket()
+        self.sock.setblocking(False)
+        try:
+            self.sock.connect(address)
+        except OSError as e:
+            if e.args[0] not in _WOULD_BLOCK:
+                raise
+        self._poller = select.poll()
+        self._poller.register(self.sock, select.POLLOUT)
+        self._writable = False
+        self._out = self._connect_packet(clean_session)
+        self._expect = 4
+
+    def connect_poll(self):
+        """None while waiting, else the session present flag from the CONNACK."""
+        if self._expect == 0:
+            return bool(self._session_present)
+        resp = self._exchange()
+        if resp is None:
+            return None
+        if resp[0] != 0x20 or resp[1] != 0x02:
+            raise MQTTException(29)
+        if resp[3] != 0:
+            raise MQTTException(resp[3])
+        self._expect = 0
+        self._session_present = resp[2] & 1
+        self.sock.setblocking(True)
+        return bool(self._session_present)
+
+    def subscribe_start(self, topic, qos=0):
+        """Subscribe to one topic, or to a list of (topic, qos) pairs in one packet."""
+        topics = [(topic, qos)] if isinstance(topic, (str, bytes)) else list(topic)
+        if self._blocking:
+            for name, topic_qos in topics:
+                self.subscribe(name, topic_qos)
+            self._expect = 0
+            return
+        self.pid += 1
+        self._subscribe_pid = self.pid
+        payload = b"".join(_length_prefixed(name) + bytes((topic_qos,)) for name, topic_qos in topics)
+        self._out = _packet(0x82, struct.pack("!H", self.pid) + payload)
+        self._in = b""
+        self._expect = 2  # first byte and the first remaining length byte
+        self.sock.setblocking(False)
+
+    def subscribe_poll(self):
+        """None while waiting, True once the SUBACK for our packet id is in."""
+        if self._expect == 0:
+            return True
+        while True:
+            resp = self._exchange()
+            if resp is None:
+                return None
+            # Read exactly one packet, so nothing after it is taken off the socket
+            size, header_len = _remaining_length(resp)
+            if size is None:
+                self._expect += 1
+                continue
+            if len(resp) < header_len + size:
+                self._expect = header_len + size
+                continue
+            self._in = b""
+            self._expect = 2
+            op, body = resp[0], resp[header_len:]
+            if op != 0x90:
+                self._handle_packet(op, body)
+                continue
+            self._expect = 0
+            self.sock.setblocking(True)
+            if self._out:
+                self.sock.write(self._out)  # PUBACKs still pending
+                self._out = b""
+            if struct.unpack("!H", body[:2])[0] != self._subscribe_pid:
+                raise MQTTException(op)
+            if 0x80 in body[2:]:
+                raise MQTTException(0x80)
+            return True
+
+    def _handle_packet(self, op, body):
+        """Process a whole packet read while waiting for a SUBACK, like wait_msg()."""
+        self.packets_received += 1
+        if op == 0xD0:  # PINGRESP
+            self.pingresps += 1
+            return
+        if op & 0xF0 != 0x30:
+            return
+        if op & 6 == 4:
+            raise MQTTException(-1)  # QoS 2 is not supported
+        topic_len = (body[0] << 8) | body[1]
+        topic = body[2:2 + topic_len]
+        pos = 2 + topic_len
+        if op & 6:
+            self._out += b"\x40\x02" + body[pos:pos + 2]  # PUBACK, sent by the next _exchange()
+            pos += 2
+        self.cb(topic, body[pos:])
+
+    def wait_msg(self):
+        """umqtt.simple's wait_msg(), counting packets and PINGRESPs."""
+        res = self.sock.read(1)
+        self.sock.setblocking(True)
+        if res is None:
+            return None
+        if res == b"":
+            raise OSError(-1)
+        self.packets_received += 1
+        if res == b"\xd0":  # PINGRESP
+            self.sock.read(1)
+            self.pingresps += 1
+            return None
+        op = res[0]
+        if op & 0xF0 != 0x30:
+            return op
+        sz = self._recv_len()
+        topic_len = self.sock.read(2)
+        topic_len = (topic_len[0] << 8) | topic_len[1]
+        topic = self.sock.read(topic_len)
+        sz -= topic_len + 2
+        if op & 6:
+            pid = self.sock.read(2)
+            pid = pid[0] << 8 | pid[1]
+            sz -= 2
+        msg = self.sock.read(sz)
+        self.cb(topic, msg)
+        if op & 6 == 2:
+            pkt = bytearray(b"\x40\x02\0\0")
+            struct.pack_into("!H", pkt, 2, pid)
+            self.sock.write(pkt)
+        elif op & 6 == 4:
+            raise MQTTException(-1)  # QoS 2 is not supported
+        return op
+
+    def _connect_packet(self, clean_session):
+        body = bytearray(b"\x00\x04MQTT\x04\x00")
+        body[7] = clean_session << 1
+        payload = _length_prefixed(self.client_id)
+        if self.lw_topic:
+            body[7] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3 | self.lw_retain << 5
+            payload += _length_prefixed(self.lw_topic) + _length_prefixed(self.lw_msg)
+        if self.user:
+            body[7] |= 0xC0
+            payload += _length_prefixed(self.user) + _length_prefixed(self.pswd)
+        body += struct.pack("!H", self.keepalive) + payload
+        return _packet(0x10, bytes(body))
+
+    def _exchange(self):
+        """Send pending bytes, then read up to _expect bytes; None until complete."""
+        if not self._writable:
+            if not self._poller.poll(0):
+                return None
+            self._writable = True
+        try:
+            if self._out:
+                sent = self.sock.send(self._out)
+                self._out = self._out[sent:]
+                if self._out:
+                    return None
+            chunk = self.sock.recv(self._expect - len(self._in))
+        except OSError as e:
+            if e.args[0] in _WOULD_BLOCK:
+                return None
+            raise
+        if not chunk:
+            raise OSError(-1)  # closed by the broker
+        self._in += chunk
+        if len(self._in) < self._expect:
+            return None
+        return self._in
@@ -1,48 +1,130 @@
 import json
 import time
 
-from umqtt.simple import MQTTClient
+from mqtt_client import NonBlockingMQTTClient as MQTTClient
 import logger
+from publish_queue import PublishQueue
+from state_codec import decode_state, is_binary
+from topic_router import TopicRouter
 
 class MQTTService:
 
-    def __init__(self, server, user, password, client_id):
+    # Reconnection steps driven by check_msg()
+    CONN_IDLE = 'idle'
+    CONN_CONNECTING = 'connecting'  # TCP connect and CONNECT/CONNACK
+    CONN_SUBSCRIBING = 'subscribing'  # SUBSCRIBE/SUBACK
+    STEP_TIMEOUT = 10  # seconds allowed per step
+
+    # Keepalive: PINGREQ after ping_interval seconds without inbound traffic;
+    # no answer within a few round trips means the link is dead
+    KEEPALIVE = 60  # seconds, sent to the broker in CONNECT
+    PING_TIMEOUT_MIN_MS = 1000
+    PING_TIMEOUT_MAX_MS = 8000
+
+    DRAIN_BYTES_PER_TICK = 256  # payload bytes published per flush()
+
+    def __init__(self, server, user, password, client_id, persistent_session=False, ping_interval=None,
+                 publish_slots=8, max_payload=128, port=0):
         self.listeners = []
         self.connection_listeners = []
         self.user = user
         self.password = password
         self.server = server
+        self.port = port  # 0 = umqtt's default for the transport
         self.client_id = client_id
         self.subscribe_topic = "msb/state"
+        # With a persistent session the broker keeps the subscriptions across
+        # reconnects; QoS 1 makes it queue state changes while we are away
+        self.persistent_session = persistent_session
+        self.subscribed = None  # subscriptions the broker holds for this session
+        self.session_resumes = 0
+        self.router = TopicRouter()
+        self.router.add(self.subscribe_topic, self._on_state, 1 if persistent_session else 0)
         self.client = None
         self.state = None
+        self.state_version = 0  # incremented whenever the state changes
+        self.last_payload = None
+        self.duplicates = 0
         self.connected = False
         self.last_reconnect_attempt = 0
         self.reconnect_delay = 5
         self.max_reconnect_delay = 60
         self.current_reconnect_delay = self.reconnect_delay
         self.consecutive_failures = 0
+        self.connection_step = self.CONN_IDLE
+        self.step_started = 0
+
+        # Outbound messages, kept while disconnected
+        self.outbox = PublishQueue(publish_slots, max_payload)
+
+        # Keepalive, disabled when ping_interval is None
+        self.ping_interval = ping_interval
+        self.pings = 0
+        self.dead_links = 0
+        self.last_rtt_ms = None
+        self.srtt_ms = None  # smoothed PINGRESP round trip time
+        self._ping_sent = None
+        self._last_activity = 0
+        self._packets_received = 0
+        self._pingresps = 0
 
     def _create_client(self):
         self.client = MQTTClient(
             self.client_id,
             self.server,
+            port=self.port,
             user=self.user,
             password=self.password,
-            keepalive=60
+            keepalive=self.KEEPALIVE
         )
         self.client.set_callback(self.sub_cb)
 
+    def subscribe(self, pattern, handler, qos=0):
+        """
+        Route messages matching pattern (+ and # allowed) to handler(topic, msg).
+        Subscribes at once when connected; every pattern is restored on reconnect.
+        """
+        self.router.add(pattern, handler, qos)
+        if self.connected and self.client is not None:
+            try:
+                self.client.subscribe(pattern, qos)
+                if self.subscribed is not None:
+                    self.subscribed = self.router.subscriptions()
+            except Exception as e:
+                logger.error("MQTT", f"Subscribe to {pattern} failed: {e}")
+                self._set_connected(False)
+
     def sub_cb(self, topic, msg):
-        logger.debug("MQTT", f"Received message: {msg.decode()}")
+        if not self.router.dispatch(topic, msg):
+            logger.debug("MQTT", f"No handler for {topic}")
+
+    def _on_state(self, topic, msg):
+        # The retained state is re-sent on every reconnect and publishers
+        # repeat it; an identical payload changes nothing
+        if msg == self.last_payload:
+            self.duplicates += 1
+            return
+        self.last_payload = msg
+        if logger.LOG_LEVEL <= 0:
+            logger.debug("MQTT", f"Received message: {msg}")
         try:
-            data = json.loads(msg.decode())
-            self.state = data
-            self.inform(self.state)
+            # Compact binary payloads carry a header byte, anything else is JSON
+            data = decode_state(msg) if is_binary(msg) else json.loads(msg)
+            self._apply_state(data)
             logger.debug("MQTT", f"Parsed state: {data}")
         except Exception as e:
             logger.error("MQTT", f"Error parsing message: {e}")
 
+    def apply_state(self, data):
+        """Take a state from another source, e.g. StateManager polling while disconnected."""
+        self.last_payload = None  # the next broker message is applied even if it repeats the old one
+        self._apply_state(data)
+
+    def _apply_state(self, data):
+        self.state = data
+        self.state_version += 1
+        self.inform(self.state)
+
     def connect_and_subscribe(self):
         try:
             if self.client is not None:
@@ -52,11 +134,17 @@ class MQTTService:
                     pass
 
             self._create_client()
-            self.client.connect()
-            self.client.subscribe(self.subscribe_topic, qos=0)
+            session_present = self.client.connect(clean_session=not self.persistent_session)
+            if self._session_resumed(session_present):
+                self.session_resumes += 1
+            else:
+                for pattern, qos in self.router.subscriptions():
+                    self.client.subscribe(pattern, qos)
+                self.subscribed = self.router.subscriptions()
             self.consecutive_failures = 0
             self.current_reconnect_delay = self.reconnect_delay
             self._set_connected(True)
+            self._start_keepalive()
             logger.info("MQTT", "Connected successfully")
             return True
         except Exception as e:
@@ -71,23 +159,91 @@ class MQTTService:
         return False
 
     def _handle_reconnect(self):
-        if not self._should_attempt_reconnect():
-            return False
+        """Start a reconnect when the backoff allows, or advance the one in progress."""
+        if self.connection_step == self.CONN_IDLE:
+            if not self._should_attempt_reconnect():
+                return False
 
-        self.last_reconnect_attempt = time.time()
-        self.consecutive_failures += 1
+            self.last_reconnect_attempt = time.time()
+            self.consecutive_failures += 1
 
-        logger.info("MQTT", f"Reconnecting (attempt {self.consecutive_failures}, delay was {self.current_reconnect_delay}s)")
+            logger.info("MQTT", f"Reconnecting (attempt {self.consecutive_failures}, delay was {self.current_reconnect_delay}s)")
 
-        success = self.connect_and_subscribe()
+            try:
+                self._close_client()
+                self._create_client()
+                self.client.connect_start(clean_session=not self.persistent_session)
+            except Exception as e:
+                return self._reconnect_failed(e)
+            self._enter_step(self.CONN_CONNECTING)
+
+        return self._advance_reconnect()
+
+    def _advance_reconnect(self):
+        # Take every step that completes without waiting, then return
+        try:
+            if self.connection_step == self.CONN_CONNECTING:
+                session_present = self.client.connect_poll()
+                if session_present is None:
+                    return self._check_step_timeout()
+                if self._session_resumed(session_present):
+                    self.session_resumes += 1
+                    logger.info("MQTT", "Session resumed, subscriptions kept")
+                else:
+                    # All subscriptions go out in one SUBSCRIBE packet
+                    self.client.subscribe_start(self.router.subscriptions())
+                    self._enter_step(self.CONN_SUBSCRIBING)
+
+            if self.connection_step == self.CONN_SUBSCRIBING:
+                if self.client.subscribe_poll() is None:
+                    return self._check_step_timeout()
+                self.subscribed = self.router.subscriptions()
+        except Exception as e:
+            return self._reconnect_failed(e)
+
+        self.connection_step = self.CONN_IDLE
+        self.consecutive_failures = 0
+        self.current_reconnect_delay = self.reconnect_delay
+        self._set_connected(True)
+        self._start_keepalive()
+        logger.info("MQTT", "Connected successfully")
+        return True
+
+    def _session_resumed(self, session_present):
+        """True when the broker still holds every subscription we need."""
+        return (self.persistent_session and bool(session_present)
+                and self.subscribed == self.router.subscriptions())
 
-        if not success:
-            self.current_reconnect_delay = min(
-                self.current_reconnect_delay * 2,
-                self.max_reconnect_delay
-            )
+    def _enter_step(self, step):
+        self.connection_step = step
+        self.step_started = time.time()
 
-        return success
+    def _check_step_timeout(self):
+        if time.time() - self.step_started >= self.STEP_TIMEOUT:
+            return self._reconnect_failed(OSError(f"Timeout while {self.connection_step}"))
+        return False
+
+    def _reconnect_failed(self, error):
+        logger.error("MQTT", f"Connection failed: {error}")
+        self.connection_step = self.CONN_IDLE
+        self._close_client()
+        self._set_connected(False)
+        self.current_reconnect_delay = min(
+            self.current_reconnect_delay * 2,
+            self.max_reconnect_delay
+        )
+        return False
+
+    def _close_client(self):
+        if self.client is None:
+            return
+        try:
+            if self.connected:
+                self.client.disconnect()
+            elif self.client.sock is not None:
+                self.client.sock.close()
+        except Exception:
+            pass
 
     def check_msg(self):
         if not self.connected or self.client is None:
@@ -100,6 +256,74 @@ class MQTTService:
             logger.error("MQTT", f"Error in check_msg: {e}")
             self._set_connected(False)
             self._handle_reconnect()
+            return
+        self.keepalive()
+        self.flush()
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        """
+        Queue a message; it is sent by the next flush() while connected.
+        A queued message for the same topic is replaced, so only the
+        latest value is sent.
+        """
+        self.outbox.put(topic, msg, retain, qos)
+
+    def flush(self):
+        """Send one batch of queued messages. Called by check_msg() and each frame."""
+        if not self.connected or self.client is None or self.outbox.is_empty():
+            return
+        try:
+            self.outbox.drain(self.client, self.DRAIN_BYTES_PER_TICK)
+        except Exception as e:
+            logger.error("MQTT", f"Publish failed: {e}")
+            self._set_connected(False)
+
+    def keepalive(self):
+        """Ping an idle link and drop a dead one. Called by check_msg() and each frame."""
+        if self.ping_interval is None or not self.connected or self.client is None:
+            return
+        now = time.ticks_ms()
+        client = self.client
+        if client.packets_received == self._packets_received:
+            if self._ping_sent is not None:
+                if time.ticks_diff(now, self._ping_sent) >= self.ping_timeout_ms():
+                    self._link_dead()
+            elif time.ticks_diff(now, self._last_activity) >= self.ping_interval * 1000:
+                if self.ping():
+                    self.pings += 1
+                    self._ping_sent = now
+            return
+
+        # Anything received proves the link is alive
+        if client.pingresps != self._pingresps and self._ping_sent is not None:
+            rtt = time.ticks_diff(now, self._ping_sent)
+            self.last_rtt_ms = rtt
+            self.srtt_ms = rtt if self.srtt_ms is None else (7 * self.srtt_ms + rtt) / 8
+        self._packets_received = client.packets_received
+        self._pingresps = client.pingresps
+        self._last_activity = now
+        self._ping_sent = None
+
+    def ping_timeout_ms(self):
+        """How long to wait for a PINGRESP: four smoothed round trips, within limits."""
+        if self.srtt_ms is None:
+            return self.PING_TIMEOUT_MAX_MS
+        return int(max(self.PING_TIMEOUT_MIN_MS, min(self.PING_TIMEOUT_MAX_MS, 4 * self.srtt_ms)))
+
+    def _start_keepalive(self):
+        if self.ping_interval is None:
+            return
+        self._ping_sent = None
+        self._last_activity = time.ticks_ms()
+        self._packets_received = self.client.packets_received
+        self._pingresps = self.client.pingresps
+
+    def _link_dead(self):
+        self.dead_links += 1
+        logger.warn("MQTT", f"No PINGRESP within {self.ping_timeout_ms()} ms, link is dead")
+        self._set_connected(False)
+        self._close_client()
+        self._handle_reconnect()
 
     def ping(self):
         if not self.connected or self.client is None:
@@ -115,9 +339,18 @@ class MQTTService:
     def is_connected(self):
         return self.connected
 
+    def socket(self):
+        """Socket of the broker connection, for select.poll; None while disconnected."""
+        if not self.connected or self.client is None:
+            return None
+        return getattr(self.client, 'sock', None)
+
     def get_state(self):
         return self.state
 
+    def get_state_version(self):
+        return self.state_version
+
     def add_listener(self, listener):
         self.listeners.append(listener)
 
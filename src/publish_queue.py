@@ -0,0 +1,99 @@
+"""
+Bounded outbound MQTT publish queue.
+
+Messages wait in a ring of fixed slots backed by one preallocated
+payload buffer, so queueing does not grow the heap however long the
+broker is unreachable. A message for a topic that is already queued
+replaces the queued payload in place and keeps its position: only the
+latest value of a topic is ever sent. When all slots are taken the
+oldest message is dropped to make room. drain() publishes from the
+head with a byte budget per call so a backlog after a reconnect is sent
+over several frames instead of blocking one.
+"""
+
+import array
+
+
+class PublishQueue:
+
+    def __init__(self, slots=8, max_payload=128):
+        # One slot is kept free to tell "full" from "empty"
+        self._size = slots + 1
+        self.max_payload = max_payload
+        self._buffer = bytearray(self._size * max_payload)
+        self._view = memoryview(self._buffer)
+        self._lengths = array.array('H', [0] * self._size)
+        self._flags = bytearray(self._size)  # bit 0 retain, bits 1-2 qos
+        self._topics = [None] * self._size
+        self._index = {}  # topic -> ring position of its queued message
+        self._head = 0
+        self._tail = 0
+
+        # Metrics
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def put(self, topic, msg, retain=False, qos=0):
+        """Queue a message, replacing one already queued for the topic."""
+        if isinstance(msg, str):
+            msg = msg.encode()
+        if len(msg) > self.max_payload:
+            raise ValueError(f"Payload of {len(msg)} bytes exceeds {self.max_payload}")
+        slot = self._index.get(topic)
+        if slot is not None:
+            self.coalesced += 1
+        else:
+            nxt = self._tail + 1
+            if nxt == self._size:
+                nxt = 0
+            if nxt == self._head:
+                self._discard_head()
+                self.dropped += 1
+            slot = self._tail
+            self._tail = nxt
+            self._topics[slot] = topic
+            self._index[topic] = slot
+        start = slot * self.max_payload
+        self._buffer[start:start + len(msg)] = msg
+        self._lengths[slot] = len(msg)
+        self._flags[slot] = (1 if retain else 0) | qos << 1
+
+    def pending(self):
+        return (self._tail - self._head) % self._size
+
+    def is_empty(self):
+        return self._head == self._tail
+
+    def drain(self, client, max_bytes):
+        """
+        Publish queued messages through client until about max_bytes of
+        payload are sent; at least one message goes out per call. Returns
+        the number published. A failing publish leaves its message queued
+        and the error propagates.
+        """
+        count = 0
+        budget = max_bytes
+        while self._head != self._tail:
+            slot = self._head
+            length = self._lengths[slot]
+            if count and length > budget:
+                break
+            start = slot * self.max_payload
+            flags = self._flags[slot]
+            client.publish(self._topics[slot], self._view[start:start + length],
+                           flags & 1 == 1, flags >> 1)
+            self._discard_head()
+            self.sent += 1
+            count += 1
+            budget -= length
+        return count
+
+    def _discard_head(self):
+        slot = self._head
+        del self._index[self._topics[slot]]
+        self._topics[slot] = None
+        slot += 1
+        if slot == self._size:
+            slot = 0
+        self._head = slot
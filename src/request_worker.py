@@ -0,0 +1,196 @@
+"""
+Background worker for closing time requests.
+
+submit() only stores the time in a single slot and returns, so a press
+never waits for the network. A worker thread sends whatever is in the
+slot; a press made while a request is in flight replaces the slot, and
+only the latest time is sent after it (latest wins). Failed requests
+are retried with a jittered, doubling delay until the request deadline
+passes. Completions are handed back to the main loop by poll(), which
+calls the listeners there rather than on the worker thread.
+
+run() queues other network work, such as the state poll, for the same
+thread. It only runs while no press is waiting and is not retried.
+"""
+
+import random
+import time
+
+import _thread
+
+import logger
+
+
+def _sleep_ms(ms):
+    if hasattr(time, 'sleep_ms'):
+        time.sleep_ms(ms)
+    else:
+        time.sleep(ms / 1000)
+
+
+class RequestWorker:
+
+    STACK_SIZE = 16 * 1024  # the TLS handshake needs more than the default thread stack
+    IDLE_SLEEP_MS = 20  # poll step while waiting out a retry delay
+
+    def __init__(self, send, deadline=30, retry_min=1, retry_max=8):
+        self.send = send  # send(value) -> HTTP status or None
+        self.deadline = deadline
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.listeners = []
+
+        self._lock = _thread.allocate_lock()
+        # Held while there is nothing to do; submit() and run() release it to wake the thread
+        self._wakeup = _thread.allocate_lock()
+        self._wakeup.acquire()
+        self._slot = None  # (value, ticks when submitted), waiting to be sent
+        self._generation = 0  # bumped by every submit()
+        self._results = []  # (value, ok, status), handed over by poll()
+        self._job = None  # (job, done) from run(), waiting for an idle worker
+        self._job_results = []  # (done, result), handed over by poll()
+        self._running = False
+        self._busy = False
+
+        # Metrics
+        self.sent = 0
+        self.retries = 0
+        self.superseded = 0
+        self.failures = 0
+        self.last_duration_ms = None
+
+    def add_listener(self, listener):
+        """listener(value, ok, status) is called from poll() when the latest request finished."""
+        self.listeners.append(listener)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        try:
+            _thread.stack_size(self.STACK_SIZE)
+        except (AttributeError, ValueError):
+            pass
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        self._running = False
+        self._wake()
+
+    def submit(self, value):
+        """Queue a request and return at once. Used as App.send_time."""
+        with self._lock:
+            if self._slot is not None or self._busy:
+                self.superseded += 1
+            self._slot = (value, time.ticks_ms())
+            self._generation += 1
+        self._wake()
+
+    def run(self, job, done=None):
+        """
+        Call job() on the worker thread once no press is waiting; done(result)
+        is called from poll(). Replaces a job that has not started yet.
+        """
+        with self._lock:
+            self._job = (job, done)
+        self._wake()
+
+    def busy(self):
+        return self._busy or self._slot is not None
+
+    def poll(self):
+        """Deliver finished requests to the listeners. Call from the main loop."""
+        if not self._results and not self._job_results:
+            return
+        with self._lock:
+            results = self._results
+            self._results = []
+            job_results = self._job_results
+            self._job_results = []
+        for done, result in job_results:
+            if done is None:
+                continue
+            try:
+                done(result)
+            except Exception as e:
+                logger.error("API", f"Error in job callback: {e}")
+        for value, ok, status in results:
+            for listener in self.listeners:
+                try:
+                    listener(value, ok, status)
+                except Exception as e:
+                    logger.error("API", f"Error in request listener: {e}")
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                job = self._slot
+                self._slot = None
+                generation = self._generation
+                self._busy = job is not None
+                background = None
+                if job is None:
+                    background = self._job
+                    self._job = None
+            if background is not None:
+                self._run_job(*background)
+                continue
+            if job is None:
+                self._wakeup.acquire()  # sleeps until the next submit() or run()
+                continue
+            ok, status = self._send_until_deadline(job[0], job[1], generation)
+            with self._lock:
+                self._busy = False
+                if generation == self._generation:
+                    self._results.append((job[0], ok, status))
+
+    def _wake(self):
+        # Only the worker acquires it, so it cannot be unlocked between the check and the release
+        if self._wakeup.locked():
+            self._wakeup.release()
+
+    def _run_job(self, job, done):
+        try:
+            result = job()
+        except Exception as e:
+            logger.error("API", f"Background job failed: {e}")
+            result = None
+        with self._lock:
+            self._job_results.append((done, result))
+
+    def _send_until_deadline(self, value, submitted, generation):
+        deadline = time.ticks_add(submitted, self.deadline * 1000)
+        delay = self.retry_min
+        while True:
+            started = time.ticks_ms()
+            try:
+                status = self.send(value)
+            except Exception as e:
+                logger.error("API", f"Request failed: {e}")
+                status = None
+            self.sent += 1
+            self.last_duration_ms = time.ticks_diff(time.ticks_ms(), started)
+            if status is not None and status < 500:
+                ok = 200 <= status < 300
+                if not ok:
+                    self.failures += 1
+                return ok, status  # a client error will not get better by retrying
+            # Jitter keeps retries of several devices from hitting the API together
+            wait_ms = int(delay * 1000 * (0.5 + random.getrandbits(8) / 256))
+            if generation != self._generation:
+                return False, status  # a newer press is waiting, stop retrying this one
+            if time.ticks_diff(deadline, time.ticks_add(time.ticks_ms(), wait_ms)) < 0:
+                self.failures += 1
+                logger.warn("API", f"Giving up on {value} after the {self.deadline} s deadline")
+                return False, status
+            self.retries += 1
+            logger.warn("API", f"Request for {value} failed ({status}), retrying in {wait_ms} ms")
+            self._sleep_unless_superseded(wait_ms, generation)
+            if generation != self._generation:
+                return False, status
+            delay = min(delay * 2, self.retry_max)
+
+    def _sleep_unless_superseded(self, wait_ms, generation):
+        end = time.ticks_add(time.ticks_ms(), wait_ms)
+        while self._running and generation == self._generation and time.ticks_diff(end, time.ticks_ms()) > 0:
+            _sleep_ms(self.IDLE_SLEEP_MS)
@@ -24,29 +24,31 @@ _R_CCW_2 = const(0x5)
 _R_CCW_3 = const(0x6)
 _R_ILLEGAL = const(0x7)
 
-_transition_table = [
+# Transition tables are flat bytes indexed by (state << 2) | CLK/DT,
+# so the IRQ does a single buffer lookup instead of two list lookups
+_transition_table = bytes((
 
     # |------------- NEXT STATE -------------|            |CURRENT STATE|
     # CLK/DT    CLK/DT     CLK/DT    CLK/DT
     #   00        01         10        11
-    [_R_START, _R_CCW_1, _R_CW_1, _R_START],  # _R_START
-    [_R_CW_2, _R_START, _R_CW_1, _R_START],  # _R_CW_1
-    [_R_CW_2, _R_CW_3, _R_CW_1, _R_START],  # _R_CW_2
-    [_R_CW_2, _R_CW_3, _R_START, _R_START | _DIR_CW],  # _R_CW_3
-    [_R_CCW_2, _R_CCW_1, _R_START, _R_START],  # _R_CCW_1
-    [_R_CCW_2, _R_CCW_1, _R_CCW_3, _R_START],  # _R_CCW_2
-    [_R_CCW_2, _R_START, _R_CCW_3, _R_START | _DIR_CCW],  # _R_CCW_3
-    [_R_START, _R_START, _R_START, _R_START]]  # _R_ILLEGAL
-
-_transition_table_half_step = [
-    [_R_CW_3, _R_CW_2, _R_CW_1, _R_START],
-    [_R_CW_3 | _DIR_CCW, _R_START, _R_CW_1, _R_START],
-    [_R_CW_3 | _DIR_CW, _R_CW_2, _R_START, _R_START],
-    [_R_CW_3, _R_CCW_2, _R_CCW_1, _R_START],
-    [_R_CW_3, _R_CW_2, _R_CCW_1, _R_START | _DIR_CW],
-    [_R_CW_3, _R_CCW_2, _R_CW_3, _R_START | _DIR_CCW],
-    [_R_START, _R_START, _R_START, _R_START],
-    [_R_START, _R_START, _R_START, _R_START]]
+    _R_START, _R_CCW_1, _R_CW_1, _R_START,  # _R_START
+    _R_CW_2, _R_START, _R_CW_1, _R_START,  # _R_CW_1
+    _R_CW_2, _R_CW_3, _R_CW_1, _R_START,  # _R_CW_2
+    _R_CW_2, _R_CW_3, _R_START, _R_START | _DIR_CW,  # _R_CW_3
+    _R_CCW_2, _R_CCW_1, _R_START, _R_START,  # _R_CCW_1
+    _R_CCW_2, _R_CCW_1, _R_CCW_3, _R_START,  # _R_CCW_2
+    _R_CCW_2, _R_START, _R_CCW_3, _R_START | _DIR_CCW,  # _R_CCW_3
+    _R_START, _R_START, _R_START, _R_START))  # _R_ILLEGAL
+
+_transition_table_half_step = bytes((
+    _R_CW_3, _R_CW_2, _R_CW_1, _R_START,
+    _R_CW_3 | _DIR_CCW, _R_START, _R_CW_1, _R_START,
+    _R_CW_3 | _DIR_CW, _R_CW_2, _R_START, _R_START,
+    _R_CW_3, _R_CCW_2, _R_CCW_1, _R_START,
+    _R_CW_3, _R_CW_2, _R_CCW_1, _R_START | _DIR_CW,
+    _R_CW_3, _R_CCW_2, _R_CW_3, _R_START | _DIR_CCW,
+    _R_START, _R_START, _R_START, _R_START,
+    _R_START, _R_START, _R_START, _R_START))
 
 _STATE_MASK = const(0x07)
 _DIR_MASK = const(0x30)
@@ -63,7 +65,20 @@ def _wrap(value, incr, lower_bound, upper_bound):
 
 
 def _bound(value, incr, lower_bound, upper_bound):
-    return min(upper_bound, max(lower_bound, value + incr))
+    value += incr
+    if value > upper_bound:
+        return upper_bound
+    if value < lower_bound:
+        return lower_bound
+    return value
+
+
+def _unbounded(value, incr, lower_bound, upper_bound):
+    return value + incr
+
+
+# keyed by Rotary.RANGE_UNBOUNDED / RANGE_WRAP / RANGE_BOUNDED
+_range_functions = {1: _unbounded, 2: _wrap, 3: _bound}
 
 
 def _trigger(rotary_instance):
@@ -76,7 +91,14 @@ class Rotary(object):
     RANGE_WRAP = const(2)
     RANGE_BOUNDED = const(3)
 
-    def __init__(self, min_val, max_val, incr, reverse, range_mode, half_step, invert):
+    # DELIVERY_IMMEDIATE: listeners are called from the IRQ on every step
+    # DELIVERY_LATEST: the IRQ only updates the value and sets a flag;
+    #   poll() calls listener(value, delta) once with the net change
+    DELIVERY_IMMEDIATE = const(1)
+    DELIVERY_LATEST = const(2)
+
+    def __init__(self, min_val, max_val, incr, reverse, range_mode, half_step, invert,
+                 delivery=DELIVERY_IMMEDIATE):
         self._min_val = min_val
         self._max_val = max_val
         self._incr = incr
@@ -87,6 +109,19 @@ class Rotary(object):
         self._half_step = half_step
         self._invert = invert
         self._listener = []
+        self._event_queue = None
+        self._delivery = delivery
+        self._changed = False
+        self._delivered_value = min_val
+        self._configure()
+
+    def _configure(self):
+        # Precompute everything the IRQ handler would otherwise branch on
+        self._table = _transition_table_half_step if self._half_step else _transition_table
+        self._invert_mask = 0x03 if self._invert else 0
+        self._step_cw = self._incr * self._reverse
+        self._step_ccw = -self._incr * self._reverse
+        self._apply_range = _range_functions[self._range_mode]
 
     def set(self, value=None, min_val=None, incr=None,
             max_val=None, reverse=None, range_mode=None):
@@ -106,6 +141,9 @@ class Rotary(object):
         if range_mode is not None:
             self._range_mode = range_mode
         self._state = _R_START
+        self._changed = False
+        self._delivered_value = self._value
+        self._configure()
 
         # enable DT and CLK pin interrupts
         self._hal_enable_irq()
@@ -115,6 +153,29 @@ class Rotary(object):
 
     def reset(self):
         self._value = 0
+        self._changed = False
+        self._delivered_value = 0
+
+    def poll(self):
+        # DELIVERY_LATEST only: deliver the net change since the last
+        # poll() once, outside the IRQ. Returns the delta (0 if none).
+        if not self._changed:
+            return 0
+        self._changed = False
+        value = self._value
+        delta = value - self._delivered_value
+        if self._range_mode == self.RANGE_WRAP:
+            span = self._max_val - self._min_val + 1
+            delta = (delta + span // 2) % span - span // 2
+        self._delivered_value = value
+        if delta == 0:
+            return 0
+        if self._event_queue is not None:
+            self._event_queue.push(self._event_code, value)
+            return delta
+        for listener in self._listener:
+            listener(value, delta)
+        return delta
 
     def close(self):
         self._hal_close()
@@ -122,53 +183,47 @@ class Rotary(object):
     def add_listener(self, l):
         self._listener.append(l)
 
+    # push (event_code, value) into event_queue instead of calling
+    # the listeners from the interrupt handler
+    def set_event_queue(self, event_queue, event_code):
+        self._event_queue = event_queue
+        self._event_code = event_code
+
     def remove_listener(self, l):
         if l not in self._listener:
             raise ValueError('{} is not an installed listener'.format(l))
         self._listener.remove(l)
 
+    @micropython.native
     def _process_rotary_pins(self, pin):
-        old_value = self._value
-        clk_dt_pins = (self._hal_get_clk_value() <<
-                       1) | self._hal_get_dt_value()
-
-        if self._invert:
-            clk_dt_pins = ~clk_dt_pins & 0x03
+        clk_dt_pins = ((self._hal_get_clk_value() << 1) |
+                       self._hal_get_dt_value()) ^ self._invert_mask
 
         # Determine next state
-        if self._half_step:
-            self._state = _transition_table_half_step[self._state &
-                                                      _STATE_MASK][clk_dt_pins]
-        else:
-            self._state = _transition_table[self._state &
-                                            _STATE_MASK][clk_dt_pins]
-        direction = self._state & _DIR_MASK
-
-        incr = 0
-        if direction == _DIR_CW:
-            incr = self._incr
-        elif direction == _DIR_CCW:
-            incr = -self._incr
-
-        incr *= self._reverse
-
-        if self._range_mode == self.RANGE_WRAP:
-            self._value = _wrap(
-                self._value,
-                incr,
-                self._min_val,
-                self._max_val)
-        elif self._range_mode == self.RANGE_BOUNDED:
-            self._value = _bound(
-                self._value,
-                incr,
-                self._min_val,
-                self._max_val)
-        else:
-            self._value = self._value + incr
+        state = self._table[((self._state & _STATE_MASK) << 2) | clk_dt_pins]
+        self._state = state
+        direction = state & _DIR_MASK
+        if direction == 0:
+            # most edges are intermediate states of a detent
+            return
 
+        old_value = self._value
+        self._value = self._apply_range(
+            old_value,
+            self._step_cw if direction == _DIR_CW else self._step_ccw,
+            self._min_val,
+            self._max_val)
+
+        if old_value == self._value:
+            return
+        if self._delivery == self.DELIVERY_LATEST:
+            self._changed = True
+            return
+        if self._event_queue is not None:
+            self._event_queue.push(self._event_code, self._value)
+            return
         try:
-            if old_value != self._value and len(self._listener) != 0:
+            if len(self._listener) != 0:
                 _trigger(self)
         except:
             pass
\ No newline at end of file
@@ -18,7 +18,8 @@ _esp8266_deny_pins = [16]
 class RotaryIRQ(Rotary):
 
     def __init__(self, pin_num_clk, pin_num_dt, min_val=0, max_val=10, incr=1,
-                 reverse=False, range_mode=Rotary.RANGE_UNBOUNDED, pull_up=False, half_step=False, invert=False):
+                 reverse=False, range_mode=Rotary.RANGE_UNBOUNDED, pull_up=False, half_step=False, invert=False,
+                 delivery=Rotary.DELIVERY_IMMEDIATE):
 
         if platform == 'esp8266':
             if pin_num_clk in _esp8266_deny_pins:
@@ -30,7 +31,7 @@ class RotaryIRQ(Rotary):
                     '%s: Pin %d not allowed. Not Available for Interrupt: %s' %
                     (platform, pin_num_dt, _esp8266_deny_pins))
 
-        super().__init__(min_val, max_val, incr, reverse, range_mode, half_step, invert)
+        super().__init__(min_val, max_val, incr, reverse, range_mode, half_step, invert, delivery)
 
         if pull_up == True:
             self._pin_clk = Pin(pin_num_clk, Pin.IN, Pin.PULL_UP)
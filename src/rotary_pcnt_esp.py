@@ -0,0 +1,88 @@
+# Platform-specific MicroPython code for the rotary encoder module
+# ESP32 pulse counter (PCNT) implementation
+
+# Same API as RotaryIRQ (value(), set(), reset(), listeners, poll()),
+# but the quadrature decoding and glitch filtering are done by the
+# PCNT peripheral through machine.Encoder. No Python code runs per
+# edge; the count is read on demand by value() and poll().
+
+from machine import Pin
+import machine
+from rotary import Rotary
+
+
+class RotaryPCNT(Rotary):
+
+    # Longest glitch filter the ESP32 PCNT supports is 1023 APB cycles (~12.7 us)
+    DEFAULT_FILTER_NS = 10000
+
+    def __init__(self, pin_num_clk, pin_num_dt, min_val=0, max_val=10, incr=1,
+                 reverse=False, range_mode=Rotary.RANGE_UNBOUNDED, pull_up=False, half_step=False, invert=False,
+                 delivery=Rotary.DELIVERY_IMMEDIATE, unit=0, filter_ns=DEFAULT_FILTER_NS, encoder=None):
+        # invert is accepted for API compatibility: the PCNT counts
+        # whole quadrature cycles, so the idle level does not matter
+        super().__init__(min_val, max_val, incr, reverse, range_mode, half_step, invert, delivery)
+
+        if encoder is None:
+            pull = Pin.PULL_UP if pull_up else None
+            encoder = machine.Encoder(
+                unit,
+                Pin(pin_num_clk, Pin.IN, pull),
+                Pin(pin_num_dt, Pin.IN, pull),
+                phases=2 if half_step else 1,
+                filter_ns=filter_ns)
+        self._encoder = encoder
+        self._last_count = encoder.value()
+
+    def _sync(self):
+        # Fold the counts since the last read into the value. In bounded
+        # and wrap mode the range is applied to the net change, so read
+        # often (once per frame) to keep turning into a stop responsive.
+        count = self._encoder.value()
+        steps = count - self._last_count
+        if steps == 0:
+            return
+        self._last_count = count
+        old_value = self._value
+        self._value = self._apply_range(old_value, steps * self._step_cw, self._min_val, self._max_val)
+        if self._value != old_value:
+            self._changed = True
+
+    def value(self):
+        self._sync()
+        return self._value
+
+    def set(self, value=None, min_val=None, incr=None,
+            max_val=None, reverse=None, range_mode=None):
+        self._sync()
+        super().set(value, min_val, incr, max_val, reverse, range_mode)
+
+    def reset(self):
+        self._last_count = self._encoder.value()
+        super().reset()
+
+    def poll(self):
+        # Both delivery modes are served from here; there is no IRQ
+        self._sync()
+        if self._delivery == self.DELIVERY_LATEST:
+            return super().poll()
+        if not self._changed:
+            return 0
+        self._changed = False
+        delta = self._value - self._delivered_value
+        self._delivered_value = self._value
+        if self._event_queue is not None:
+            self._event_queue.push(self._event_code, self._value)
+            return delta
+        for listener in self._listener:
+            listener(self._value)
+        return delta
+
+    def _hal_enable_irq(self):
+        pass
+
+    def _hal_disable_irq(self):
+        pass
+
+    def _hal_close(self):
+        self._encoder.deinit()
@@ -0,0 +1,44 @@
+"""
+Sleep between main loop iterations until a socket is readable.
+
+The main loop calls wait() with the time left until its next frame. It
+returns early when the watched socket (the MQTT connection) has data, so
+broker messages are handled at once and the CPU idles the rest of the time
+instead of spinning through check_msg().
+"""
+
+import select
+
+
+class SocketWaiter:
+
+    def __init__(self):
+        self._poller = select.poll()
+        self._sock = None
+        self.wakeups = 0
+        self.timeouts = 0
+
+    def watch(self, sock):
+        """Watch sock (None to stop watching); cheap to call every iteration."""
+        if sock is self._sock:
+            return
+        if self._sock is not None:
+            try:
+                self._poller.unregister(self._sock)
+            except (OSError, KeyError, ValueError):
+                pass  # already closed by a reconnect
+        self._sock = sock
+        if sock is not None:
+            self._poller.register(sock, select.POLLIN)
+
+    def wait(self, timeout_ms):
+        """Block up to timeout_ms; True if the watched socket needs attention."""
+        if timeout_ms < 0:
+            timeout_ms = 0
+        # poll() without registered objects simply sleeps for the timeout
+        events = self._poller.poll(timeout_ms)
+        if events:
+            self.wakeups += 1
+            return True
+        self.timeouts += 1
+        return False
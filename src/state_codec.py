@@ -0,0 +1,47 @@
+"""
+Compact binary encoding of the msb/state payload.
+
+    byte 0    STATE_MAGIC (0xB1); no JSON document starts with it, so both
+              formats can share the msb/state topic
+    byte 1    flags: bit 0 open, bit 1 openUntil present
+    byte 2-3  openUntil as minutes after midnight, big endian
+
+decode_state() returns the same dict the JSON payload gives the display
+({'open': ..., 'openUntil': 'HH:MM'}) without running the JSON parser.
+"""
+
+STATE_MAGIC = 0xB1
+STATE_SIZE = 4
+FLAG_OPEN = 0x01
+FLAG_UNTIL = 0x02
+
+
+def is_binary(payload):
+    return len(payload) > 0 and payload[0] == STATE_MAGIC
+
+
+def decode_state(payload):
+    if len(payload) != STATE_SIZE or payload[0] != STATE_MAGIC:
+        raise ValueError("Invalid binary state payload")
+    flags = payload[1]
+    state = {'open': bool(flags & FLAG_OPEN)}
+    if flags & FLAG_UNTIL:
+        minutes = (payload[2] << 8) | payload[3]
+        if minutes >= 1440:
+            raise ValueError("openUntil out of range: {}".format(minutes))
+        state['openUntil'] = "{:02d}:{:02d}".format(minutes // 60, minutes % 60)
+    return state
+
+
+def encode_state(state):
+    """Encode a state dict; openUntil may be "HH:MM" or an ISO date-time."""
+    flags = FLAG_OPEN if state.get('open') else 0
+    minutes = 0
+    until = state.get('openUntil')
+    if until:
+        if 'T' in until:
+            until = until[until.index('T') + 1:]
+        hours, mins = until.split(':')[:2]
+        minutes = int(hours) * 60 + int(mins)
+        flags |= FLAG_UNTIL
+    return bytes((STATE_MAGIC, flags, minutes >> 8, minutes & 0xFF))
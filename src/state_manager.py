@@ -1,24 +1,154 @@
-import urequests as requests
+import json
+import time
+
+from http_client import HTTPConnection, split_url
 import logger
 
 class StateManager:
     base_url = "https://status.makerspacebonn.de/api"
     time_url = base_url + "/msb/state/openUntil/"
+    state_url = base_url + "/msb/state"
+
+    # Polling fallback while MQTT is down: the interval doubles while the
+    # state stays the same and drops back to the minimum when it changes
+    POLL_MIN_INTERVAL = 10  # seconds
+    POLL_MAX_INTERVAL = 120
+    POLL_TIMEOUT = 3  # presses queued behind a poll wait for it, keep it short
 
-    def __init__(self, api_key = None):
+    def __init__(self, api_key = None, mqtt_service = None, worker = None):
         self.api_key = api_key
+        self.mqtt_service = mqtt_service  # receives polled states via apply_state()
+        self.worker = worker  # RequestWorker that runs the polls off the main loop
+        self.connection = None  # kept open between requests, see http_client
+        self.poll_connection = None  # separate socket, only used by the polls
+
+        self.polling = False
+        self.poll_interval = self.POLL_MIN_INTERVAL
+        self._next_poll = 0
+        self._fetching = False  # a poll is queued or running on the worker
+        self._etag = None
+        self._last_modified = None
+
+        # Metrics
+        self.polls = 0
+        self.not_modified = 0
+        self.poll_changes = 0
+        self.poll_errors = 0
 
 
     def sendTime(self, time):
+        """Send the closing time. Returns the HTTP status, None if the request failed."""
         headers = {
             "msb-key": self.api_key,
         }
         url = self.time_url + time
         logger.debug("API", f"Sending request: {url}")
-        r = requests.get(url, headers=headers)
-        logger.info("API", f"Response: {r.status_code}")
-        logger.debug("API", f"Response body: {r.text}")
-        r.close()
+        try:
+            r = self._connection_for(url).request("GET", split_url(url)[3], headers)
+        except Exception as e:
+            logger.error("API", f"Request failed: {e}")
+            return None
+        logger.info("API", f"Response: {r.status} in {self.connection.last_response_ms} ms")
+        logger.debug("API", f"Response body: {r.body}")
+        return r.status
+
+    def poll_state(self, online=True):
+        """
+        Poll the state API while MQTT is disconnected. Call once per frame.
+
+        The request runs on the worker thread (RequestWorker.run) and the
+        state is applied on the main loop when worker.poll() hands it back,
+        so a slow API never stalls the display. Requests are conditional
+        (If-None-Match / If-Modified-Since), so an unchanged state costs a
+        304 without a body to parse. Polling stops as soon as MQTT is
+        connected again.
+        """
+        if self.mqtt_service is None or self.worker is None:
+            return
+        if self.mqtt_service.is_connected():
+            if self.polling:
+                logger.info("API", "MQTT is back, stopped polling the state")
+                self.polling = False
+                self._fetching = False
+                self.worker.run(self._close_poll_connection)
+            return
+        if not online:
+            return
+        now = time.ticks_ms()
+        if not self.polling:
+            logger.info("API", "MQTT is down, polling the state")
+            self.polling = True
+            self.poll_interval = self.POLL_MIN_INTERVAL
+            self._next_poll = now
+        if self._fetching or time.ticks_diff(now, self._next_poll) < 0:
+            return
+        self._fetching = True
+        self.worker.run(self._fetch_state, self._state_fetched)
+
+    def _fetch_state(self):
+        """Fetch the state if it changed. Runs on the worker thread; returns the state or None."""
+        headers = {}
+        if self._etag is not None:
+            headers["If-None-Match"] = self._etag
+        elif self._last_modified is not None:
+            headers["If-Modified-Since"] = self._last_modified
+        self.polls += 1
+        try:
+            use_ssl, host, port, path = split_url(self.state_url)
+            connection = self.poll_connection
+            if connection is None or (connection.use_ssl, connection.host, connection.port) != (use_ssl, host, port):
+                if connection is not None:
+                    connection.close()
+                self.poll_connection = HTTPConnection(host, port, use_ssl, timeout=self.POLL_TIMEOUT)
+            r = self.poll_connection.request("GET", path, headers)
+        except Exception as e:
+            self.poll_errors += 1
+            logger.error("API", f"State poll failed: {e}")
+            return None
+        if r.status == 304:
+            self.not_modified += 1
+            return None
+        if r.status != 200:
+            self.poll_errors += 1
+            logger.warn("API", f"State poll returned {r.status}")
+            return None
+        try:
+            data = json.loads(r.text)
+        except ValueError as e:
+            self.poll_errors += 1
+            logger.error("API", f"Invalid state from API: {e}")
+            return None
+        self._etag = r.headers.get('etag')
+        self._last_modified = r.headers.get('last-modified')
+        return data
+
+    def _state_fetched(self, data):
+        """Apply a polled state on the main loop and schedule the next poll."""
+        self._fetching = False
+        if not self.polling:
+            return  # MQTT came back while the request was running
+        # a server without validators sends the same state again
+        if data is not None and data != self.mqtt_service.get_state():
+            self.poll_changes += 1
+            logger.info("API", f"Polled state: {data}")
+            self.mqtt_service.apply_state(data)
+            self.poll_interval = self.POLL_MIN_INTERVAL
+        else:
+            self.poll_interval = min(self.poll_interval * 2, self.POLL_MAX_INTERVAL)
+        self._next_poll = time.ticks_add(time.ticks_ms(), self.poll_interval * 1000)
+
+    def _close_poll_connection(self):
+        if self.poll_connection is not None:
+            self.poll_connection.close()
+
+    def _connection_for(self, url):
+        use_ssl, host, port, _ = split_url(url)
+        connection = self.connection
+        if connection is None or (connection.use_ssl, connection.host, connection.port) != (use_ssl, host, port):
+            if connection is not None:
+                connection.close()
+            self.connection = HTTPConnection(host, port, use_ssl)
+        return self.connection
 
     def urlencode(self, value):
         return value.replace(':', '%3A')
@@ -0,0 +1,111 @@
+"""
+Displayed space state with optimistic closing time requests.
+
+StateStore sits between the MQTT service and the display. request()
+shows the requested openUntil at once as a pending entry on top of the
+last confirmed state. The entry is confirmed only by an msb/state
+message carrying the same openUntil; without one before confirm_timeout
+it is rolled back and the confirmed state shows again.
+"""
+
+import time
+
+import logger
+
+
+def _hhmm(value):
+    """openUntil as HH:MM, also from an ISO date-time."""
+    if value and 'T' in value:
+        value = value[value.index('T') + 1:]
+    return value[:5] if value else value
+
+
+class StateStore:
+
+    CONFIRMED = 'confirmed'
+    ROLLED_BACK = 'rolled back'
+
+    def __init__(self, mqtt_service, confirm_timeout=15):
+        self.mqtt_service = mqtt_service
+        self.confirm_timeout = confirm_timeout
+        self.listeners = []
+        self.confirmed = mqtt_service.get_state()
+        self.pending = None  # requested openUntil, shown until confirmed or rolled back
+        self.version = 0  # incremented whenever get_state() changes
+        self._deadline = 0
+        mqtt_service.add_listener(self._on_state)
+
+        # Metrics
+        self.confirmations = 0
+        self.rollbacks = 0
+        self.last_confirm_ms = None
+        self._requested_at = 0
+
+    def add_listener(self, listener):
+        """listener(time_string, outcome) with outcome CONFIRMED or ROLLED_BACK."""
+        self.listeners.append(listener)
+
+    def get_state(self):
+        if self.pending is None:
+            return self.confirmed
+        state = dict(self.confirmed or {})
+        state['open'] = True
+        state['openUntil'] = self.pending
+        state['pending'] = True
+        return state
+
+    def get_state_version(self):
+        return self.version
+
+    def request(self, time_string):
+        """Show a requested closing time until it is confirmed or times out."""
+        confirmed = self.confirmed or {}
+        if confirmed.get('open') and _hhmm(confirmed.get('openUntil')) == time_string:
+            # Already the state; no change message will come to confirm it
+            self._clear_pending()
+            return
+        now = time.ticks_ms()
+        self.pending = time_string
+        self._requested_at = now
+        self._deadline = time.ticks_add(now, self.confirm_timeout * 1000)
+        self.version += 1
+
+    def rollback(self, time_string=None):
+        """Drop the pending entry, e.g. because the request failed."""
+        if self.pending is None or (time_string is not None and time_string != self.pending):
+            return
+        requested = self.pending
+        self._clear_pending()
+        self.rollbacks += 1
+        logger.warn("STATE", f"Closing time {requested} not confirmed, rolled back")
+        self._inform(requested, self.ROLLED_BACK)
+
+    def poll(self):
+        """Roll back an entry past its deadline. Call once per frame."""
+        if self.pending is not None and time.ticks_diff(time.ticks_ms(), self._deadline) >= 0:
+            self.rollback()
+
+    def _on_state(self, state):
+        self.confirmed = state
+        self.version += 1
+        if self.pending is None or not isinstance(state, dict):
+            return
+        if state.get('open') and _hhmm(state.get('openUntil')) == self.pending:
+            requested = self.pending
+            self.last_confirm_ms = time.ticks_diff(time.ticks_ms(), self._requested_at)
+            self._clear_pending()
+            self.confirmations += 1
+            logger.info("STATE", f"Closing time {requested} confirmed after {self.last_confirm_ms} ms")
+            self._inform(requested, self.CONFIRMED)
+
+    def _clear_pending(self):
+        if self.pending is not None:
+            self.pending = None
+            self.version += 1
+
+    def _inform(self, time_string, outcome):
+        for listener in self.listeners:
+            try:
+                listener(time_string, outcome)
+            except Exception as e:
+                logger.error("STATE", f"Error in state listener: {e}")
@@ -0,0 +1,96 @@
+"""
+Closing time command over MQTT.
+
+Instead of an HTTPS request per button press, the requested openUntil is
+published over the broker connection that is already open:
+
+    msb/cmd/openUntil   {"openUntil": "22:30", "id": 7, "ack": "msb/cmd/ack/<client id>"}
+    <ack topic>         {"id": 7, "ok": true}
+
+The backend answers on the ack topic with the same id. Without a
+connection, or without an acknowledgement within ack_timeout_ms, the
+time is sent through the HTTP fallback instead.
+"""
+
+import json
+import time
+
+import logger
+
+
+class MQTTTimeCommand:
+
+    COMMAND_TOPIC = "msb/cmd/openUntil"
+    ACK_TOPIC_PREFIX = "msb/cmd/ack/"
+
+    def __init__(self, mqtt_service, fallback=None, ack_timeout_ms=3000):
+        self.mqtt_service = mqtt_service
+        self.fallback = fallback
+        self.ack_timeout_ms = ack_timeout_ms
+        self.ack_topic = self.ACK_TOPIC_PREFIX + mqtt_service.client_id
+        mqtt_service.subscribe(self.ack_topic, self._on_ack)
+
+        self.sequence = 0
+        self._pending = None  # (id, time string, ticks when sent)
+
+        # Metrics
+        self.acks = 0
+        self.rejects = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.last_latency_ms = None
+
+    def __call__(self, time_string):
+        """Used as App.send_time."""
+        self.send(time_string)
+
+    def send(self, time_string):
+        if not self.mqtt_service.is_connected():
+            self._use_fallback(time_string, "MQTT not connected")
+            return
+        self.sequence += 1
+        payload = json.dumps({"openUntil": time_string, "id": self.sequence, "ack": self.ack_topic})
+        self._pending = (self.sequence, time_string, time.ticks_ms())
+        self.mqtt_service.publish(self.COMMAND_TOPIC, payload)
+        self.mqtt_service.flush()  # don't wait for the next frame
+        logger.info("API", f"Sent openUntil {time_string} over MQTT (id {self.sequence})")
+
+    def is_pending(self):
+        return self._pending is not None
+
+    def poll(self):
+        """Fall back to HTTP when the acknowledgement is overdue. Call each frame."""
+        if self._pending is None:
+            return
+        command_id, time_string, sent_at = self._pending
+        if time.ticks_diff(time.ticks_ms(), sent_at) < self.ack_timeout_ms:
+            return
+        self._pending = None
+        self.timeouts += 1
+        self._use_fallback(time_string, f"No acknowledgement for command {command_id}")
+
+    def _on_ack(self, topic, msg):
+        try:
+            ack = json.loads(msg)
+        except ValueError as e:
+            logger.error("API", f"Invalid acknowledgement: {e}")
+            return
+        if self._pending is None or ack.get("id") != self._pending[0]:
+            return  # late answer to a command that already timed out
+        latency = time.ticks_diff(time.ticks_ms(), self._pending[2])
+        self._pending = None
+        if ack.get("ok", True):
+            self.acks += 1
+            self.last_latency_ms = latency
+            logger.info("API", f"Command acknowledged after {latency} ms")
+        else:
+            self.rejects += 1
+            logger.error("API", f"Command rejected: {ack.get('error')}")
+
+    def _use_fallback(self, time_string, reason):
+        if self.fallback is None:
+            logger.error("API", f"{reason}, no fallback")
+            return
+        logger.warn("API", f"{reason}, sending over HTTP")
+        self.fallbacks += 1
+        self.fallback(time_string)
@@ -0,0 +1,53 @@
+# =============================================================================
+# CLOSING TIME SLOTS
+# =============================================================================
+# The closing times offered by the rotary picker only change every
+# quarter hour, so they are formatted once into a table and a rotary step
+# is a list lookup. Slot n is the local time (n + LEAD) quarter hours
+# from now, floored to the quarter hour.
+
+import time
+
+QUARTER = 15 * 60
+
+
+class ClosingTimeSlots:
+    """
+    Preformatted "HH:MM" closing times for rotary counters 0..count-1.
+
+    The table is rebuilt in place when the local quarter hour changes,
+    which also covers DST transitions (the local clock jumps).
+    """
+
+    LEAD = 2  # earliest offered closing time, in quarter hours from now
+
+    def __init__(self, zone, count=81):
+        self.zone = zone
+        self.count = count
+        self._slots = [""] * count
+        self._quarter = None
+        self.rebuilds = 0
+
+    def lookup(self, counter, t=None):
+        """Closing time string for counter at time t (default: now)."""
+        if t is None:
+            t = time.time()
+        quarter = self.zone.local_seconds(t) // QUARTER
+        if 0 <= counter < self.count:
+            if quarter != self._quarter:
+                self._rebuild(quarter)
+            return self._slots[counter]
+        return self._format(quarter + self.LEAD + counter)
+
+    def _rebuild(self, quarter):
+        slots = self._slots
+        first = quarter + self.LEAD
+        for i in range(self.count):
+            slots[i] = self._format(first + i)
+        self._quarter = quarter
+        self.rebuilds += 1
+
+    @staticmethod
+    def _format(quarter):
+        minutes = quarter * 15 % 1440
+        return "{:02d}:{:02d}".format(minutes // 60, minutes % 60)
@@ -0,0 +1,232 @@
+"""
+Background NTP time sync.
+
+TimeSync sends an NTP request over a non-blocking UDP socket and picks up
+the answer in later poll() calls, so the main loop never waits for the
+network. Small offsets are slewed into the RTC a few milliseconds at a
+time, large ones are stepped. The RTC drift measured between syncs is
+compensated continuously in the same way.
+"""
+
+import socket
+import struct
+import time
+
+import machine
+
+import logger
+
+# Seconds from the NTP epoch (1900) to the port's time.time() epoch
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+
+_NTP_PACKET_SIZE = 48
+_MODE_SERVER = 4
+
+
+class RTCClock:
+    """Wall clock in milliseconds, adjusted through machine.RTC."""
+
+    def __init__(self):
+        self.rtc = machine.RTC()
+
+    def now_ms(self):
+        return time.time_ns() // 1000000
+
+    def adjust_ms(self, delta_ms):
+        t = self.now_ms() + int(delta_ms)
+        tm = time.gmtime(t // 1000)
+        self.rtc.datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], t % 1000 * 1000))
+
+
+class TimeSync:
+    """
+    Periodic NTP resync driven by poll().
+
+    After a good sync the interval doubles from min_interval up to
+    max_interval; failed requests are retried after retry_min seconds,
+    doubling up to retry_max. Offsets of step_threshold_ms or more are
+    applied at once, smaller ones are slewed by at most slew_step_ms per
+    second.
+    """
+
+    IDLE = 'idle'
+    WAITING = 'waiting'
+
+    REQUEST_TIMEOUT_MS = 2000
+    MIN_ADJUST_MS = 20  # smaller corrections are not worth an RTC write
+    MIN_DRIFT_INTERVAL = 60  # seconds between syncs needed for a drift estimate
+    MAX_DRIFT_PPM = 500
+
+    def __init__(self, server="pool.ntp.org", port=123, clock=None,
+                 min_interval=300, max_interval=6 * 3600, retry_min=5, retry_max=300,
+                 step_threshold_ms=1000, slew_step_ms=50):
+        self.server = server
+        self.port = port
+        self.clock = clock if clock is not None else RTCClock()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.step_threshold_ms = step_threshold_ms
+        self.slew_step_ms = slew_step_ms
+
+        self.state = self.IDLE
+        self.interval = min_interval
+        self.retry_delay = retry_min
+        self.listeners = []
+
+        # Metrics
+        self.syncs = 0
+        self.failures = 0
+        self.last_offset_ms = None
+        self.last_rtt_ms = None
+        self.drift_ppm = 0.0
+        self.drift_known = False
+        self.pending_ms = 0.0  # correction still to be slewed into the RTC
+
+        self._sock = None
+        self._address = None
+        self._request = bytearray(_NTP_PACKET_SIZE)
+        self._sent_at = 0
+        self._sent_wall_ms = 0
+        self._next_sync = time.ticks_ms()
+        self._last_sync = None
+        self._last_compensation = time.ticks_ms()
+
+    def add_listener(self, listener):
+        """listener(offset_ms) is called after every successful sync."""
+        self.listeners.append(listener)
+
+    def sync_age(self):
+        """Seconds since the last successful sync, None if never synced."""
+        if self._last_sync is None:
+            return None
+        return time.ticks_diff(time.ticks_ms(), self._last_sync) // 1000
+
+    def is_synced(self):
+        return self._last_sync is not None
+
+    def poll(self, online=True):
+        """Advance the sync; returns at once. Call from the main loop."""
+        now = time.ticks_ms()
+        if self.state == self.WAITING:
+            self._receive(now)
+        elif online and time.ticks_diff(now, self._next_sync) >= 0:
+            self._send(now)
+        if self.state == self.IDLE:
+            self._compensate(now)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self.state = self.IDLE
+
+    def _send(self, now):
+        try:
+            if self._address is None:
+                # getaddrinfo blocks, so the result is kept until a request fails
+                self._address = socket.getaddrinfo(self.server, self.port)[0][-1]
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._sock.setblocking(False)
+            request = self._request
+            request[0] = 0x1B  # LI=0, VN=3, Mode=3 (client)
+            # Transmit timestamp, echoed by the server as originate timestamp
+            self._sent_wall_ms = self.clock.now_ms()
+            struct.pack_into('!II', request, 40, *self._to_ntp(self._sent_wall_ms))
+            self._sock.sendto(request, self._address)
+        except OSError as e:
+            self._failed(now, f"Request failed: {e}")
+            return
+        self._sent_at = now
+        self.state = self.WAITING
+        logger.debug("NTP", f"Request sent to {self.server}")
+
+    def _receive(self, now):
+        try:
+            data, _ = self._sock.recvfrom(_NTP_PACKET_SIZE)
+        except OSError:
+            if time.ticks_diff(now, self._sent_at) >= self.REQUEST_TIMEOUT_MS:
+                self._failed(now, "Request timed out")
+            return
+        received_wall_ms = self.clock.now_ms()
+        if len(data) < _NTP_PACKET_SIZE or data[0] & 0x07 != _MODE_SERVER or data[1] == 0:
+            self._failed(now, "Invalid or kiss-o'-death response")
+            return
+        if data[24:32] != self._request[40:48]:
+            # Late answer to an earlier request; keep waiting for ours
+            return
+        server_rx = self._from_ntp(*struct.unpack_from('!II', data, 32))
+        server_tx = self._from_ntp(*struct.unpack_from('!II', data, 40))
+        offset = ((server_rx - self._sent_wall_ms) + (server_tx - received_wall_ms)) / 2
+        self.last_rtt_ms = time.ticks_diff(now, self._sent_at)
+        self._synced(now, offset)
+
+    def _synced(self, now, offset):
+        self.state = self.IDLE
+        if self._last_sync is not None:
+            elapsed = time.ticks_diff(now, self._last_sync) / 1000
+            if elapsed >= self.MIN_DRIFT_INTERVAL and abs(offset) < self.step_threshold_ms:
+                # What is left after the predicted correction is drift we did not know about
+                residual = offset - self.pending_ms
+                drift = self.drift_ppm - residual * 1000 / elapsed
+                # Anything beyond a crystal's tolerance is a clock jump, not drift
+                if abs(drift) <= self.MAX_DRIFT_PPM:
+                    if self.drift_known:
+                        drift = (self.drift_ppm + drift) / 2
+                    self.drift_known = True
+                    self.drift_ppm = drift
+
+        if self._last_sync is None or abs(offset) >= self.step_threshold_ms:
+            self.clock.adjust_ms(offset)
+            self.pending_ms = 0.0
+            self.interval = self.min_interval
+        else:
+            self.pending_ms = offset
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        self.syncs += 1
+        self.last_offset_ms = offset
+        self.retry_delay = self.retry_min
+        self._last_sync = now
+        self._last_compensation = now
+        self._next_sync = time.ticks_add(now, self.interval * 1000)
+        logger.info("NTP", f"Synced, offset {offset:.0f} ms, rtt {self.last_rtt_ms} ms, drift {self.drift_ppm:.1f} ppm")
+        for listener in self.listeners:
+            try:
+                listener(offset)
+            except Exception as e:
+                logger.error("NTP", f"Error in sync listener: {e}")
+
+    def _failed(self, now, reason):
+        self.state = self.IDLE
+        self.failures += 1
+        self._address = None
+        self._next_sync = time.ticks_add(now, self.retry_delay * 1000)
+        logger.warn("NTP", f"{reason}, retrying in {self.retry_delay} s")
+        self.retry_delay = min(self.retry_delay * 2, self.retry_max)
+
+    def _compensate(self, now):
+        elapsed = time.ticks_diff(now, self._last_compensation)
+        if elapsed < 1000:
+            return
+        self._last_compensation = now
+        # The RTC gains drift_ppm microseconds per second
+        self.pending_ms -= self.drift_ppm * elapsed / 1000000
+        if abs(self.pending_ms) < self.MIN_ADJUST_MS:
+            return
+        limit = self.slew_step_ms * elapsed / 1000
+        step = max(-limit, min(limit, self.pending_ms))
+        self.clock.adjust_ms(step)
+        self.pending_ms -= step
+
+    @staticmethod
+    def _to_ntp(wall_ms):
+        seconds = wall_ms // 1000 + NTP_DELTA
+        fraction = (wall_ms % 1000) * 4294967296 // 1000
+        return seconds & 0xFFFFFFFF, fraction
+
+    @staticmethod
+    def _from_ntp(seconds, fraction):
+        return (seconds - NTP_DELTA) * 1000 + fraction * 1000 // 4294967296
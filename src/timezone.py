@@ -0,0 +1,233 @@
+# =============================================================================
+# TIMEZONE MODULE
+# =============================================================================
+# POSIX TZ rules (e.g. "CET-1CEST,M3.5.0,M10.5.0/3") compiled into UTC
+# transition instants. The DST start/end pair of a year is computed once
+# with integer date arithmetic (no mktime/localtime) and cached; offset()
+# then only checks whether the time is still inside the current interval.
+
+import time
+
+CENTRAL_EUROPE = "CET-1CEST,M3.5.0,M10.5.0/3"
+
+_DEFAULT_TRANSITION_TIME = 2 * 3600  # 02:00 local time
+_SECONDS_PER_DAY = 86400
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 of a proleptic Gregorian date."""
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month - 3 if month > 2 else month + 9) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+# time.time() counts from 1970 on most ports but from 2000 on some
+# (e.g. older ESP32 firmware); all instants here use the port's epoch
+_EPOCH_DAYS = _days_from_civil(time.gmtime(0)[0], 1, 1)
+
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def _month_length(year, month):
+    if month == 2:
+        return 29 if _is_leap(year) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+def _rule_day(year, rule):
+    """Days since 1970-01-01 of the day a transition rule selects in year."""
+    kind, a, b, c = rule
+    if kind == 'M':
+        # Mm.w.d: day d (0=Sunday) of week w (5=last) of month m
+        first = _days_from_civil(year, a, 1)
+        day = first + (c - (first + 4) % 7) % 7 + (b - 1) * 7
+        while day >= first + _month_length(year, a):
+            day -= 7
+        return day
+    start = _days_from_civil(year, 1, 1)
+    if kind == 'J':
+        # Jn: 1..365, February 29 is never counted
+        return start + a - 1 + (1 if _is_leap(year) and a >= 60 else 0)
+    # n: 0..365, February 29 is counted
+    return start + a
+
+
+class _Parser:
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ''
+
+    def take(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.take(char):
+            raise ValueError("Expected '{}' in TZ rule: {}".format(char, self.text))
+
+    def name(self):
+        if self.take('<'):
+            end = self.text.index('>', self.pos)
+            name = self.text[self.pos:end]
+            self.pos = end + 1
+            return name
+        start = self.pos
+        while self.peek().isalpha():
+            self.pos += 1
+        if self.pos - start < 3:
+            raise ValueError("Invalid zone name in TZ rule: " + self.text)
+        return self.text[start:self.pos]
+
+    def number(self):
+        start = self.pos
+        while self.peek().isdigit():
+            self.pos += 1
+        if start == self.pos:
+            raise ValueError("Expected a number in TZ rule: " + self.text)
+        return int(self.text[start:self.pos])
+
+    def duration(self):
+        """[+-]hh[:mm[:ss]] in seconds"""
+        sign = -1 if self.take('-') else 1
+        if sign == 1:
+            self.take('+')
+        seconds = self.number() * 3600
+        if self.take(':'):
+            seconds += self.number() * 60
+            if self.take(':'):
+                seconds += self.number()
+        return sign * seconds
+
+    def date_rule(self):
+        if self.take('M'):
+            month = self.number()
+            self.expect('.')
+            week = self.number()
+            self.expect('.')
+            weekday = self.number()
+            rule = ('M', month, week, weekday)
+        elif self.take('J'):
+            rule = ('J', self.number(), 0, 0)
+        else:
+            rule = ('n', self.number(), 0, 0)
+        at = self.duration() if self.take('/') else _DEFAULT_TRANSITION_TIME
+        return rule, at
+
+
+class TimeZone:
+    """
+    Local time for a POSIX TZ rule.
+
+    offset(t) returns the UTC offset in seconds, localtime(t) the local
+    time tuple and hhmm(t) the "HH:MM" clock string (cached per minute).
+    t defaults to time.time().
+    """
+
+    def __init__(self, rule=CENTRAL_EUROPE):
+        self.rule = rule
+        parser = _Parser(rule)
+        self.std_name = parser.name()
+        # POSIX offsets are west of UTC: "CET-1" is UTC+1
+        self.std_offset = -parser.duration()
+        self.dst_name = None
+        self.dst_offset = self.std_offset
+        self._start = self._end = None
+        if parser.peek() not in ('', ','):
+            self.dst_name = parser.name()
+            self.dst_offset = self.std_offset + 3600
+            if parser.peek() not in ('', ','):
+                self.dst_offset = -parser.duration()
+            if not parser.take(','):
+                # No rule given: assume the current EU rule
+                parser = _Parser(CENTRAL_EUROPE[CENTRAL_EUROPE.index(',') + 1:])
+            self._start = parser.date_rule()
+            parser.expect(',')
+            self._end = parser.date_rule()
+        if parser.peek():
+            raise ValueError("Unexpected trailing characters in TZ rule: " + rule)
+
+        self._years = {}
+        self._since = 0
+        self._until = -1
+        self._offset = self.std_offset
+        self._minute = None
+        self._hhmm = ""
+
+    def transitions(self, year):
+        """(dst_start, dst_end) of year as port epoch seconds, or None without DST."""
+        if self.dst_name is None:
+            return None
+        pair = self._years.get(year)
+        if pair is None:
+            (start_rule, start_at), (end_rule, end_at) = self._start, self._end
+            # The start is given in standard time, the end in daylight time
+            start = ((_rule_day(year, start_rule) - _EPOCH_DAYS) * _SECONDS_PER_DAY
+                     + start_at - self.std_offset)
+            end = ((_rule_day(year, end_rule) - _EPOCH_DAYS) * _SECONDS_PER_DAY
+                   + end_at - self.dst_offset)
+            pair = (start, end)
+            self._years[year] = pair
+        return pair
+
+    def offset(self, t=None):
+        """UTC offset in seconds at t."""
+        if t is None:
+            t = time.time()
+        if not self._since <= t < self._until:
+            self._rebuild(t)
+        return self._offset
+
+    def is_dst(self, t=None):
+        return self.dst_name is not None and self.offset(t) == self.dst_offset
+
+    def local_seconds(self, t=None):
+        """t shifted to local time, for arithmetic on the local clock."""
+        if t is None:
+            t = time.time()
+        return int(t) + self.offset(t)
+
+    def localtime(self, t=None):
+        return time.gmtime(self.local_seconds(t))
+
+    def hhmm(self, t=None):
+        """Local "HH:MM"; only formatted again when the minute changes."""
+        minute = self.local_seconds(t) // 60
+        if minute != self._minute:
+            self._minute = minute
+            self._hhmm = "{:02d}:{:02d}".format(minute // 60 % 24, minute % 60)
+        return self._hhmm
+
+    def _rebuild(self, t):
+        # Find the interval between two transitions containing t, looking
+        # at the neighbouring years too so that rules whose DST period
+        # spans New Year (southern hemisphere) work the same way
+        year = time.gmtime(int(t))[0]
+        if self.dst_name is None:
+            self._since = (_days_from_civil(year, 1, 1) - _EPOCH_DAYS) * _SECONDS_PER_DAY
+            self._until = (_days_from_civil(year + 1, 1, 1) - _EPOCH_DAYS) * _SECONDS_PER_DAY
+            self._offset = self.std_offset
+            return
+        changes = []
+        for y in (year - 1, year, year + 1):
+            start, end = self.transitions(y)
+            changes.append((start, self.dst_offset))
+            changes.append((end, self.std_offset))
+        changes.sort()
+        self._since, self._offset = changes[0]
+        for instant, offset in changes[1:]:
+            if instant > t:
+                self._until = instant
+                return
+            self._since, self._offset = instant, offset
@@ -0,0 +1,82 @@
+"""
+MQTT topic router with + and # wildcards.
+
+Patterns are split into a trie once, when they are added. A received
+topic walks the trie level by level; the handlers found for a topic are
+cached, so repeated topics (the usual case) cost one dict lookup however
+many patterns are registered.
+"""
+
+import logger
+
+_HANDLERS = '\x00'  # trie key holding a node's handlers; never a topic level
+
+
+class TopicRouter:
+
+    MAX_CACHED_TOPICS = 32
+
+    def __init__(self):
+        self._root = {}
+        self._subscriptions = []
+        self._cache = {}
+
+    def add(self, pattern, handler, qos=0):
+        """Call handler(topic, msg) for every message whose topic matches pattern."""
+        node = self._root
+        for level in pattern.split('/'):
+            node = node.setdefault(level, {})
+        node.setdefault(_HANDLERS, []).append(handler)
+        for index, (existing, existing_qos) in enumerate(self._subscriptions):
+            if existing == pattern:
+                self._subscriptions[index] = (pattern, max(qos, existing_qos))
+                break
+        else:
+            self._subscriptions.append((pattern, qos))
+        self._cache.clear()
+
+    def subscriptions(self):
+        """(pattern, qos) pairs, one per distinct pattern, in the order added."""
+        return list(self._subscriptions)
+
+    def match(self, topic):
+        """Handlers for a topic (str or bytes), in trie order."""
+        handlers = self._cache.get(topic)
+        if handlers is None:
+            name = topic.decode() if isinstance(topic, bytes) else topic
+            found = []
+            self._walk(self._root, name.split('/'), 0, found)
+            handlers = tuple(found)
+            if len(self._cache) >= self.MAX_CACHED_TOPICS:
+                self._cache.clear()
+            self._cache[topic] = handlers
+        return handlers
+
+    def dispatch(self, topic, msg):
+        """Deliver a message; returns the number of handlers called."""
+        handlers = self.match(topic)
+        for handler in handlers:
+            try:
+                handler(topic, msg)
+            except Exception as e:
+                logger.error("MQTT", f"Error in handler for {topic}: {e}")
+        return len(handlers)
+
+    def _walk(self, node, levels, index, found):
+        # Wildcards do not match topics starting with $ at the first level
+        wildcards = index > 0 or not levels[0].startswith('$')
+        if wildcards:
+            # '#' also matches the parent level: a/# matches a
+            multi = node.get('#')
+            if multi is not None:
+                found.extend(multi.get(_HANDLERS, ()))
+        if index == len(levels):
+            found.extend(node.get(_HANDLERS, ()))
+            return
+        child = node.get(levels[index])
+        if child is not None:
+            self._walk(child, levels, index + 1, found)
+        if wildcards:
+            child = node.get('+')
+            if child is not None:
+                self._walk(child, levels, index + 1, found)
@@ -1,20 +1,85 @@
+import json
+import os
 import time
 import network
 import logger
 
 
 class WifiManager:
+    """
+    Connects the station to one of the known networks.
+
+    With a cache_file the last good SSID, BSSID and channel are kept in
+    flash. A connect first goes to that access point directly, skipping
+    the scan, and falls back to a scan only when that fails. Addresses
+    always come from DHCP, and a connect only counts once the lease is
+    in, so nothing uses the network before it has an address.
+
+    Supervision is a state machine advanced by poll(), one short step
+    per call, so the main loop keeps drawing while WiFi is down. Failed
+    attempts wait in WIFI_BACKOFF with a doubling delay. connect_wifi()
+    runs the same steps until connected or failed.
+
+    Known access points are ranked by RSSI, with the priorities as
+    tiebreaker between similar signals. Scan results are reused for
+    SCAN_CACHE_TTL, so a retry tries the next access point without a
+    rescan. While connected, a signal below ROAM_THRESHOLD makes the
+    manager look for a clearly stronger access point and switch to it.
+    """
+
+    # Supervision steps driven by poll()
+    WIFI_IDLE = 'idle'
+    WIFI_CACHED = 'connecting cached'  # direct connect with the cached BSSID and channel
+    WIFI_SCAN_START = 'scan start'
+    WIFI_SCANNING = 'scanning'
+    WIFI_CONNECTING = 'connecting'
+    WIFI_CONNECTED = 'connected'
+    WIFI_BACKOFF = 'backoff'
 
     CONNECTION_TIMEOUT = 30  # seconds to wait for connection
-    MAX_RETRIES = 3  # max connection attempts per reconnect call
+    CACHED_CONNECTION_TIMEOUT = 5  # seconds before a cached connect falls back to scan and DHCP
+    RETRY_DELAY = 2  # seconds after a failed attempt, doubled up to MAX_RETRY_DELAY
+    MAX_RETRY_DELAY = 60
+    WAIT_INTERVAL_MS = 100  # between poll() steps in the blocking connect_wifi()
 
-    def __init__(self, wifi_access, hostname = "IoT Button"):
+    RSSI_MARGIN_DB = 4  # signals this close to the strongest count as equal and the priority decides
+    SCAN_CACHE_TTL = 10  # seconds scan results are reused
+    ROAM_THRESHOLD = -75  # dBm; a weaker link looks for a better access point, None disables roaming
+    ROAM_CHECK_INTERVAL = 30  # seconds between RSSI checks while connected
+    ROAM_MIN_GAIN_DB = 8  # a new access point must be this much stronger
+
+    def __init__(self, wifi_access, hostname = "IoT Button", cache_file = None, priorities = None):
         self.listeners = []
         self.hostname = hostname
         self.wifi_access = wifi_access
+        self.priorities = priorities or {}  # ssid -> number, higher wins between similar signals
         self.ssid = ''
         self.password = ''
+        self.bssid = None
+        self.channel = None
         self.sta_if = None
+        self.cache_file = cache_file
+        self.cache = self._load_cache()
+        self.state_listeners = []
+        self.step = self.WIFI_IDLE
+        self.step_started = 0
+        self.retry_delay = self.RETRY_DELAY
+        self.attempts = 0  # failed attempts since the last connection
+        self._attempt_started = 0
+        self._connect_method = 'scan'  # how the step WIFI_CONNECTING was entered
+        self._scan_results = None
+        self._scanned_at = 0
+        self._last_roam_check = 0
+
+        # Metrics
+        self.cached_connects = 0
+        self.scan_connects = 0
+        self.last_connect_ms = None  # time to connected of the last attempt
+        self.last_connect_method = None  # 'cached', 'scan' or 'roam'
+        self.scans = 0
+        self.cached_scans = 0  # scans answered from the scan cache
+        self.roams = 0
+        self.rssi = None  # of the connected access point at the last roaming check
 
     def addListener(self, listener):
         self.listeners.append(listener)
@@ -23,54 +88,150 @@ class WifiManager:
         for listener in self.listeners:
             listener(message)
 
-    def _scan_for_known_network(self):
-        """Scan and return (ssid, password) for first known network, or (None, None)."""
-        self.inform("Scanning wifi network...")
-        logger.info("WIFI", "Scanning for networks...")
+    def add_state_listener(self, listener):
+        """listener(step) is called on every supervision step change."""
+        self.state_listeners.append(listener)
+
+    def _load_cache(self):
+        """The last good connection from flash, or None."""
+        if self.cache_file is None:
+            return None
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+            if cache['ssid'] in self.wifi_access:
+                return cache
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _save_cache(self):
+        if self.cache_file is None or self.bssid is None:
+            return
+        cache = {
+            'ssid': self.ssid,
+            'bssid': self.bssid.hex(),
+            'channel': self.channel,
+        }
+        if cache == self.cache:
+            return  # spare the flash
         try:
-            wlans = self.sta_if.scan()
+            with open(self.cache_file, 'w') as f:
+                json.dump(cache, f)
+            self.cache = cache
         except OSError as e:
-            logger.error("WIFI", f"Scan failed: {e}")
-            return None, None
+            logger.error("WIFI", f"Could not save connection cache: {e}")
+
+    def _forget_cache(self):
+        self.cache = None
+        if self.cache_file is None:
+            return
+        try:
+            os.remove(self.cache_file)
+        except OSError:
+            pass
 
+    def _scan(self):
+        """scan() results, reused for SCAN_CACHE_TTL seconds. Raises OSError."""
+        now = time.ticks_ms()
+        if self._scan_results is not None and time.ticks_diff(now, self._scanned_at) < self.SCAN_CACHE_TTL * 1000:
+            self.cached_scans += 1
+            return self._scan_results
+        logger.info("WIFI", "Scanning for networks...")
+        self._scan_results = self.sta_if.scan()
+        self._scanned_at = time.ticks_ms()
+        self.scans += 1
+        return self._scan_results
+
+    def _drop_scan_result(self, bssid):
+        """Leave out an access point that just failed until the next scan."""
+        if self._scan_results is not None:
+            self._scan_results = [wlan for wlan in self._scan_results if bytes(wlan[1]) != bssid]
+
+    def _rank_networks(self, wlans):
+        """Scan entries of known networks, best first."""
+        known = []
         for wlan in wlans:
             ssid = wlan[0].decode()
-            logger.debug("WIFI", f"Found SSID: {ssid}")
-            if ssid in self.wifi_access.keys():
-                return ssid, self.wifi_access[ssid]
-
-        return None, None
+            logger.debug("WIFI", f"Found SSID: {ssid} ({wlan[3]} dBm)")
+            if ssid in self.wifi_access:
+                known.append(wlan)
+        if not known:
+            return known
+        similar = max(wlan[3] for wlan in known) - self.RSSI_MARGIN_DB
+        known.sort(key=lambda wlan: (wlan[3] >= similar,
+                                     self.priorities.get(wlan[0].decode(), 0) if wlan[3] >= similar else 0,
+                                     wlan[3]),
+                   reverse=True)
+        return known
 
-    def _attempt_connection(self, ssid, password):
-        """Attempt connection with timeout. Returns True if successful."""
+    def _best_network(self):
+        """Scan entry of the best known access point, or None."""
         try:
-            logger.debug("WIFI", f"Connecting to {ssid}...")
-            time.sleep_us(100)
-            self.sta_if.config(dhcp_hostname=self.hostname)
-            self.sta_if.connect(ssid, password)
+            ranked = self._rank_networks(self._scan())
+        except OSError as e:
+            logger.error("WIFI", f"Scan failed: {e}")
+            return None
+        return ranked[0] if ranked else None
 
-            start_time = time.time()
-            while not self.sta_if.isconnected():
-                if time.time() - start_time > self.CONNECTION_TIMEOUT:
-                    logger.warn("WIFI", f"Connection timeout after {self.CONNECTION_TIMEOUT}s")
-                    self.sta_if.disconnect()
-                    return False
-                time.sleep(1)
+    def _scan_for_known_network(self):
+        """Scan and return (ssid, password, bssid, channel) for the best known network, or Nones."""
+        wlan = self._best_network()
+        if wlan is None:
+            return None, None, None, None
+        ssid = wlan[0].decode()
+        return ssid, self.wifi_access[ssid], bytes(wlan[1]), wlan[2]
+
+    def _begin_connection(self, ssid, password, bssid=None):
+        """Start connecting to ssid, to one access point if bssid is given; returns immediately."""
+        logger.debug("WIFI", f"Connecting to {ssid}...")
+        self.sta_if.config(dhcp_hostname=self.hostname)
+        if bssid is None:
+            self.sta_if.connect(ssid, password)
+        else:
+            self.sta_if.connect(ssid, password, bssid=bssid)
 
-            logger.info("WIFI", f"Connected to {ssid}")
-            return True
+    def _begin_cached_connection(self):
+        """Start connecting with the cached BSSID and channel. Returns False without a cache."""
+        cache = self.cache
+        if cache is None:
+            return False
+        logger.debug("WIFI", f"Connecting to cached {cache['ssid']} on channel {cache['channel']}...")
+        self.ssid = cache['ssid']
+        self.password = self.wifi_access[self.ssid]
+        self.bssid = bytes.fromhex(cache['bssid'])
+        self.channel = cache['channel']
+        try:
+            try:
+                self.sta_if.config(channel=self.channel)
+            except (OSError, ValueError):
+                pass  # not settable in station mode on every port; the BSSID still skips the scan
+            self._begin_connection(self.ssid, self.password, self.bssid)
         except OSError as e:
-            logger.error("WIFI", f"Connection error: {e}")
+            logger.error("WIFI", f"Cached connection error: {e}")
+            self._abandon_cached_connection()
             return False
+        return True
 
-    def connect_wifi(self):
+    def _abandon_cached_connection(self):
+        """Drop a cached connection that did not come up."""
+        logger.warn("WIFI", "Cached connection failed, falling back to scan")
+        try:
+            self.sta_if.disconnect()
+        except OSError:
+            pass
+        self._forget_cache()
+
+    def _prepare_interfaces(self):
         ap_if = network.WLAN(network.AP_IF)
         ap_if.active(False)
         self.sta_if = network.WLAN(network.STA_IF)
         self.sta_if.active(True)
 
+    def _select_network(self):
+        """Scan and remember the known network to use. Returns False if none found."""
         # Scan for known networks (don't use stale values)
-        ssid, password = self._scan_for_known_network()
+        ssid, password, bssid, channel = self._scan_for_known_network()
 
         if ssid is None:
             self.inform("!!!!! No known networks found !!!!")
@@ -79,18 +240,152 @@ class WifiManager:
 
         self.ssid = ssid
         self.password = password
+        self.bssid = bssid
+        self.channel = channel
         self.inform('connecting to ' + self.ssid)
         logger.info("WIFI", f"Selected network: {self.ssid}")
+        return True
 
-        if not self.sta_if.isconnected():
-            if not self._attempt_connection(self.ssid, self.password):
-                self.inform('connection failed')
-                return False
-
+    def _connection_established(self, method):
         self.inform('connected to ' + self.ssid)
         logger.info("WIFI", f"Network config: {self.sta_if.ifconfig()}")
         logger.debug("WIFI", f"Hostname: {self.sta_if.config('dhcp_hostname')}")
-        return True
+        if method is not None:
+            self.last_connect_ms = time.ticks_diff(time.ticks_ms(), self._attempt_started)
+            self.last_connect_method = method
+            if method == 'cached':
+                self.cached_connects += 1
+            elif method == 'scan':
+                self.scan_connects += 1
+            logger.info("WIFI", f"Connected in {self.last_connect_ms} ms ({method})")
+        self._save_cache()
+        self.attempts = 0
+        self.retry_delay = self.RETRY_DELAY
+        self._last_roam_check = time.ticks_ms()
+        self._enter_step(self.WIFI_CONNECTED)
+
+    def _link_up(self):
+        """Associated and DHCP assigned an address."""
+        return self.sta_if.isconnected() and self.sta_if.ifconfig()[0] != '0.0.0.0'
+
+    def _enter_step(self, step):
+        self.step_started = time.ticks_ms()
+        if step == self.step:
+            return
+        self.step = step
+        for listener in self.state_listeners:
+            try:
+                listener(step)
+            except Exception as e:
+                logger.error("WIFI", f"Error in state listener: {e}")
+
+    def _step_elapsed(self, seconds):
+        return time.ticks_diff(time.ticks_ms(), self.step_started) >= seconds * 1000
+
+    def _start_attempt(self):
+        self._attempt_started = time.ticks_ms()
+        if self._link_up():
+            self._connection_established(None)  # already up, nothing to time
+        elif self._begin_cached_connection():
+            self._enter_step(self.WIFI_CACHED)
+        else:
+            self._enter_step(self.WIFI_SCAN_START)
+
+    def _attempt_failed(self, message):
+        self.attempts += 1
+        logger.error("WIFI", f"{message}, retrying in {self.retry_delay}s (attempt {self.attempts})")
+        self.inform('connection failed')
+        self._enter_step(self.WIFI_BACKOFF)
+
+    def _check_roaming(self):
+        """Switch to a clearly stronger access point when the link got weak."""
+        self._last_roam_check = time.ticks_ms()
+        try:
+            self.rssi = self.sta_if.status('rssi')
+        except (OSError, ValueError):
+            return
+        if self.rssi >= self.ROAM_THRESHOLD:
+            return
+        wlan = self._best_network()
+        if wlan is None or bytes(wlan[1]) == self.bssid or wlan[3] < self.rssi + self.ROAM_MIN_GAIN_DB:
+            logger.debug("WIFI", f"Weak link ({self.rssi} dBm), no better access point")
+            return
+        ssid = wlan[0].decode()
+        logger.info("WIFI", f"Roaming from {self.rssi} dBm to {ssid} at {wlan[3]} dBm")
+        self.roams += 1
+        self.ssid = ssid
+        self.password = self.wifi_access[ssid]
+        self.bssid = bytes(wlan[1])
+        self.channel = wlan[2]
+        self._attempt_started = time.ticks_ms()
+        self._connect_method = 'roam'
+        try:
+            self.sta_if.disconnect()
+            self._begin_connection(self.ssid, self.password, self.bssid)
+        except OSError as e:
+            self._attempt_failed(f"Roaming failed: {e}")
+            return
+        self._enter_step(self.WIFI_CONNECTING)
+
+    def poll(self):
+        """Advance WiFi supervision by one short step. Call once per frame."""
+        if self.sta_if is None:
+            self._prepare_interfaces()
+        step = self.step
+
+        if step == self.WIFI_CONNECTED:
+            if not self.sta_if.isconnected():
+                logger.warn("WIFI", "Link lost, reconnecting")
+                self.inform("Reconnecting...")
+                self._start_attempt()
+            elif (self.ROAM_THRESHOLD is not None
+                  and time.ticks_diff(time.ticks_ms(), self._last_roam_check) >= self.ROAM_CHECK_INTERVAL * 1000):
+                self._check_roaming()
+        elif step == self.WIFI_IDLE:
+            self._start_attempt()
+        elif step == self.WIFI_BACKOFF:
+            if self._step_elapsed(self.retry_delay):
+                self.retry_delay = min(self.retry_delay * 2, self.MAX_RETRY_DELAY)
+                self._start_attempt()
+        elif step == self.WIFI_CACHED:
+            if self._link_up():
+                logger.info("WIFI", f"Connected to {self.ssid} from cache")
+                self._connection_established('cached')
+            elif self._step_elapsed(self.CACHED_CONNECTION_TIMEOUT):
+                self._abandon_cached_connection()
+                self._enter_step(self.WIFI_SCAN_START)
+        elif step == self.WIFI_SCAN_START:
+            # Show the message before the scan, which blocks for a moment
+            self.inform("Scanning wifi network...")
+            self._enter_step(self.WIFI_SCANNING)
+        elif step == self.WIFI_SCANNING:
+            if not self._select_network():
+                self._attempt_failed("No known network")
+                return
+            self._connect_method = 'scan'
+            try:
+                self._begin_connection(self.ssid, self.password, self.bssid)
+            except OSError as e:
+                self._attempt_failed(f"Connection error: {e}")
+                return
+            self._enter_step(self.WIFI_CONNECTING)
+        elif step == self.WIFI_CONNECTING:
+            if self._link_up():
+                logger.info("WIFI", f"Connected to {self.ssid}")
+                self._connection_established(self._connect_method)
+            elif self._step_elapsed(self.CONNECTION_TIMEOUT):
+                self.sta_if.disconnect()
+                self._drop_scan_result(self.bssid)  # the next attempt tries another access point
+                self._attempt_failed(f"Connection timeout after {self.CONNECTION_TIMEOUT}s")
+
+    def connect_wifi(self):
+        """Connect now and wait for the result. Blocking wrapper around poll()."""
+        self._prepare_interfaces()
+        self._start_attempt()
+        while self.step not in (self.WIFI_CONNECTED, self.WIFI_BACKOFF):
+            time.sleep_ms(self.WAIT_INTERVAL_MS)
+            self.poll()
+        return self.step == self.WIFI_CONNECTED
 
     def check_wifi(self):
         if self.sta_if is None:
@@ -100,23 +395,10 @@ class WifiManager:
     def is_connected(self):
         return self.sta_if is not None and self.sta_if.isconnected()
 
-    def reconnect(self):
-        """Attempt reconnection with retries."""
-        for attempt in range(1, self.MAX_RETRIES + 1):
-            logger.info("WIFI", f"Reconnection attempt {attempt}/{self.MAX_RETRIES}")
-            self.inform(f"Reconnecting ({attempt}/{self.MAX_RETRIES})...")
-            if self.connect_wifi():
-                return True
-            time.sleep(2)  # Brief pause between retries
-
-        logger.error("WIFI", "All reconnection attempts failed")
-        self.inform("Reconnection failed")
-        return False
-
     def check_and_reconnect(self):
-        if not self.is_connected():
-            return self.reconnect()
-        return True
+        """Supervise the link without blocking. Returns True while connected."""
+        self.poll()
+        return self.step == self.WIFI_CONNECTED
 
     def disconnect(self):
         if self.sta_if is not None:
@@ -0,0 +1,142 @@
+"""Local TCP stand-in MQTT broker for testing the client side of the protocol."""
+
+import socket
+import struct
+import threading
+import time
+
+
+def read_packet(conn):
+    """Read one MQTT packet; returns (first_byte, body) or None on EOF."""
+    header = conn.recv(1)
+    if not header:
+        return None
+    size, shift = 0, 0
+    while True:
+        byte = conn.recv(1)[0]
+        size |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    body = b""
+    while len(body) < size:
+        chunk = conn.recv(size - len(body))
+        if not chunk:
+            return None
+        body += chunk
+    return header[0], body
+
+
+def _publish_packet(topic, msg, pid=None):
+    """PUBLISH packet, QoS 1 with packet id pid if given, else QoS 0."""
+    topic = topic.encode()
+    body = struct.pack("!H", len(topic)) + topic
+    if pid is not None:
+        body += struct.pack("!H", pid)
+    body += msg
+    header = bytearray(b"\x30" if pid is None else b"\x32")
+    size = len(body)
+    while size > 0x7F:
+        header.append((size & 0x7F) | 0x80)
+        size >>= 7
+    header.append(size)
+    return bytes(header) + body
+
+
+class StandInBroker:
+    """
+    Accepts connections on 127.0.0.1 and answers CONNECT, SUBSCRIBE and
+    PINGREQ; publish() sends a message to every client. on_publish(topic,
+    payload) is called for every QoS 0 PUBLISH a client sends, to stand in
+    for a backend.
+
+    connack_delay delays the CONNACK (None = never answer), return_code and
+    session_present shape it. queued is a list of (topic, payload) sent as
+    QoS 1 right after the CONNACK, as a broker delivers the messages it
+    kept for a persistent session. Received packets are kept in packets.
+    """
+
+    def __init__(self, connack_delay=0, return_code=0, session_present=False, on_publish=None, queued=()):
+        self.connack_delay = connack_delay
+        self.queued = list(queued)
+        self.on_publish = on_publish
+        self.return_code = return_code
+        self.session_present = session_present
+        self.packets = []
+        self.connections = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(4)
+        self.server.settimeout(0.05)
+        self.port = self.server.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                continue
+            conn.settimeout(None)
+            self.connections.append(conn)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            while self._running:
+                packet = read_packet(conn)
+                if packet is None:
+                    return
+                self.packets.append(packet)
+                kind = packet[0] >> 4
+                if kind == 1:  # CONNECT
+                    if self.connack_delay is None:
+                        continue
+                    time.sleep(self.connack_delay)
+                    conn.sendall(bytes((0x20, 0x02, 1 if self.session_present else 0, self.return_code)))
+                    for pid, (topic, msg) in enumerate(self.queued, 1):
+                        conn.sendall(_publish_packet(topic, msg, pid))
+                elif kind == 8:  # SUBSCRIBE
+                    body = packet[1]
+                    pid = struct.unpack("!H", body[:2])[0]
+                    granted = bytearray()
+                    offset = 2
+                    while offset < len(body):
+                        size = struct.unpack("!H", body[offset:offset + 2])[0]
+                        offset += 2 + size
+                        granted.append(body[offset])
+                        offset += 1
+                    conn.sendall(struct.pack("!BBH", 0x90, 2 + len(granted), pid) + bytes(granted))
+                elif kind == 3:  # PUBLISH, QoS 0
+                    body = packet[1]
+                    size = struct.unpack("!H", body[:2])[0]
+                    topic = body[2:2 + size].decode()
+                    if self.on_publish is not None:
+                        self.on_publish(topic, body[2 + size:])
+                elif kind == 12:  # PINGREQ
+                    conn.sendall(b"\xd0\x00")
+                elif kind == 14:  # DISCONNECT
+                    return
+        except OSError:
+            return
+
+    def publish(self, topic, msg):
+        """Send a QoS 0 PUBLISH to every connected client."""
+        for conn in self.connections:
+            conn.sendall(_publish_packet(topic, msg))
+
+    def packets_of(self, kind):
+        return [body for first, body in self.packets if first >> 4 == kind]
+
+    def close(self):
+        self._running = False
+        for conn in self.connections:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        self._thread.join()
+        self.server.close()
@@ -0,0 +1,123 @@
+"""Local HTTP/1.1 stand-in server for testing the API client side."""
+
+import socket
+import threading
+import time
+
+
+class StandInHTTPServer:
+    """
+    Serves HTTP/1.1 with keep-alive on 127.0.0.1.
+
+    handler(method, path, headers) returns (status, headers, body) and
+    defaults to 200 with body "ok"; bytes instead are sent as they are,
+    to stand in for a broken server. delay postpones every answer (slow
+    server). Received requests are kept in requests as (method, path,
+    headers); connections counts the accepted sockets. drop_connections()
+    closes the open ones, as a server does after its idle timeout.
+    """
+
+    def __init__(self, handler=None, delay=0):
+        self.handler = handler or (lambda method, path, headers: (200, {}, b"ok"))
+        self.delay = delay
+        self.requests = []
+        self.connections = 0
+        self._open = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.server.settimeout(0.05)
+        self.port = self.server.getsockname()[1]
+        self.url = "http://127.0.0.1:{}".format(self.port)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                continue
+            self.connections += 1
+            self._open.append(conn)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        reader = conn.makefile('rb')
+        try:
+            while self._running:
+                request_line = reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = reader.readline().decode().strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if 'content-length' in headers:
+                    reader.read(int(headers['content-length']))
+                self.requests.append((method, path, headers))
+                if self.delay:
+                    time.sleep(self.delay)
+                answer = self.handler(method, path, headers)
+                if isinstance(answer, bytes):
+                    conn.sendall(answer)
+                    continue
+                status, response_headers, body = answer
+                head = "HTTP/1.1 {} X\r\nContent-Length: {}\r\n".format(status, len(body))
+                for name, value in response_headers.items():
+                    head += "{}: {}\r\n".format(name, value)
+                conn.sendall(head.encode() + b"\r\n" + body)
+                if response_headers.get('Connection') == 'close':
+                    return
+        except (OSError, ValueError):
+            return
+        finally:
+            reader.close()
+            conn.close()
+
+    def drop_connections(self):
+        for conn in self._open:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._open = []
+        time.sleep(0.02)
+
+    def close(self):
+        self._running = False
+        self.drop_connections()
+        self._thread.join()
+        self.server.close()
+
+
+class StreamSocket:
+    """
+    Stands in for a MicroPython TLS socket: only read(), readline(),
+    write() and close(). read(size) blocks until it has size bytes or
+    the connection is closed, like MicroPython's stream read.
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+
+    def read(self, size=-1):
+        return self._reader.read(size)
+
+    def readline(self):
+        return self._reader.readline()
+
+    def write(self, data):
+        self._sock.sendall(data)
+        return len(data)
+
+    def close(self):
+        self._reader.close()
+        self._sock.close()
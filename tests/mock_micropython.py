@@ -0,0 +1,61 @@
+"""Stand-ins for MicroPython-only modules (micropython, ticks functions of time)."""
+
+import time
+import types
+
+
+def fake_micropython_module(schedule=None):
+    """Build a micropython module with identity const() and native, and optional schedule()."""
+    module = types.ModuleType('micropython')
+    module.const = lambda value: value
+    module.native = lambda function: function  # a compile-time decorator on the device
+    if schedule is not None:
+        module.schedule = schedule
+    return module
+
+
+class FakeTicksTime:
+    """Stand-in for the MicroPython time module with a settable ticks_ms()."""
+
+    def __init__(self):
+        self.now = 10000
+
+    def ticks_ms(self):
+        return self.now
+
+    def ticks_diff(self, a, b):
+        return a - b
+
+    def ticks_add(self, a, b):
+        return a + b
+
+    def time(self):
+        return self.now // 1000
+
+    def sleep(self, seconds):
+        self.now += int(seconds * 1000)
+
+    def sleep_ms(self, ms):
+        self.now += ms
+
+    def sleep_us(self, us):
+        self.now += us // 1000
+
+
+class HostTicksTime:
+    """Stand-in for the MicroPython time module running on the host clock."""
+
+    def ticks_ms(self):
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(self, a, b):
+        return a - b
+
+    def ticks_add(self, a, b):
+        return a + b
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
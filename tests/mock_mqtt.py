@@ -1,5 +1,9 @@
 """Mock MQTT client for testing purposes."""
 
+import socket
+import struct
+import types
+
 
 class MockMQTTClient:
     """Mock implementation of umqtt.simple.MQTTClient."""
@@ -7,28 +11,51 @@ class MockMQTTClient:
     _global_connect_should_fail = False
     _global_check_msg_should_fail = False
     _global_ping_should_fail = False
+    _global_connack_after_polls = 0
+    # Broker side state shared by all clients: retained messages and the
+    # sessions of clients that connected with clean_session=False
+    _retained = {}
+    _sessions = {}
 
-    def __init__(self, client_id, server, user=None, password=None, keepalive=0):
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0):
         self.client_id = client_id
         self.server = server
+        self.port = port
         self.user = user
         self.password = password
         self.keepalive = keepalive
         self.callback = None
         self.subscriptions = []
+        self.subscribe_packets = []  # topic lists sent through subscribe_start()
         self.connected = False
         self.messages = []
+        self.sock = None  # tests may attach one end of a socketpair
 
         self.connect_should_fail = MockMQTTClient._global_connect_should_fail
         self.check_msg_should_fail = MockMQTTClient._global_check_msg_should_fail
         self.ping_should_fail = MockMQTTClient._global_ping_should_fail
         self.disconnect_should_fail = False
+        # connect_poll() calls before the CONNACK arrives (None = never)
+        self.connack_after_polls = MockMQTTClient._global_connack_after_polls
+        self.suback_after_polls = 0
+        self.connect_poll_count = 0
+        self.subscribe_poll_count = 0
+        self.clean_session = True
+        self.session_present = False
+        # Keepalive: ping() queues a PINGRESP unless the link is dead
+        self.answer_pings = True
+        self.pingresp_pending = False
+        self.packets_received = 0
+        self.pingresps = 0
 
         self.connect_call_count = 0
         self.disconnect_call_count = 0
         self.subscribe_call_count = 0
         self.check_msg_call_count = 0
         self.ping_call_count = 0
+        self.publish_call_count = 0
+        self.publish_should_fail = False
+        self.published = []  # (topic, msg, retain, qos)
 
     @classmethod
     def set_global_connect_fail(cls, should_fail):
@@ -45,18 +72,89 @@ class MockMQTTClient:
         """Set global flag for all new clients to fail on ping."""
         cls._global_ping_should_fail = should_fail
 
+    @classmethod
+    def set_global_connack_delay(cls, polls):
+        """Set how many connect_poll() calls new clients wait for the CONNACK (None = never)."""
+        cls._global_connack_after_polls = polls
+
     @classmethod
     def reset_global_flags(cls):
         """Reset all global failure flags."""
         cls._global_connect_should_fail = False
         cls._global_check_msg_should_fail = False
         cls._global_ping_should_fail = False
+        cls._global_connack_after_polls = 0
+        cls._retained = {}
+        cls._sessions = {}
 
-    def connect(self):
+    @classmethod
+    def broker_publish(cls, topic, msg, retain=True):
+        """Publish as another client while ours is offline: retained and queued for QoS 1 sessions."""
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        if retain:
+            cls._retained[topic] = msg
+        for session in cls._sessions.values():
+            if any(name.encode() == topic and qos > 0 for name, qos in session['subscriptions']):
+                session['queue'].append((topic, msg))
+
+    def _open_session(self, clean_session):
+        self.clean_session = clean_session
+        if clean_session:
+            MockMQTTClient._sessions.pop(self.client_id, None)
+            self.session_present = False
+            return
+        self.session_present = self.client_id in MockMQTTClient._sessions
+        MockMQTTClient._sessions.setdefault(self.client_id, {'subscriptions': [], 'queue': []})
+
+    def _session_connected(self):
+        session = MockMQTTClient._sessions.get(self.client_id)
+        if session is not None and not self.clean_session:
+            self.messages.extend(session['queue'])
+            session['queue'] = []
+
+    def connect(self, clean_session=True):
         self.connect_call_count += 1
         if self.connect_should_fail:
             raise OSError("Connection refused")
+        self._open_session(clean_session)
         self.connected = True
+        self._session_connected()
+        return self.session_present
+
+    def connect_start(self, clean_session=True):
+        self.connect_call_count += 1
+        self.connect_poll_count = 0
+        if self.connect_should_fail:
+            raise OSError("Connection refused")
+        self._open_session(clean_session)
+
+    def connect_poll(self):
+        if self.connect_should_fail:
+            raise OSError("Connection refused")
+        if self.connected:
+            return self.session_present
+        if self.connack_after_polls is None or self.connect_poll_count < self.connack_after_polls:
+            self.connect_poll_count += 1
+            return None
+        self.connected = True
+        self._session_connected()
+        return self.session_present
+
+    def subscribe_start(self, topic, qos=0):
+        topics = [(topic, qos)] if isinstance(topic, (str, bytes)) else list(topic)
+        self.subscribe_packets.append(topics)
+        for name, topic_qos in topics:
+            self.subscribe(name, topic_qos)
+        self.subscribe_poll_count = 0
+
+    def subscribe_poll(self):
+        if self.subscribe_poll_count < self.suback_after_polls:
+            self.subscribe_poll_count += 1
+            return None
+        return True
 
     def disconnect(self):
         self.disconnect_call_count += 1
@@ -72,6 +170,12 @@ class MockMQTTClient:
         if not self.connected:
             raise OSError("Not connected")
         self.subscriptions.append((topic, qos))
+        session = MockMQTTClient._sessions.get(self.client_id)
+        if session is not None and not self.clean_session:
+            session['subscriptions'].append((topic, qos))
+        topic_key = topic.encode() if isinstance(topic, str) else topic
+        if topic_key in MockMQTTClient._retained:
+            self.messages.append((topic_key, MockMQTTClient._retained[topic_key]))
 
     def check_msg(self):
         self.check_msg_call_count += 1
@@ -80,8 +184,14 @@ class MockMQTTClient:
         if not self.connected:
             raise OSError("Not connected")
 
-        if self.messages and self.callback:
+        # Like umqtt, one packet per call
+        if self.pingresp_pending:
+            self.pingresp_pending = False
+            self.packets_received += 1
+            self.pingresps += 1
+        elif self.messages and self.callback:
             topic, msg = self.messages.pop(0)
+            self.packets_received += 1
             self.callback(topic, msg)
 
     def ping(self):
@@ -90,6 +200,15 @@ class MockMQTTClient:
             raise OSError("Ping failed")
         if not self.connected:
             raise OSError("Not connected")
+        self.pingresp_pending = self.answer_pings
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self.publish_call_count += 1
+        if self.publish_should_fail:
+            raise OSError("Publish failed")
+        if not self.connected:
+            raise OSError("Not connected")
+        self.published.append((topic, bytes(msg), retain, qos))
 
     def simulate_message(self, topic, msg):
         """Helper to simulate an incoming MQTT message."""
@@ -114,3 +233,112 @@ class MockMQTTClient:
         self.ping_should_fail = False
         self.disconnect_should_fail = False
         MockMQTTClient.reset_global_flags()
+
+
+class MQTTException(Exception):
+    """Stand-in for umqtt.simple.MQTTException."""
+
+
+class SimpleMQTTClient:
+    """Stand-in for the umqtt.simple.MQTTClient base class: same attributes,
+    connect/subscribe not implemented. Used to test subclasses on the host."""
+
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
+                 ssl=False, ssl_params={}):
+        if port == 0:
+            port = 8883 if ssl else 1883
+        self.client_id = client_id
+        self.sock = None
+        self.server = server
+        self.port = port
+        self.ssl = ssl
+        self.ssl_params = ssl_params
+        self.pid = 0
+        self.cb = None
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.lw_topic = None
+        self.lw_msg = None
+        self.lw_qos = 0
+        self.lw_retain = False
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.lw_topic = topic
+        self.lw_msg = msg
+        self.lw_qos = qos
+        self.lw_retain = retain
+
+    def _recv_len(self):
+        n = 0
+        sh = 0
+        while 1:
+            b = self.sock.read(1)[0]
+            n |= (b & 0x7F) << sh
+            if not b & 0x80:
+                return n
+            sh += 7
+
+    def _send_str(self, s):
+        self.sock.write(struct.pack("!H", len(s)))
+        self.sock.write(s)
+
+    def ping(self):
+        self.sock.write(b"\xc0\0")
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        if qos:
+            raise NotImplementedError("QoS 1 publish is not part of the stand-in")
+        pkt = bytearray(b"\x30\0\0\0")
+        pkt[0] |= retain
+        sz = 2 + len(topic) + len(msg)
+        i = 1
+        while sz > 0x7F:
+            pkt[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        pkt[i] = sz
+        self.sock.write(pkt, i + 1)
+        self._send_str(topic)
+        self.sock.write(msg)
+
+    def check_msg(self):
+        self.sock.setblocking(False)
+        return self.wait_msg()
+
+
+class StreamSocket(socket.socket):
+    """Host socket with MicroPython's read()/write(), as umqtt uses them."""
+
+    def read(self, size):
+        try:
+            return self.recv(size)
+        except BlockingIOError:
+            return None  # MicroPython returns None when nothing is buffered
+
+    def write(self, data, length=None):
+        if isinstance(data, str):
+            data = data.encode()
+        if length is not None:
+            data = data[:length]
+        self.sendall(data)
+        return len(data)
+
+
+def fake_socket_module():
+    """socket module whose sockets are StreamSockets, for mqtt_client on the host."""
+    module = types.ModuleType('socket')
+    module.socket = StreamSocket
+    module.getaddrinfo = socket.getaddrinfo
+    return module
+
+
+def fake_umqtt_simple_module():
+    """Build a umqtt.simple module exposing SimpleMQTTClient as MQTTClient."""
+    module = types.ModuleType('umqtt.simple')
+    module.MQTTClient = SimpleMQTTClient
+    module.MQTTException = MQTTException
+    return module
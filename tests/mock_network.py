@@ -0,0 +1,122 @@
+"""Mock MicroPython network module for testing purposes."""
+
+
+STA_IF = 0
+AP_IF = 1
+
+DHCP_ADDRESS = ('192.168.1.50', '255.255.255.0', '192.168.1.1', '192.168.1.1')
+NO_ADDRESS = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+
+
+class MockWLAN:
+    """Mock implementation of network.WLAN."""
+
+    def __init__(self, interface_id):
+        self.interface_id = interface_id
+        self.is_active = False
+        self.connected = False
+        self.config_values = {}
+        self.scan_results = []
+        self.rssi = -60  # of the connected access point, see status('rssi')
+        self.dead_bssids = set()  # access points whose connect never completes
+
+        # Number of isconnected() polls before a connect() succeeds, None = never
+        self.connect_after_polls = 0
+        self.polls_since_connect = 0
+        self.pending_ssid = None
+
+        self.scan_call_count = 0
+        self.connect_call_count = 0
+        self.disconnect_call_count = 0
+        self.connect_calls = []
+        self.leased = False  # DHCP address assigned, see ifconfig()
+        self.ifconfig_calls = []  # configurations set, 'dhcp' for a DHCP restart
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self.is_active
+        self.is_active = is_active
+
+    def scan(self):
+        self.scan_call_count += 1
+        return list(self.scan_results)
+
+    def connect(self, ssid=None, password=None, **kwargs):
+        self.connect_call_count += 1
+        self.connect_calls.append((ssid, password, kwargs))
+        self.pending_ssid = ssid
+        self.polls_since_connect = 0
+        self.config_values['ssid'] = ssid
+        bssid = kwargs.get('bssid')
+        if bssid is not None and (bssid in self.dead_bssids or all(entry[1] != bssid for entry in self.scan_results)):
+            self.pending_ssid = None  # that access point is gone, the connect never completes
+
+    def isconnected(self):
+        if not self.connected and self.pending_ssid is not None and self.connect_after_polls is not None:
+            if self.polls_since_connect >= self.connect_after_polls:
+                self.connected = True
+                self.leased = True
+            self.polls_since_connect += 1
+        return self.connected
+
+    def disconnect(self):
+        self.disconnect_call_count += 1
+        self.connected = False
+        self.leased = False
+        self.pending_ssid = None
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self.config_values.get(args[0])
+        self.config_values.update(kwargs)
+
+    def status(self, param=None):
+        if param == 'rssi':
+            return self.rssi
+        return 1010 if self.connected else 1000
+
+    def ifconfig(self, *args):
+        if args:
+            self.ifconfig_calls.append(args[0])
+            if args[0] == 'dhcp':
+                # As on ESP-IDF, (re)starting the DHCP client clears the address until the next lease
+                self.config_values.pop('ifconfig', None)
+                self.leased = False
+            else:
+                self.config_values['ifconfig'] = args[0]
+            return None
+        if 'ifconfig' in self.config_values:
+            return self.config_values['ifconfig']
+        return DHCP_ADDRESS if self.leased else NO_ADDRESS
+
+    def drop_link(self):
+        """Helper to simulate the access point going away."""
+        self.connected = False
+        self.leased = False
+        self.pending_ssid = None
+
+
+class MockNetworkModule:
+    """Stand-in for the network module; WLAN() returns one shared instance per interface."""
+
+    STA_IF = STA_IF
+    AP_IF = AP_IF
+
+    def __init__(self):
+        self.interfaces = {}
+
+    def WLAN(self, interface_id):
+        if interface_id not in self.interfaces:
+            self.interfaces[interface_id] = MockWLAN(interface_id)
+        return self.interfaces[interface_id]
+
+    @property
+    def sta(self):
+        return self.WLAN(STA_IF)
+
+
+def scan_entry(ssid, bssid=b'\x00\x11\x22\x33\x44\x55', channel=6, rssi=-60, security=3, hidden=False):
+    """Build a scan() result tuple as returned by MicroPython."""
+    if isinstance(ssid, str):
+        ssid = ssid.encode()
+    return (ssid, bssid, channel, rssi, security, hidden)
@@ -0,0 +1,29 @@
+"""Fake ESP32 pulse counter hardware for testing the PCNT rotary backend."""
+
+
+class FakeEncoder:
+    """Mock implementation of machine.Encoder backed by a plain counter."""
+
+    def __init__(self, unit=0, phase_a=None, phase_b=None, phases=1, filter_ns=0):
+        self.unit = unit
+        self.phase_a = phase_a
+        self.phase_b = phase_b
+        self.phases = phases
+        self.filter_ns = filter_ns
+        self.count = 0
+        self.read_count = 0
+        self.deinit_called = False
+
+    def value(self, value=None):
+        if value is not None:
+            self.count = value
+            return None
+        self.read_count += 1
+        return self.count
+
+    def deinit(self):
+        self.deinit_called = True
+
+    def turn(self, steps):
+        """Helper to simulate the hardware counting detents."""
+        self.count += steps
@@ -0,0 +1,207 @@
+"""Tests for App rendering with fake display and MQTT service."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import FakeTicksTime, fake_micropython_module
+
+APP_MODULES = ['app', 'event_queue', 'state_store']
+
+
+class FakeStateService:
+
+    def __init__(self):
+        self.state = {"open": True}
+        self.version = 1
+
+    def get_state(self):
+        return self.state
+
+    def get_state_version(self):
+        return self.version
+
+    def add_listener(self, listener):
+        self.listeners = [listener]
+
+
+class AppTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {'micropython': fake_micropython_module()})
+        self.patcher.start()
+        for name in APP_MODULES:
+            sys.modules.pop(name, None)
+        import app
+        self.app_module = app
+        self.display = MagicMock()
+        self.service = FakeStateService()
+        self.app = app.App(self.display, self.service, MagicMock(), send_time=MagicMock())
+
+    def tearDown(self):
+        self.patcher.stop()
+        for name in APP_MODULES:
+            sys.modules.pop(name, None)
+
+
+class TestAppRender(AppTestCase):
+
+    def test_normal_screen_is_drawn_once_while_unchanged(self):
+        """Test that identical frames are not redrawn."""
+        # Arrange
+        app = self.app
+
+        # Act
+        for _ in range(50):
+            app.render()
+
+        # Assert
+        self.assertEqual(self.display.status.call_count, 1)
+        self.assertEqual(app.skipped_frames, 49)
+
+    def test_new_state_version_redraws(self):
+        """Test that a state change is drawn on the next frame."""
+        # Arrange
+        app = self.app
+        app.render()
+
+        # Act
+        self.service.state = {"open": False}
+        self.service.version += 1
+        app.render()
+
+        # Assert
+        self.assertEqual(self.display.status.call_count, 2)
+        self.display.status.assert_called_with(self.app_module.getTimeString(), {"open": False})
+
+    def test_clock_change_redraws(self):
+        """Test that the next minute is drawn."""
+        # Arrange
+        app = self.app
+        with patch.object(self.app_module, 'getTimeString', return_value="10:00"):
+            app.render()
+
+        # Act
+        with patch.object(self.app_module, 'getTimeString', return_value="10:01"):
+            app.render()
+
+        # Assert
+        self.assertEqual(self.display.status.call_count, 2)
+
+    def test_mode_change_and_invalidate_redraw(self):
+        """Test redraws after a mode change and after invalidate()."""
+        # Arrange
+        app = self.app
+        app.render()
+
+        # Act
+        app.mode = 'setting time'
+        app.render()
+        app.render()
+        app.invalidate()
+        app.render()
+
+        # Assert
+        self.assertEqual(self.display.selectTime.call_count, 2)
+
+    def test_screensaver_animates_every_frame(self):
+        """Test that the screensaver is not throttled."""
+        # Arrange
+        app = self.app
+        app.mode = 'screensaver'
+
+        # Act
+        for _ in range(5):
+            app.render()
+
+        # Assert
+        self.assertEqual(self.display.screensaver.call_count, 5)
+
+
+
+class TestAppRequests(AppTestCase):
+
+    def test_failed_request_leaves_request_sent(self):
+        """Test that a failed request does not wait for a confirmation."""
+        # Arrange
+        self.app.mode = 'requestSent'
+
+        # Act
+        self.app.request_finished("22:00", False, 500)
+
+        # Assert
+        self.assertEqual(self.app.mode, 'normal')
+
+    def test_accepted_request_waits_for_confirmation(self):
+        """Test that an accepted request keeps waiting for the MQTT state."""
+        # Arrange
+        self.app.mode = 'requestSent'
+
+        # Act
+        self.app.request_finished("22:00", True, 200)
+
+        # Assert
+        self.assertEqual(self.app.mode, 'requestSent')
+
+
+class TestAppOptimisticState(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        import state_store
+        time_patcher = patch.object(state_store, 'time', FakeTicksTime())
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+        self.store = state_store.StateStore(self.service)
+        self.app = self.app_module.App(self.display, self.service, MagicMock(), send_time=MagicMock(),
+                                       state_store=self.store)
+
+    def test_click_shows_requested_time_at_once(self):
+        """Test that a click returns to normal mode showing the pending time."""
+        # Arrange
+        self.app.rotary_turned(4)
+        self.app.render()
+
+        # Act
+        self.app.button_clicked()
+        self.app.render()
+
+        # Assert
+        self.assertEqual(self.app.mode, 'normal')
+        self.app.send_time.assert_called_once_with(self.app.selected_time_string)
+        self.display.message.assert_not_called()
+        shown = self.display.status.call_args[0][1]
+        self.assertEqual(shown['openUntil'], self.app.selected_time_string)
+
+    def test_click_resets_the_rotary(self):
+        """Test that the next turn after a click starts from the first slot."""
+        # Arrange
+        self.app.rotary_turned(20)
+
+        # Act
+        self.app.button_clicked()
+
+        # Assert
+        self.app.rotary.reset.assert_called_once_with()
+
+    def test_failed_request_rolls_back(self):
+        """Test that a failed request shows the confirmed state again."""
+        # Arrange
+        self.app.rotary_turned(4)
+        self.app.button_clicked()
+        self.app.render()
+
+        # Act
+        self.app.request_finished(self.app.selected_time_string, False, 500)
+        self.app.render()
+
+        # Assert
+        self.assertEqual(self.display.status.call_args[0][1], {"open": True})
+        self.assertEqual(self.store.rollbacks, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,324 @@
+"""Tests for AsyncRuntime and the asyncio service variants with stand-in network classes."""
+
+import asyncio
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import HostTicksTime
+from tests.mock_mqtt import MockMQTTClient
+from tests.mock_network import MockNetworkModule, scan_entry
+
+
+ASYNC_MODULES = ['wifi_manager', 'mqtt_service', 'state_manager', 'async_services', 'async_runtime']
+
+
+class FakeApp:
+    """Records the calls AsyncRuntime makes into the application."""
+
+    def __init__(self):
+        self.updates = 0
+        self.renders = 0
+        self.rotary_values = []
+        self.clicks = 0
+
+    def update(self):
+        self.updates += 1
+
+    def render(self):
+        self.renders += 1
+
+    def rotary_turned(self, value):
+        self.rotary_values.append(value)
+
+    def button_clicked(self):
+        self.clicks += 1
+
+
+class FakeRotary:
+
+    def __init__(self):
+        self._value = 0
+
+    def value(self):
+        return self._value
+
+    def poll(self):
+        return 0
+
+
+class FakeButton:
+
+    def __init__(self):
+        self.button_press_count = 0
+
+    def poll(self):
+        pass
+
+
+class FakeTimeSync:
+
+    def __init__(self):
+        self.polls = []
+
+    def poll(self, online=True):
+        self.polls.append(online)
+
+
+class FakeTimeCommand:
+
+    def __init__(self):
+        self.polls = 0
+
+    def poll(self):
+        self.polls += 1
+
+
+class AsyncTestCase(unittest.TestCase):
+    """Patches the MicroPython-only modules and imports the async services."""
+
+    def setUp(self):
+        self.mock_client = None
+        MockMQTTClient.reset_global_flags()
+
+        def mock_mqtt_client_factory(*args, **kwargs):
+            self.mock_client = MockMQTTClient(*args, **kwargs)
+            return self.mock_client
+
+        self.network = MockNetworkModule()
+        self.patcher = patch.dict('sys.modules', {
+            'network': self.network,
+            'umqtt': MagicMock(),
+            'umqtt.simple': MagicMock(MQTTClient=MagicMock(side_effect=mock_mqtt_client_factory)),
+            'mqtt_client': MagicMock(NonBlockingMQTTClient=MagicMock(side_effect=mock_mqtt_client_factory)),
+            'urequests': MagicMock(),
+        })
+        self.patcher.start()
+        for name in ASYNC_MODULES:
+            sys.modules.pop(name, None)
+
+        import async_services
+        import async_runtime
+        import wifi_manager
+        time_patcher = patch.object(wifi_manager, 'time', HostTicksTime())
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+        self.async_services = async_services
+        self.async_runtime = async_runtime
+
+    def tearDown(self):
+        MockMQTTClient.reset_global_flags()
+        self.patcher.stop()
+        for name in ASYNC_MODULES:
+            sys.modules.pop(name, None)
+
+    def make_runtime(self, app=None, button=None, rotary=None, time_sync=None, time_command=None):
+        wifi = self.async_services.AsyncWifiManager({"Space": "secret"})
+        wifi.POLL_INTERVAL = 0.01
+        wifi.CHECK_INTERVAL = 0.01
+        wifi.retry_delay = 0.01
+        mqtt = self.async_services.AsyncMQTTService("broker", "user", "pass", "client")
+        mqtt.POLL_INTERVAL = 0.01
+        api = self.async_services.AsyncStateManager("key")
+        runtime = self.async_runtime.AsyncRuntime(app or FakeApp(), wifi, mqtt, api, button=button, rotary=rotary,
+                                                  time_sync=time_sync, time_command=time_command)
+        runtime.RENDER_INTERVAL = 0.01
+        runtime.TIME_SYNC_INTERVAL = 0.01
+        runtime.COMMAND_INTERVAL = 0.01
+        runtime.INPUT_INTERVAL = 0.005
+        return runtime
+
+    def run_for(self, runtime, seconds, during=None):
+        async def scenario():
+            runner = asyncio.create_task(runtime.run())
+            if during is not None:
+                await during()
+            await asyncio.sleep(seconds)
+            runtime.stop()
+            await runner
+
+        asyncio.run(scenario())
+
+
+class TestAsyncRuntime(AsyncTestCase):
+
+    def test_renders_while_wifi_is_reconnecting(self):
+        """Test that frames keep coming while WiFi never connects."""
+        # Arrange
+        self.network.sta.scan_results = [scan_entry("Space")]
+        self.network.sta.connect_after_polls = None
+        runtime = self.make_runtime()
+
+        # Act
+        self.run_for(runtime, 0.2)
+
+        # Assert
+        self.assertGreater(runtime.frames, 5)
+        self.assertGreater(self.network.sta.connect_call_count, 0)
+        self.assertIsNone(self.mock_client)
+
+    def test_mqtt_connects_once_wifi_is_up(self):
+        """Test that MQTT supervision starts after WiFi connects."""
+        # Arrange
+        self.network.sta.scan_results = [scan_entry("Space")]
+        self.network.sta.connect_after_polls = 3
+        runtime = self.make_runtime()
+        runtime.mqtt_service.last_reconnect_attempt = 0
+
+        # Act
+        self.run_for(runtime, 0.2)
+
+        # Assert
+        self.assertTrue(runtime.wifi_manager.is_connected())
+        self.assertTrue(runtime.mqtt_service.is_connected())
+        self.assertIn(("msb/state", 0), self.mock_client.subscriptions)
+
+    def test_input_changes_reach_app_outside_irq(self):
+        """Test that rotary and button changes are delivered by the input task."""
+        # Arrange
+        app = FakeApp()
+        rotary = FakeRotary()
+        button = FakeButton()
+        runtime = self.make_runtime(app=app, button=button, rotary=rotary)
+
+        async def turn_and_press():
+            await asyncio.sleep(0.03)
+            rotary._value = 3
+            button.button_press_count += 1
+
+        # Act
+        self.run_for(runtime, 0.1, during=turn_and_press)
+
+        # Assert
+        self.assertEqual(app.rotary_values, [3])
+        self.assertEqual(app.clicks, 1)
+
+    def test_time_sync_is_polled_with_wifi_state(self):
+        """Test that the time sync task polls and passes the WiFi state."""
+        # Arrange
+        self.network.sta.scan_results = [scan_entry("Space")]
+        self.network.sta.connect_after_polls = 3
+        time_sync = FakeTimeSync()
+        runtime = self.make_runtime(time_sync=time_sync)
+
+        # Act
+        self.run_for(runtime, 0.2)
+
+        # Assert
+        self.assertFalse(time_sync.polls[0])
+        self.assertTrue(time_sync.polls[-1])
+
+    def test_time_command_is_polled(self):
+        """Test that the command task checks for overdue acknowledgements."""
+        # Arrange
+        time_command = FakeTimeCommand()
+        runtime = self.make_runtime(time_command=time_command)
+
+        # Act
+        self.run_for(runtime, 0.1)
+
+        # Assert
+        self.assertGreater(time_command.polls, 2)
+
+    def test_render_errors_do_not_stop_the_loop(self):
+        """Test that an exception in render() does not kill the render task."""
+        # Arrange
+        app = FakeApp()
+
+        def failing_render():
+            app.renders += 1
+            raise RuntimeError("display gone")
+        app.render = failing_render
+        runtime = self.make_runtime(app=app)
+
+        # Act
+        self.run_for(runtime, 0.1)
+
+        # Assert
+        self.assertGreater(app.renders, 2)
+
+
+class TestAsyncStateManager(AsyncTestCase):
+
+    def test_split_url(self):
+        """Test URL splitting for http and https URLs."""
+        # Arrange
+        split_url = self.async_services.split_url
+
+        # Act
+        https = split_url("https://status.makerspacebonn.de/api/msb/state/openUntil/21:30")
+        http = split_url("http://127.0.0.1:8080/x")
+
+        # Assert
+        self.assertEqual(https, (True, "status.makerspacebonn.de", 443, "/api/msb/state/openUntil/21:30"))
+        self.assertEqual(http, (False, "127.0.0.1", 8080, "/x"))
+
+    def test_send_time_async_against_local_server(self):
+        """Test that sendTimeAsync sends the key header and returns the status."""
+        # Arrange
+        requests = []
+
+        async def handle(reader, writer):
+            head = await reader.readuntil(b"\r\n\r\n")
+            requests.append(head.decode())
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+            writer.close()
+
+        async def scenario():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            manager = self.async_services.AsyncStateManager("test-key")
+            manager.time_url = "http://127.0.0.1:{}/api/msb/state/openUntil/".format(port)
+            status = await manager.sendTimeAsync("21:30")
+            server.close()
+            await server.wait_closed()
+            return status
+
+        # Act
+        status = asyncio.run(scenario())
+
+        # Assert
+        self.assertEqual(status, 200)
+        self.assertTrue(requests[0].startswith("GET /api/msb/state/openUntil/21:30 HTTP/1.0"))
+        self.assertIn("msb-key: test-key", requests[0])
+
+    def test_send_time_async_failure_returns_none(self):
+        """Test that an unreachable server yields None instead of raising."""
+        # Arrange
+        manager = self.async_services.AsyncStateManager("test-key")
+        manager.time_url = "http://127.0.0.1:1/api/msb/state/openUntil/"
+
+        # Act
+        status = asyncio.run(manager.sendTimeAsync("21:30"))
+
+        # Assert
+        self.assertIsNone(status)
+
+    def test_runtime_send_time_does_not_block(self):
+        """Test that send_time schedules the request as a background task."""
+        # Arrange
+        async def slow_send(time_string):
+            await asyncio.sleep(0.05)
+            return 200
+
+        async def scenario():
+            runtime = self.make_runtime()
+            runtime.state_manager.sendTimeAsync = slow_send
+            runtime.send_time("21:30")
+            pending = len(runtime.pending_requests)
+            await asyncio.gather(*runtime.pending_requests)
+            return pending
+
+        # Act
+        pending = asyncio.run(scenario())
+
+        # Assert
+        self.assertEqual(pending, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+"""Tests for the allocation-free button ISR and the GestureDecoder."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import FakeTicksTime, fake_micropython_module
+
+
+class FakePin:
+
+    def __init__(self):
+        self.level = 1
+
+    def value(self):
+        return self.level
+
+
+class ButtonTestCase(unittest.TestCase):
+    """Imports button_handler with patched machine, micropython and ticks."""
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {
+            'micropython': fake_micropython_module(),
+            'machine': MagicMock(),
+        })
+        self.patcher.start()
+        for name in ('event_queue', 'button_handler'):
+            sys.modules.pop(name, None)
+        import button_handler
+        self.button_handler = button_handler
+        self.clock = FakeTicksTime()
+        self.time_patcher = patch.object(button_handler, 'time', self.clock)
+        self.time_patcher.start()
+        self.gestures = []
+
+    def tearDown(self):
+        self.time_patcher.stop()
+        self.patcher.stop()
+        for name in ('event_queue', 'button_handler'):
+            sys.modules.pop(name, None)
+
+    def emit(self, gesture, duration):
+        self.gestures.append(gesture)
+
+    def make_decoder(self, **kwargs):
+        return self.button_handler.GestureDecoder(**kwargs)
+
+    def press(self, decoder, at, held):
+        decoder.feed(0, at, self.emit)
+        decoder.feed(1, at + held, self.emit)
+
+
+class TestGestureDecoder(ButtonTestCase):
+
+    def test_short_press_gives_press_release_click(self):
+        """Test a single short press."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder()
+
+        # Act
+        self.press(decoder, 1000, 100)
+
+        # Assert
+        self.assertEqual(self.gestures, [bh.PRESS, bh.RELEASE, bh.CLICK])
+
+    def test_bounces_within_debounce_delay_are_ignored(self):
+        """Test that contact bounce does not produce extra gestures."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder(debounce_delay=50)
+
+        # Act
+        for t, level in ((1000, 0), (1003, 1), (1006, 0), (1200, 1), (1204, 0), (1207, 1)):
+            decoder.feed(level, t, self.emit)
+
+        # Assert
+        self.assertEqual(self.gestures, [bh.PRESS, bh.RELEASE, bh.CLICK])
+
+    def test_long_press_is_reported_while_held_and_suppresses_click(self):
+        """Test long press detection from tick()."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder(long_press=800)
+        decoder.feed(0, 1000, self.emit)
+
+        # Act
+        decoder.tick(1500, 0, self.emit)
+        decoder.tick(1900, 0, self.emit)
+        decoder.tick(2000, 0, self.emit)
+        decoder.feed(1, 2100, self.emit)
+
+        # Assert
+        self.assertEqual(self.gestures, [bh.PRESS, bh.LONG_PRESS, bh.RELEASE])
+
+    def test_double_click(self):
+        """Test that a second click within the window is a DOUBLE_CLICK."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder(double_click=300)
+
+        # Act
+        self.press(decoder, 1000, 80)
+        self.press(decoder, 1250, 80)
+
+        # Assert
+        self.assertEqual(self.gestures, [
+            bh.PRESS, bh.RELEASE, bh.CLICK,
+            bh.PRESS, bh.RELEASE, bh.DOUBLE_CLICK,
+        ])
+
+    def test_slow_second_click_is_a_click(self):
+        """Test that clicks outside the double-click window stay single clicks."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder(double_click=300)
+
+        # Act
+        self.press(decoder, 1000, 80)
+        self.press(decoder, 2000, 80)
+
+        # Assert
+        self.assertEqual(self.gestures.count(bh.CLICK), 2)
+
+    def test_cooldown_limits_clicks(self):
+        """Test that clicks inside the cooldown period are suppressed."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder(cooldown_period=1000, double_click=0)
+
+        # Act
+        self.press(decoder, 1000, 80)
+        self.press(decoder, 1500, 80)
+        self.press(decoder, 2500, 80)
+
+        # Assert
+        self.assertEqual(self.gestures.count(bh.CLICK), 2)
+
+    def test_tick_resyncs_to_pin_level_after_lost_edge(self):
+        """Test that a release lost inside the debounce window is recovered."""
+        # Arrange
+        bh = self.button_handler
+        decoder = self.make_decoder(debounce_delay=50)
+        decoder.feed(0, 1000, self.emit)
+        decoder.feed(1, 1030, self.emit)  # real release, but inside debounce window
+
+        # Act
+        decoder.tick(1100, 1, self.emit)
+
+        # Assert
+        self.assertEqual(self.gestures, [bh.PRESS, bh.RELEASE, bh.CLICK])
+
+
+class TestButtonHandler(ButtonTestCase):
+
+    def make_button(self, **kwargs):
+        button = self.button_handler.ButtonHandler(8, **kwargs)
+        button.button_pin = FakePin()
+        return button
+
+    def edge(self, button, level, advance=0):
+        self.clock.now += advance
+        button.button_pin.level = level
+        button.button_interrupt_handler(button.button_pin)
+
+    def test_isr_only_records_edges(self):
+        """Test that the ISR neither prints nor calls listeners."""
+        # Arrange
+        button = self.make_button(cooldown_period=0)
+        listener = MagicMock()
+        button.add_listener(listener)
+
+        # Act
+        with patch('builtins.print') as mock_print:
+            self.edge(button, 0)
+            self.edge(button, 1, advance=100)
+
+        # Assert
+        mock_print.assert_not_called()
+        listener.assert_not_called()
+        self.assertEqual(button._edges.pending(), 2)
+
+    def test_rapid_presses_are_all_decoded(self):
+        """Test ten fast presses recorded before a single poll()."""
+        # Arrange
+        button = self.make_button(cooldown_period=0, double_click=0, edge_buffer=32)
+        listener = MagicMock()
+        button.add_listener(listener)
+
+        # Act
+        for _ in range(10):
+            self.edge(button, 0, advance=60)
+            self.edge(button, 1, advance=60)
+        button.poll()
+
+        # Assert
+        self.assertEqual(listener.call_count, 10)
+        self.assertEqual(button.button_press_count, 10)
+        self.assertEqual(button.dropped_edges(), 0)
+
+    def test_gesture_listener_receives_long_press(self):
+        """Test that poll() reports a long press while the button is held."""
+        # Arrange
+        bh = self.button_handler
+        button = self.make_button(long_press=500)
+        gestures = []
+        button.add_gesture_listener(lambda gesture, duration: gestures.append(gesture))
+        self.edge(button, 0)
+
+        # Act
+        button.poll()
+        self.clock.now += 600
+        button.poll()
+
+        # Assert
+        self.assertEqual(gestures, [bh.PRESS, bh.LONG_PRESS])
+
+    def test_edge_buffer_overflow_is_counted(self):
+        """Test that edges beyond the buffer size are counted as dropped."""
+        # Arrange
+        button = self.make_button(edge_buffer=4)
+
+        # Act
+        for i in range(6):
+            self.edge(button, i % 2, advance=60)
+
+        # Assert
+        self.assertEqual(button.dropped_edges(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
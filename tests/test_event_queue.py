@@ -0,0 +1,206 @@
+"""Tests for the IRQ-safe EventQueue and the input drivers that feed it."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import FakeTicksTime, fake_micropython_module
+
+
+class EventQueueTestCase(unittest.TestCase):
+    """Imports event_queue with a patched micropython module."""
+
+    modules = ['event_queue']
+    scheduled = None
+
+    def setUp(self):
+        self.scheduled = []
+        self.patcher = patch.dict('sys.modules', self.patched_modules())
+        self.patcher.start()
+        for name in self.modules:
+            sys.modules.pop(name, None)
+        import event_queue
+        self.event_queue = event_queue
+
+    def patched_modules(self):
+        return {'micropython': fake_micropython_module(
+            schedule=lambda func, arg: self.scheduled.append((func, arg)))}
+
+    def tearDown(self):
+        self.patcher.stop()
+        for name in self.modules:
+            sys.modules.pop(name, None)
+
+
+class TestEventQueue(EventQueueTestCase):
+
+    def test_events_come_out_in_order(self):
+        """Test FIFO order of pushed events."""
+        # Arrange
+        queue = self.event_queue.EventQueue(4)
+        queue.push(self.event_queue.EVT_ROTARY, 1)
+        queue.push(self.event_queue.EVT_BUTTON)
+        queue.push(self.event_queue.EVT_ROTARY, -2)
+
+        # Act
+        events = [queue.pop(), queue.pop(), queue.pop(), queue.pop()]
+
+        # Assert
+        self.assertEqual(events, [
+            (self.event_queue.EVT_ROTARY, 1),
+            (self.event_queue.EVT_BUTTON, 0),
+            (self.event_queue.EVT_ROTARY, -2),
+            None,
+        ])
+
+    def test_wraps_around_the_buffer(self):
+        """Test that the ring buffer can be reused indefinitely."""
+        # Arrange
+        queue = self.event_queue.EventQueue(3)
+        received = []
+
+        # Act
+        for i in range(20):
+            queue.push(self.event_queue.EVT_ROTARY, i)
+            queue.drain(lambda code, arg: received.append(arg))
+
+        # Assert
+        self.assertEqual(received, list(range(20)))
+        self.assertEqual(queue.overflows, 0)
+
+    def test_overflow_is_counted_and_drops_newest(self):
+        """Test that a full queue drops new events and counts them."""
+        # Arrange
+        queue = self.event_queue.EventQueue(2)
+
+        # Act
+        results = [queue.push(self.event_queue.EVT_ROTARY, i) for i in range(5)]
+
+        # Assert
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(queue.overflows, 3)
+        self.assertEqual(queue.pending(), 2)
+        self.assertEqual(queue.pop(), (self.event_queue.EVT_ROTARY, 0))
+
+    def test_new_overflows_reports_only_new_drops(self):
+        """Test overflow reporting between main loop iterations."""
+        # Arrange
+        queue = self.event_queue.EventQueue(1)
+        queue.push(self.event_queue.EVT_BUTTON)
+        queue.push(self.event_queue.EVT_BUTTON)
+
+        # Act
+        first = queue.new_overflows()
+        second = queue.new_overflows()
+
+        # Assert
+        self.assertEqual(first, 1)
+        self.assertEqual(second, 0)
+
+    def test_drain_respects_limit(self):
+        """Test that drain() stops after limit events."""
+        # Arrange
+        queue = self.event_queue.EventQueue(8)
+        for i in range(5):
+            queue.push(self.event_queue.EVT_ROTARY, i)
+
+        # Act
+        handled = queue.drain(lambda code, arg: None, limit=3)
+
+        # Assert
+        self.assertEqual(handled, 3)
+        self.assertEqual(queue.pending(), 2)
+
+    def test_schedule_mode_schedules_one_drain(self):
+        """Test that schedule mode asks for a single soft callback per batch."""
+        # Arrange
+        received = []
+        queue = self.event_queue.EventQueue(8, use_schedule=True)
+        queue.set_handler(lambda code, arg: received.append((code, arg)))
+
+        # Act
+        queue.push(self.event_queue.EVT_BUTTON)
+        queue.push(self.event_queue.EVT_ROTARY, 4)
+        func, arg = self.scheduled[0]
+        func(arg)
+
+        # Assert
+        self.assertEqual(len(self.scheduled), 1)
+        self.assertEqual(received, [(self.event_queue.EVT_BUTTON, 0), (self.event_queue.EVT_ROTARY, 4)])
+
+
+class TestInputDriversUseQueue(EventQueueTestCase):
+
+    modules = ['event_queue', 'button_handler', 'rotary']
+
+    def patched_modules(self):
+        modules = super().patched_modules()
+        modules['machine'] = MagicMock()
+        return modules
+
+    def test_button_click_is_queued_instead_of_calling_listener(self):
+        """Test that a decoded click only queues an event."""
+        # Arrange
+        import button_handler
+        queue = self.event_queue.EventQueue(8)
+        clock = FakeTicksTime()
+        listener = MagicMock()
+        pin = MagicMock()
+        with patch.object(button_handler, 'time', clock):
+            button = button_handler.ButtonHandler(8, cooldown_period=1000, event_queue=queue)
+            button.add_listener(listener)
+            button.button_pin = pin
+
+            # Act
+            pin.value.return_value = 0
+            button.button_interrupt_handler(pin)
+            clock.now += 100
+            pin.value.return_value = 1
+            button.button_interrupt_handler(pin)
+            button.poll()
+
+        # Assert
+        listener.assert_not_called()
+        codes = [queue.pop()[0] for _ in range(3)]
+        self.assertEqual(codes, [
+            self.event_queue.EVT_BUTTON_PRESS,
+            self.event_queue.EVT_BUTTON_RELEASE,
+            self.event_queue.EVT_BUTTON,
+        ])
+
+    def test_rotary_step_pushes_new_value(self):
+        """Test that a full clockwise step queues the new value."""
+        # Arrange
+        import rotary
+
+        class PinRotary(rotary.Rotary):
+            pins = 3
+
+            def _hal_get_clk_value(self):
+                return self.pins >> 1
+
+            def _hal_get_dt_value(self):
+                return self.pins & 1
+
+        queue = self.event_queue.EventQueue(4)
+        encoder = PinRotary(0, 10, 1, False, rotary.Rotary.RANGE_BOUNDED, False, False)
+        encoder.set_event_queue(queue, self.event_queue.EVT_ROTARY)
+        listener = MagicMock()
+        encoder.add_listener(listener)
+
+        # Act
+        for pins in (2, 0, 1, 3):
+            encoder.pins = pins
+            encoder._process_rotary_pins(None)
+
+        # Assert
+        listener.assert_not_called()
+        self.assertEqual(queue.pop(), (self.event_queue.EVT_ROTARY, 1))
+        self.assertIsNone(queue.pop())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""Tests for the keep-alive HTTP client against a local stand-in server."""
+
+import sys
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_http import StandInHTTPServer, StreamSocket
+from tests.mock_micropython import FakeTicksTime
+
+
+class HTTPClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sys.modules.pop('http_client', None)
+        import http_client
+        self.http_client = http_client
+        self.ticks = FakeTicksTime()
+        self.time_patcher = patch.object(http_client, 'time', self.ticks)
+        self.time_patcher.start()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+        self.time_patcher.stop()
+        sys.modules.pop('http_client', None)
+
+    def make_connection(self, handler=None, **kwargs):
+        self.server = StandInHTTPServer(handler)
+        connection = self.http_client.HTTPConnection("127.0.0.1", self.server.port, **kwargs)
+        self.addCleanup(connection.close)
+        return connection
+
+
+class TestHTTPConnection(HTTPClientTestCase):
+
+    def test_requests_reuse_one_connection(self):
+        """Test that consecutive requests share a socket."""
+        # Arrange
+        connection = self.make_connection()
+
+        # Act
+        responses = [connection.request("GET", f"/n/{index}") for index in range(5)]
+
+        # Assert
+        self.assertEqual([r.status for r in responses], [200] * 5)
+        self.assertEqual([r.body for r in responses], [b"ok"] * 5)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(connection.connections, 1)
+        self.assertEqual(connection.reuses, 4)
+        self.assertEqual(self.server.requests[0][2]['host'], "127.0.0.1")
+
+    def test_idle_connection_is_replaced(self):
+        """Test that a connection idle past idle_timeout is not reused."""
+        # Arrange
+        connection = self.make_connection(idle_timeout=30)
+        connection.request("GET", "/")
+
+        # Act
+        self.ticks.now += 29000
+        connection.request("GET", "/")
+        self.ticks.now += 30000
+        connection.request("GET", "/")
+
+        # Assert
+        self.assertEqual(connection.connections, 2)
+        self.assertEqual(connection.reuses, 1)
+
+    def test_connection_closed_by_server_is_reopened(self):
+        """Test the transparent reconnect when the server dropped the kept socket."""
+        # Arrange
+        connection = self.make_connection()
+        connection.request("GET", "/")
+        self.server.drop_connections()
+
+        # Act
+        response = connection.request("GET", "/again")
+
+        # Assert
+        self.assertEqual(response.status, 200)
+        self.assertEqual(connection.reconnects, 1)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_connection_close_header_is_honoured(self):
+        """Test that 'Connection: close' ends the kept connection."""
+        # Arrange
+        connection = self.make_connection(lambda method, path, headers: (200, {'Connection': 'close'}, b"bye"))
+
+        # Act
+        connection.request("GET", "/")
+        connection.request("GET", "/")
+
+        # Assert
+        self.assertEqual(connection.connections, 2)
+        self.assertEqual(connection.reconnects, 0)
+
+    def test_headers_body_and_response_time(self):
+        """Test request headers, a JSON body and the recorded response time."""
+        # Arrange
+        connection = self.make_connection(
+            lambda method, path, headers: (201, {'Content-Type': 'application/json'}, b'{"a": 1}'))
+
+        # Act
+        response = connection.request("POST", "/x", {"msb-key": "secret"}, body=b"22:30")
+
+        # Assert
+        self.assertEqual(response.status, 201)
+        self.assertEqual(response.headers['content-type'], 'application/json')
+        self.assertEqual(response.text, '{"a": 1}')
+        self.assertEqual(self.server.requests[0][2]['msb-key'], "secret")
+        self.assertEqual(connection.last_response_ms, 0)
+        self.assertEqual(connection.requests, 1)
+
+    def test_unreachable_server_raises(self):
+        """Test that a refused connection surfaces as OSError."""
+        # Arrange
+        connection = self.http_client.HTTPConnection("127.0.0.1", 1)
+
+        # Act / Assert
+        with self.assertRaises(OSError):
+            connection.request("GET", "/")
+
+    def test_malformed_response_closes_the_connection(self):
+        """Test that an unparsable response raises OSError and is not reused."""
+        # Arrange
+        answers = [b"HTTP/1.1 2x0 OK\r\nContent-Length: 2\r\n\r\nok", (200, {}, b"ok")]
+        connection = self.make_connection(lambda method, path, headers: answers.pop(0))
+
+        # Act
+        with self.assertRaises(OSError):
+            connection.request("GET", "/")
+        response = connection.request("GET", "/")
+
+        # Assert
+        self.assertEqual(response.body, b"ok")
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(connection.reuses, 0)
+
+
+    def make_stream_connection(self, handler=None):
+        """A connection whose TLS socket is a read()-only stream, as on MicroPython."""
+        self.server = StandInHTTPServer(handler)
+        connection = self.http_client.HTTPConnection("127.0.0.1", self.server.port, use_ssl=True, timeout=1)
+        connection._wrap_tls = StreamSocket
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_stream_socket_reads_only_the_response(self):
+        """Test that a kept-alive stream is not read past the response."""
+        # Arrange
+        connection = self.make_stream_connection()
+
+        # Act
+        started = time.monotonic()
+        responses = [connection.request("GET", "/a"), connection.request("GET", "/b")]
+        duration = time.monotonic() - started
+
+        # Assert
+        self.assertEqual([r.body for r in responses], [b"ok", b"ok"])
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(connection.reuses, 1)
+        self.assertLess(duration, 0.5)
+
+    def test_stream_socket_reads_chunked_body(self):
+        """Test chunk sizes and trailers on a read()-only stream."""
+        # Arrange
+        chunked = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n"
+        connection = self.make_stream_connection(lambda method, path, headers: chunked)
+
+        # Act
+        bodies = [connection.request("GET", "/").body, connection.request("GET", "/").body]
+
+        # Assert
+        self.assertEqual(bodies, [b"abcde", b"abcde"])
+        self.assertEqual(connection.reuses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+"""Tests for the non-blocking connect of NonBlockingMQTTClient against a local stand-in broker."""
+
+import socket
+import struct
+import sys
+import os
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_broker import StandInBroker
+from tests.mock_mqtt import fake_umqtt_simple_module, fake_socket_module, MQTTException
+
+
+class NonBlockingClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {
+            'umqtt': MagicMock(),
+            'umqtt.simple': fake_umqtt_simple_module(),
+        })
+        self.patcher.start()
+        sys.modules.pop('mqtt_client', None)
+        import mqtt_client
+        self.mqtt_client = mqtt_client
+        self.socket_patcher = patch.object(mqtt_client, 'socket', fake_socket_module())
+        self.socket_patcher.start()
+        self.broker = None
+
+    def tearDown(self):
+        if self.broker is not None:
+            self.broker.close()
+        self.socket_patcher.stop()
+        self.patcher.stop()
+        sys.modules.pop('mqtt_client', None)
+
+    def make_client(self, port=None, **broker_options):
+        if port is None:
+            self.broker = StandInBroker(**broker_options)
+            port = self.broker.port
+        client = self.mqtt_client.NonBlockingMQTTClient(
+            "client-1", "127.0.0.1", port=port, user="user", password="pass", keepalive=60)
+        self.addCleanup(lambda: client.sock is not None and client.sock.close())
+        return client
+
+    def poll_until_done(self, poll, timeout=2):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            result = poll()
+            if result is not None:
+                return result
+            time.sleep(0.002)
+        self.fail("no answer from the stand-in broker")
+
+
+class TestNonBlockingConnect(NonBlockingClientTestCase):
+
+    def test_connect_and_subscribe(self):
+        """Test the full handshake step by step."""
+        # Arrange
+        client = self.make_client()
+
+        # Act
+        client.connect_start()
+        session_present = self.poll_until_done(client.connect_poll)
+        client.subscribe_start("msb/state", 0)
+        subscribed = self.poll_until_done(client.subscribe_poll)
+
+        # Assert
+        self.assertFalse(session_present)
+        self.assertTrue(subscribed)
+        connect = self.broker.packets_of(1)[0]
+        self.assertEqual(connect[:7], b"\x00\x04MQTT\x04")
+        self.assertEqual(connect[7], 0xC2)  # user, password, clean session
+        self.assertEqual(struct.unpack("!H", connect[8:10])[0], 60)
+        self.assertIn(b"client-1", connect)
+        self.assertIn(b"msb/state", self.broker.packets_of(8)[0])
+
+    def test_connect_poll_does_not_wait_for_connack(self):
+        """Test that polling returns at once while the broker is slow."""
+        # Arrange
+        client = self.make_client(connack_delay=0.3)
+        client.connect_start()
+
+        # Act
+        started = time.perf_counter()
+        results = [client.connect_poll() for _ in range(20)]
+        elapsed = time.perf_counter() - started
+
+        # Assert
+        self.assertEqual(results, [None] * 20)
+        self.assertLess(elapsed, 0.1)
+        self.assertFalse(self.poll_until_done(client.connect_poll))
+
+    def test_session_present_flag(self):
+        """Test that the CONNACK session present flag is returned."""
+        # Arrange
+        client = self.make_client(session_present=True)
+
+        # Act
+        client.connect_start(clean_session=False)
+        session_present = self.poll_until_done(client.connect_poll)
+
+        # Assert
+        self.assertTrue(session_present)
+        self.assertEqual(self.broker.packets_of(1)[0][7] & 0x02, 0)
+
+    def test_several_topics_in_one_subscribe_packet(self):
+        """Test that a topic list is sent as a single SUBSCRIBE."""
+        # Arrange
+        client = self.make_client()
+        client.connect_start()
+        self.poll_until_done(client.connect_poll)
+
+        # Act
+        client.subscribe_start([("msb/state", 0), ("msb/cmd/+", 1), ("space/#", 0)])
+        subscribed = self.poll_until_done(client.subscribe_poll)
+
+        # Assert
+        self.assertTrue(subscribed)
+        packets = self.broker.packets_of(8)
+        self.assertEqual(len(packets), 1)
+        self.assertIn(b"\x00\x09msb/cmd/+\x01", packets[0])
+        self.assertIn(b"space/#", packets[0])
+
+    def test_queued_messages_before_suback_are_delivered(self):
+        """Test that messages a session broker sends before the SUBACK reach the callback."""
+        # Arrange
+        client = self.make_client(session_present=True, queued=[("msb/state", b'{"open": true}'),
+                                                                ("msb/state", b'{"open": false}')])
+        received = []
+        client.set_callback(lambda topic, msg: received.append((topic, msg)))
+        client.connect_start(clean_session=False)
+        self.poll_until_done(client.connect_poll)
+
+        # Act
+        client.subscribe_start("msb/state", 1)
+        subscribed = self.poll_until_done(client.subscribe_poll)
+        time.sleep(0.05)  # let the stand-in read the PUBACKs
+
+        # Assert
+        self.assertTrue(subscribed)
+        self.assertEqual(received, [(b"msb/state", b'{"open": true}'), (b"msb/state", b'{"open": false}')])
+        self.assertEqual(self.broker.packets_of(4), [b"\x00\x01", b"\x00\x02"])
+        self.assertEqual(client.packets_received, 2)
+
+    def test_wait_msg_counts_pingresps_and_messages(self):
+        """Test the packet counters used by the keepalive."""
+        # Arrange
+        client = self.make_client()
+        received = []
+        client.set_callback(lambda topic, msg: received.append((topic, msg)))
+        client.connect_start()
+        self.poll_until_done(client.connect_poll)
+
+        def pingresp_received():
+            client.check_msg()
+            return client.pingresps or None
+
+        # Act
+        client.ping()
+        self.poll_until_done(pingresp_received)
+        self.broker.publish("msb/state", b"{}")
+        self.poll_until_done(lambda: client.check_msg())
+
+        # Assert
+        self.assertEqual(client.pingresps, 1)
+        self.assertEqual(client.packets_received, 2)
+        self.assertEqual(received, [(b"msb/state", b"{}")])
+
+    def test_refused_connack_raises(self):
+        """Test that a CONNACK return code other than 0 is an error."""
+        # Arrange
+        client = self.make_client(return_code=5)
+        client.connect_start()
+
+        # Act / Assert
+        with self.assertRaises(MQTTException):
+            self.poll_until_done(client.connect_poll)
+
+    def test_closed_port_raises(self):
+        """Test that a refused TCP connection surfaces as OSError."""
+        # Arrange
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        client = self.make_client(port=port)
+
+        # Act / Assert
+        with self.assertRaises(OSError):
+            client.connect_start()
+            self.poll_until_done(client.connect_poll)
+
+
+if __name__ == '__main__':
+    unittest.main()
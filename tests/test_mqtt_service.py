@@ -1,6 +1,7 @@
 """Tests for MQTTService with mocked MQTT client."""
 
 import json
+import time
 import sys
 import os
 import unittest
@@ -8,7 +9,9 @@ from unittest.mock import patch, MagicMock
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from tests.mock_mqtt import MockMQTTClient
+from tests.mock_broker import StandInBroker
+from tests.mock_micropython import FakeTicksTime, HostTicksTime
+from tests.mock_mqtt import MockMQTTClient, fake_socket_module, fake_umqtt_simple_module
 
 
 class TestMQTTService(unittest.TestCase):
@@ -29,7 +32,8 @@ class TestMQTTService(unittest.TestCase):
 
         self.patcher = patch.dict('sys.modules', {
             'umqtt': MagicMock(),
-            'umqtt.simple': MagicMock(MQTTClient=self.mock_client_class)
+            'umqtt.simple': MagicMock(MQTTClient=self.mock_client_class),
+            'mqtt_client': MagicMock(NonBlockingMQTTClient=self.mock_client_class)
         })
         self.patcher.start()
 
@@ -138,6 +142,183 @@ class TestMQTTService(unittest.TestCase):
         self.assertEqual(len(received_states), 0)
         self.assertTrue(self.service.connected)
 
+    def test_duplicate_payloads_are_skipped(self):
+        """Test that thousands of identical retained messages are parsed once."""
+        # Arrange
+        received_states = []
+        self.service.add_listener(received_states.append)
+        self.service.connect_and_subscribe()
+        payload = json.dumps({"open": True, "openUntil": "22:00"})
+        import mqtt_service
+        real_loads = mqtt_service.json.loads
+        parse_calls = []
+
+        def counting_loads(data):
+            parse_calls.append(data)
+            return real_loads(data)
+
+        # Act
+        with patch.object(mqtt_service.json, 'loads', counting_loads):
+            for _ in range(5000):
+                self.mock_client.simulate_message("msb/state", payload)
+                self.service.check_msg()
+
+        # Assert
+        self.assertEqual(len(parse_calls), 1)
+        self.assertEqual(len(received_states), 1)
+        self.assertEqual(self.service.get_state_version(), 1)
+        self.assertEqual(self.service.duplicates, 4999)
+
+    def test_state_version_increments_on_change_only(self):
+        """Test that the version counts real state changes."""
+        # Arrange
+        self.service.connect_and_subscribe()
+        payloads = ['{"open": true}', '{"open": true}', '{"open": false}', '{"open": false}', '{"open": true}']
+
+        # Act
+        versions = []
+        for payload in payloads:
+            self.mock_client.simulate_message("msb/state", payload)
+            self.service.check_msg()
+            versions.append(self.service.get_state_version())
+
+        # Assert
+        self.assertEqual(versions, [1, 1, 2, 2, 3])
+
+    def test_applied_state_is_replaced_by_next_broker_message(self):
+        """Test that a polled state is informed and a repeated retained payload still wins."""
+        # Arrange
+        received_states = []
+        self.service.add_listener(received_states.append)
+        self.service.connect_and_subscribe()
+        self.mock_client.simulate_message("msb/state", '{"open": true}')
+        self.service.check_msg()
+
+        # Act
+        self.service.apply_state({"open": False})
+        self.mock_client.simulate_message("msb/state", '{"open": true}')
+        self.service.check_msg()
+
+        # Assert
+        self.assertEqual(received_states, [{"open": True}, {"open": False}, {"open": True}])
+        self.assertEqual(self.service.get_state_version(), 3)
+
+    def test_binary_payload_gives_same_state_as_json(self):
+        """Test that the compact binary payload is accepted next to JSON."""
+        # Arrange
+        from state_codec import encode_state
+        received_states = []
+        self.service.add_listener(received_states.append)
+        self.service.connect_and_subscribe()
+        state = {"open": True, "openUntil": "22:30"}
+
+        # Act
+        self.mock_client.simulate_message("msb/state", encode_state(state))
+        self.service.check_msg()
+        self.mock_client.simulate_message("msb/state", json.dumps(state))
+        self.service.check_msg()
+
+        # Assert
+        self.assertEqual(received_states, [state, state])
+        self.assertEqual(self.service.get_state_version(), 2)
+
+    def test_duplicate_binary_payloads_are_skipped(self):
+        """Test that repeated binary payloads are decoded once."""
+        # Arrange
+        from state_codec import encode_state
+        self.service.connect_and_subscribe()
+        payload = encode_state({"open": False})
+
+        # Act
+        for _ in range(10):
+            self.mock_client.simulate_message("msb/state", payload)
+            self.service.check_msg()
+
+        # Assert
+        self.assertEqual(self.service.get_state(), {"open": False})
+        self.assertEqual(self.service.duplicates, 9)
+
+    def test_subscribe_routes_wildcard_topics(self):
+        """Test that extra patterns get their own messages, not the state handler."""
+        # Arrange
+        received_states = []
+        commands = []
+        self.service.add_listener(received_states.append)
+        self.service.subscribe("msb/cmd/#", lambda topic, msg: commands.append((topic, msg)))
+        self.service.connect_and_subscribe()
+
+        # Act
+        self.mock_client.simulate_message("msb/cmd/open", "22:00")
+        self.service.check_msg()
+        self.mock_client.simulate_message("msb/state", '{"open": true}')
+        self.service.check_msg()
+
+        # Assert
+        self.assertEqual(commands, [(b"msb/cmd/open", b"22:00")])
+        self.assertEqual(received_states, [{"open": True}])
+        self.assertIn(("msb/cmd/#", 0), self.mock_client.subscriptions)
+
+    def test_subscribe_while_connected_subscribes_at_once(self):
+        """Test that a pattern added later is subscribed without reconnecting."""
+        # Arrange
+        self.service.connect_and_subscribe()
+
+        # Act
+        self.service.subscribe("space/+/status", lambda topic, msg: None, qos=1)
+
+        # Assert
+        self.assertIn(("space/+/status", 1), self.mock_client.subscriptions)
+
+    def test_publish_is_held_while_disconnected(self):
+        """Test that messages queued offline go out after the reconnect."""
+        # Arrange
+        self.service.publish("msb/button/rssi", b"-70")
+        self.service.publish("msb/button/ack", b"1")
+        self.service.publish("msb/button/rssi", b"-60")
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        self.service.check_msg()  # reconnects
+        self.service.check_msg()  # drains
+
+        # Assert
+        self.assertEqual([(topic, msg) for topic, msg, _, _ in self.mock_client.published],
+                         [("msb/button/rssi", b"-60"), ("msb/button/ack", b"1")])
+        self.assertEqual(self.service.outbox.coalesced, 1)
+
+    def test_backlog_drains_in_batches(self):
+        """Test that flush() sends at most a byte budget per call."""
+        # Arrange
+        service = self.MQTTService("test.server.com", "testuser", "testpass", "test_client_123",
+                                   publish_slots=16, max_payload=128)
+        for index in range(10):
+            service.publish(f"telemetry/{index}", bytes(128))
+        service.connect_and_subscribe()
+
+        # Act
+        per_flush = []
+        while not service.outbox.is_empty():
+            before = len(self.mock_client.published)
+            service.flush()
+            per_flush.append(len(self.mock_client.published) - before)
+
+        # Assert
+        self.assertEqual(per_flush, [2, 2, 2, 2, 2])
+
+    def test_publish_failure_marks_disconnected_and_keeps_message(self):
+        """Test that a failed publish is retried on the next connection."""
+        # Arrange
+        self.service.connect_and_subscribe()
+        self.mock_client.publish_should_fail = True
+        self.service.publish("msb/button/ack", b"1")
+
+        # Act
+        self.service.flush()
+
+        # Assert
+        self.assertFalse(self.service.is_connected())
+        self.assertEqual(self.service.outbox.pending(), 1)
+
     def test_check_msg_triggers_reconnect_when_disconnected(self):
         """Test that check_msg attempts reconnection when not connected."""
         # Arrange
@@ -284,6 +465,30 @@ class TestMQTTService(unittest.TestCase):
         # Assert
         self.assertFalse(result)
 
+    def test_socket_is_none_while_disconnected(self):
+        """Test that no socket is exposed before connecting."""
+        # Arrange
+        service = self.service
+
+        # Act
+        sock = service.socket()
+
+        # Assert
+        self.assertIsNone(sock)
+
+    def test_socket_returns_client_socket_when_connected(self):
+        """Test that the broker socket is exposed for select.poll."""
+        # Arrange
+        service = self.service
+        service.connect_and_subscribe()
+        self.mock_client.sock = object()
+
+        # Act
+        sock = service.socket()
+
+        # Assert
+        self.assertIs(sock, self.mock_client.sock)
+
     def test_is_connected_returns_false_initially(self):
         """Test is_connected returns False initially."""
         # Arrange
@@ -444,6 +649,302 @@ class TestMQTTService(unittest.TestCase):
         # Assert
         self.assertEqual(self.service.consecutive_failures, 2)
 
+    def test_reconnect_advances_one_step_per_check_msg(self):
+        """Test that check_msg returns while the CONNACK is outstanding."""
+        # Arrange
+        MockMQTTClient.set_global_connack_delay(2)
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        self.service.check_msg()
+        step_after_first = self.service.connection_step
+        self.service.check_msg()
+        self.service.check_msg()
+
+        # Assert
+        self.assertEqual(step_after_first, self.service.CONN_CONNECTING)
+        self.assertTrue(self.service.connected)
+        self.assertEqual(self.service.connection_step, self.service.CONN_IDLE)
+        self.assertEqual(self.mock_client.connect_call_count, 1)
+        self.assertIn(("msb/state", 0), self.mock_client.subscriptions)
+
+    def test_waiting_for_suback_is_a_separate_step(self):
+        """Test that the subscribe step is resumed by later calls."""
+        # Arrange
+        factory = self.mock_client_class.side_effect
+
+        def client_with_slow_suback(*args, **kwargs):
+            client = factory(*args, **kwargs)
+            client.suback_after_polls = 1
+            return client
+        self.mock_client_class.side_effect = client_with_slow_suback
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        self.service.check_msg()
+        step = self.service.connection_step
+        self.service.check_msg()
+
+        # Assert
+        self.assertEqual(step, self.service.CONN_SUBSCRIBING)
+        self.assertTrue(self.service.connected)
+
+    def test_reconnect_restores_all_subscriptions_in_one_packet(self):
+        """Test that every routed pattern is resubscribed with a single SUBSCRIBE."""
+        # Arrange
+        self.service.subscribe("msb/cmd/#", lambda topic, msg: None, qos=1)
+        self.service.subscribe("space/+/status", lambda topic, msg: None)
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        for _ in range(3):
+            self.service.check_msg()
+
+        # Assert
+        self.assertTrue(self.service.is_connected())
+        self.assertEqual(self.mock_client.subscribe_packets, [
+            [("msb/state", 0), ("msb/cmd/#", 1), ("space/+/status", 0)],
+        ])
+
+    def make_persistent_service(self):
+        return self.MQTTService(
+            server="test.server.com",
+            user="testuser",
+            password="testpass",
+            client_id="test_client_123",
+            persistent_session=True
+        )
+
+    def drop_link(self, service):
+        self.mock_client.check_msg_should_fail = True
+        service.check_msg()
+        service.last_reconnect_attempt = 0
+
+    def polls_until_state(self, service, expected, limit=20):
+        for polls in range(1, limit + 1):
+            service.check_msg()
+            if service.is_connected() and service.get_state() == expected:
+                return polls
+        self.fail(f"state {expected} not received after {limit} polls")
+
+    def test_persistent_session_skips_resubscribe(self):
+        """Test that a resumed session is not subscribed again."""
+        # Arrange
+        service = self.make_persistent_service()
+        service.last_reconnect_attempt = 0
+        service.check_msg()
+        self.drop_link(service)
+
+        # Act
+        service.check_msg()
+
+        # Assert
+        self.assertTrue(service.is_connected())
+        self.assertEqual(service.session_resumes, 1)
+        self.assertEqual(self.mock_client.subscribe_packets, [])
+
+    def test_lost_session_is_resubscribed(self):
+        """Test that a broker without our session gets the subscriptions again."""
+        # Arrange
+        service = self.make_persistent_service()
+        service.last_reconnect_attempt = 0
+        service.check_msg()
+        self.drop_link(service)
+        MockMQTTClient._sessions.clear()
+
+        # Act
+        service.check_msg()
+
+        # Assert
+        self.assertTrue(service.is_connected())
+        self.assertEqual(service.session_resumes, 0)
+        self.assertEqual(self.mock_client.subscribe_packets, [[("msb/state", 1)]])
+
+    def test_reconnect_to_first_state_latency(self):
+        """Measure polls from reconnect to the state published while offline."""
+        # Arrange
+        MockMQTTClient.set_global_connack_delay(1)
+        factory = self.mock_client_class.side_effect
+
+        def client_with_slow_suback(*args, **kwargs):
+            client = factory(*args, **kwargs)
+            client.suback_after_polls = 1
+            return client
+        self.mock_client_class.side_effect = client_with_slow_suback
+        latency = {}
+        traffic = {}
+
+        # Act
+        for name, service in (("clean", self.service), ("persistent", self.make_persistent_service())):
+            MockMQTTClient.broker_publish("msb/state", '{"open": true}')
+            service.last_reconnect_attempt = 0
+            self.polls_until_state(service, {"open": True})
+            self.drop_link(service)
+            MockMQTTClient.broker_publish("msb/state", '{"open": false}')
+            latency[name] = self.polls_until_state(service, {"open": False})
+            traffic[name] = len(self.mock_client.subscribe_packets)
+
+        # Assert
+        self.assertEqual(latency, {"clean": 4, "persistent": 3})
+        self.assertEqual(traffic, {"clean": 1, "persistent": 0})
+
+    def test_step_timeout_fails_and_backs_off(self):
+        """Test that a missing CONNACK times out into the normal backoff."""
+        # Arrange
+        MockMQTTClient.set_global_connack_delay(None)
+        events = []
+        self.service.add_connection_listener(events.append)
+        self.service.last_reconnect_attempt = 0
+        initial_delay = self.service.current_reconnect_delay
+        self.service.check_msg()
+
+        # Act
+        self.service.step_started -= self.service.STEP_TIMEOUT
+        self.service.check_msg()
+
+        # Assert
+        self.assertEqual(self.service.connection_step, self.service.CONN_IDLE)
+        self.assertFalse(self.service.connected)
+        self.assertEqual(self.service.current_reconnect_delay, initial_delay * 2)
+        self.assertEqual(events, [])
+
+    def test_no_new_attempt_while_step_in_progress(self):
+        """Test that a pending handshake is resumed, not restarted."""
+        # Arrange
+        MockMQTTClient.set_global_connack_delay(None)
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        for _ in range(5):
+            self.service.check_msg()
+
+        # Assert
+        self.assertEqual(self.mock_client.connect_call_count, 1)
+        self.assertEqual(self.mock_client.connect_poll_count, 5)
+
+
+class TestMQTTKeepalive(unittest.TestCase):
+    """Test cases for the idle ping and dead link detection."""
+
+    def setUp(self):
+        """Set up a connected service on a fake millisecond clock."""
+        self.mock_client = None
+        MockMQTTClient.reset_global_flags()
+
+        def mock_mqtt_client_factory(*args, **kwargs):
+            self.mock_client = MockMQTTClient(*args, **kwargs)
+            return self.mock_client
+
+        mock_client_class = MagicMock(side_effect=mock_mqtt_client_factory)
+        self.patcher = patch.dict('sys.modules', {
+            'umqtt': MagicMock(),
+            'umqtt.simple': MagicMock(MQTTClient=mock_client_class),
+            'mqtt_client': MagicMock(NonBlockingMQTTClient=mock_client_class)
+        })
+        self.patcher.start()
+        sys.modules.pop('mqtt_service', None)
+        import mqtt_service
+        self.ticks = FakeTicksTime()
+        self.time_patcher = patch.object(mqtt_service, 'time', self.ticks)
+        self.time_patcher.start()
+
+        self.service = mqtt_service.MQTTService(
+            server="test.server.com",
+            user="testuser",
+            password="testpass",
+            client_id="test_client_123",
+            ping_interval=20
+        )
+        self.service.connect_and_subscribe()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.time_patcher.stop()
+        MockMQTTClient.reset_global_flags()
+        self.patcher.stop()
+        sys.modules.pop('mqtt_service', None)
+
+    def advance(self, ms, step=10):
+        """Run check_msg() every step ms."""
+        for _ in range(ms // step):
+            self.ticks.now += step
+            self.service.check_msg()
+
+    def test_no_ping_while_messages_arrive(self):
+        """Test that a link with inbound traffic is not pinged."""
+        # Act
+        for second in range(0, 120, 5):
+            self.mock_client.simulate_message("msb/state", f'{{"open": true, "n": {second}}}')
+            self.advance(5000, step=100)
+
+        # Assert
+        self.assertEqual(self.service.pings, 0)
+        self.assertEqual(self.mock_client.ping_call_count, 0)
+
+    def test_idle_link_is_pinged_and_rtt_measured(self):
+        """Test the PINGREQ after ping_interval of silence and the round trip time."""
+        # Act
+        self.advance(20000, step=1000)
+        pinged = self.mock_client.ping_call_count
+        self.advance(30)
+
+        # Assert
+        self.assertEqual(pinged, 1)
+        self.assertEqual(self.service.last_rtt_ms, 10)
+        self.assertTrue(self.service.is_connected())
+
+    def time_to_detect_dead_link(self):
+        """Ms from the unanswered PINGREQ until the link is marked down."""
+        self.mock_client.answer_pings = False
+        MockMQTTClient.set_global_connect_fail(True)
+        pings = self.service.pings
+        while self.service.pings == pings:
+            self.advance(10)
+        ping_at = self.ticks.now
+        while self.service.is_connected():
+            self.advance(10)
+        return self.ticks.now - ping_at
+
+    def test_dead_link_is_dropped_within_seconds(self):
+        """Test that an unanswered ping marks the link down and starts a reconnect."""
+        # Arrange
+        events = []
+        self.service.add_connection_listener(events.append)
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        detected_after = self.time_to_detect_dead_link()
+
+        # Assert
+        self.assertLessEqual(detected_after, self.service.PING_TIMEOUT_MAX_MS)
+        self.assertEqual(self.service.dead_links, 1)
+        self.assertEqual(events, [False])
+        self.assertEqual(self.service.consecutive_failures, 1)
+
+    def test_timeout_adapts_to_round_trip_time(self):
+        """Test that a fast link gets a short dead link deadline."""
+        # Arrange
+        self.advance(20000, step=1000)
+        self.advance(50, step=50)  # PINGRESP after 50 ms
+
+        # Act
+        detected_after = self.time_to_detect_dead_link()
+
+        # Assert
+        self.assertEqual(self.service.srtt_ms, 50)
+        self.assertLessEqual(detected_after, self.service.PING_TIMEOUT_MIN_MS)
+
+    def test_keepalive_disabled_without_interval(self):
+        """Test that no pings are sent when ping_interval is None."""
+        # Arrange
+        self.service.ping_interval = None
+
+        # Act
+        self.advance(120000, step=1000)
+
+        # Assert
+        self.assertEqual(self.mock_client.ping_call_count, 0)
+
 
 class TestMQTTServiceIntegration(unittest.TestCase):
     """Integration-style tests for MQTTService."""
@@ -462,7 +963,8 @@ class TestMQTTServiceIntegration(unittest.TestCase):
 
         self.patcher = patch.dict('sys.modules', {
             'umqtt': MagicMock(),
-            'umqtt.simple': MagicMock(MQTTClient=self.mock_client_class)
+            'umqtt.simple': MagicMock(MQTTClient=self.mock_client_class),
+            'mqtt_client': MagicMock(NonBlockingMQTTClient=self.mock_client_class)
         })
         self.patcher.start()
 
@@ -546,5 +1048,60 @@ class TestMQTTServiceIntegration(unittest.TestCase):
         self.assertEqual(self.mock_client.connect_call_count, 1)
 
 
+class TestMQTTServiceAgainstBroker(unittest.TestCase):
+    """Reconnects over a real socket to a local stand-in broker."""
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {
+            'umqtt': MagicMock(),
+            'umqtt.simple': fake_umqtt_simple_module(),
+        })
+        self.patcher.start()
+        for name in ('mqtt_client', 'mqtt_service'):
+            sys.modules.pop(name, None)
+        import mqtt_client
+        import mqtt_service
+        self.patches = [
+            patch.object(mqtt_client, 'socket', fake_socket_module()),
+            patch.object(mqtt_service, 'time', HostTicksTime()),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+        self.mqtt_service = mqtt_service
+        self.broker = None
+        self.service = None
+
+    def tearDown(self):
+        if self.service is not None and self.service.client is not None and self.service.client.sock is not None:
+            self.service.client.sock.close()
+        if self.broker is not None:
+            self.broker.close()
+        for patcher in self.patches:
+            patcher.stop()
+        self.patcher.stop()
+        for name in ('mqtt_client', 'mqtt_service'):
+            sys.modules.pop(name, None)
+
+    def test_queued_state_before_suback_does_not_break_reconnect(self):
+        """Test that a session broker delivering queued QoS 1 messages before the SUBACK still connects."""
+        # Arrange
+        self.broker = StandInBroker(session_present=True, queued=[("msb/state", b'{"open": true, "openUntil": "22:00"}')])
+        self.service = self.mqtt_service.MQTTService("127.0.0.1", "user", "pass", "button1",
+                                                     persistent_session=True, port=self.broker.port)
+        self.service.last_reconnect_attempt = 0
+
+        # Act
+        for _ in range(2000):
+            self.service.check_msg()
+            if self.service.is_connected():
+                break
+            time.sleep(0.001)
+
+        # Assert
+        self.assertTrue(self.service.is_connected())
+        self.assertEqual(len(self.broker.packets_of(8)), 1)  # subscribed is None, so SUBSCRIBE is sent
+        self.assertEqual(self.service.get_state(), {"open": True, "openUntil": "22:00"})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,132 @@
+"""Tests for the bounded outbound publish queue."""
+
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from publish_queue import PublishQueue
+from tests.mock_mqtt import MockMQTTClient
+
+
+class TestPublishQueue(unittest.TestCase):
+
+    def setUp(self):
+        MockMQTTClient.reset_global_flags()
+        self.client = MockMQTTClient("client", "broker")
+        self.client.connected = True
+
+    def topics_sent(self):
+        return [(topic, msg) for topic, msg, _, _ in self.client.published]
+
+    def test_messages_are_sent_in_order(self):
+        """Test FIFO order and the retain/qos flags."""
+        # Arrange
+        queue = PublishQueue(4)
+        queue.put("a", b"1")
+        queue.put("b", "2", retain=True, qos=1)
+
+        # Act
+        sent = queue.drain(self.client, 1000)
+
+        # Assert
+        self.assertEqual(sent, 2)
+        self.assertEqual(self.client.published, [("a", b"1", False, 0), ("b", b"2", True, 1)])
+        self.assertTrue(queue.is_empty())
+
+    def test_same_topic_is_coalesced_in_place(self):
+        """Test that only the latest value per topic is sent, at the first position."""
+        # Arrange
+        queue = PublishQueue(4)
+        queue.put("telemetry/rssi", b"-70")
+        queue.put("ack", b"x")
+        queue.put("telemetry/rssi", b"-65")
+
+        # Act
+        queue.drain(self.client, 1000)
+
+        # Assert
+        self.assertEqual(self.topics_sent(), [("telemetry/rssi", b"-65"), ("ack", b"x")])
+        self.assertEqual(queue.coalesced, 1)
+
+    def test_full_queue_drops_oldest(self):
+        """Test that a full ring makes room by dropping the oldest message."""
+        # Arrange
+        queue = PublishQueue(3)
+
+        # Act
+        for index in range(5):
+            queue.put(f"t/{index}", b"x")
+        queue.drain(self.client, 1000)
+
+        # Assert
+        self.assertEqual([topic for topic, _ in self.topics_sent()], ["t/2", "t/3", "t/4"])
+        self.assertEqual(queue.dropped, 2)
+
+    def test_drain_is_capped_in_bytes(self):
+        """Test the byte budget per drain() call."""
+        # Arrange
+        queue = PublishQueue(8, max_payload=100)
+        for index in range(6):
+            queue.put(f"t/{index}", bytes(100))
+
+        # Act
+        batches = []
+        while not queue.is_empty():
+            batches.append(queue.drain(self.client, 250))
+
+        # Assert
+        self.assertEqual(batches, [2, 2, 2])
+        self.assertEqual(queue.sent, 6)
+
+    def test_large_message_is_not_starved(self):
+        """Test that a message larger than the budget still goes out alone."""
+        # Arrange
+        queue = PublishQueue(4, max_payload=100)
+        queue.put("big", bytes(100))
+        queue.put("small", b"1")
+
+        # Act
+        first = queue.drain(self.client, 10)
+
+        # Assert
+        self.assertEqual(first, 1)
+        self.assertEqual(queue.pending(), 1)
+
+    def test_failed_publish_keeps_the_message(self):
+        """Test that the message at the head survives a publish error."""
+        # Arrange
+        queue = PublishQueue(4)
+        queue.put("a", b"1")
+        self.client.publish_should_fail = True
+
+        # Act
+        with self.assertRaises(OSError):
+            queue.drain(self.client, 1000)
+        self.client.publish_should_fail = False
+        queue.drain(self.client, 1000)
+
+        # Assert
+        self.assertEqual(self.topics_sent(), [("a", b"1")])
+
+    def test_payload_buffer_is_preallocated(self):
+        """Test that queueing reuses the buffer and rejects oversized payloads."""
+        # Arrange
+        queue = PublishQueue(2, max_payload=16)
+        buffer = queue._buffer
+
+        # Act
+        for index in range(50):
+            queue.put(f"t/{index % 3}", str(index))
+            queue.drain(self.client, 16)
+
+        # Assert
+        self.assertIs(queue._buffer, buffer)
+        self.assertEqual(len(buffer), 3 * 16)
+        with self.assertRaises(ValueError):
+            queue.put("t", bytes(17))
+
+
+if __name__ == '__main__':
+    unittest.main()
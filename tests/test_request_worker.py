@@ -0,0 +1,197 @@
+"""Tests for the background closing time request worker against a local stand-in server."""
+
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_http import StandInHTTPServer
+from tests.mock_micropython import HostTicksTime
+
+MODULES = ['http_client', 'state_manager', 'request_worker']
+
+
+class RequestWorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        for name in MODULES:
+            sys.modules.pop(name, None)
+        import http_client
+        import request_worker
+        import state_manager
+        self.patches = [
+            patch.object(http_client, 'time', HostTicksTime()),
+            patch.object(request_worker, 'time', HostTicksTime()),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+        self.request_worker = request_worker
+        self.state_manager = state_manager
+        self.server = None
+        self.results = []
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+        for patcher in self.patches:
+            patcher.stop()
+        for name in MODULES:
+            sys.modules.pop(name, None)
+
+    def make_worker(self, handler=None, delay=0, **kwargs):
+        self.server = StandInHTTPServer(handler, delay=delay)
+        manager = self.state_manager.StateManager("test-key")
+        manager.time_url = self.server.url + "/api/msb/state/openUntil/"
+        kwargs.setdefault('retry_min', 0.01)
+        worker = self.request_worker.RequestWorker(manager.sendTime, **kwargs)
+        worker.add_listener(lambda value, ok, status: self.results.append(
+            (value, ok, status, threading.current_thread())))
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.addCleanup(lambda: manager.connection is not None and manager.connection.close())
+        return worker
+
+    def wait_for_results(self, worker, count=1, timeout=3):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            worker.poll()
+            if len(self.results) >= count and not worker.busy():
+                return
+            time.sleep(0.005)
+        self.fail("request did not finish")
+
+    def paths(self):
+        return [path.rsplit('/', 1)[1] for _, path, _ in self.server.requests]
+
+
+class TestRequestWorker(RequestWorkerTestCase):
+
+    def test_submit_does_not_wait_for_a_slow_server(self):
+        """Test that a press returns at once and completes later."""
+        # Arrange
+        worker = self.make_worker(delay=0.2)
+
+        # Act
+        started = time.perf_counter()
+        worker.submit("21:30")
+        duration = time.perf_counter() - started
+        self.wait_for_results(worker)
+
+        # Assert
+        self.assertLess(duration, 0.01)
+        self.assertEqual(self.results[0][:3], ("21:30", True, 200))
+
+    def test_completion_is_delivered_on_the_polling_thread(self):
+        """Test that listeners run in poll(), not on the worker thread."""
+        # Arrange
+        worker = self.make_worker()
+
+        # Act
+        worker.submit("21:30")
+        self.wait_for_results(worker)
+
+        # Assert
+        self.assertIs(self.results[0][3], threading.current_thread())
+
+    def test_latest_press_wins(self):
+        """Test that presses during a request collapse into the last one."""
+        # Arrange
+        worker = self.make_worker(delay=0.1)
+        worker.submit("21:00")
+        time.sleep(0.03)  # first request in flight
+
+        # Act
+        for value in ("21:15", "21:30", "21:45"):
+            worker.submit(value)
+        self.wait_for_results(worker)
+
+        # Assert
+        self.assertEqual(self.paths(), ["21:00", "21:45"])
+        self.assertEqual([result[:3] for result in self.results], [("21:45", True, 200)])
+        self.assertEqual(worker.superseded, 3)
+
+    def test_server_errors_are_retried(self):
+        """Test the retry after 5xx answers."""
+        # Arrange
+        answers = [503, 500, 200]
+        worker = self.make_worker(lambda method, path, headers: (answers.pop(0), {}, b""))
+
+        # Act
+        worker.submit("22:00")
+        self.wait_for_results(worker)
+
+        # Assert
+        self.assertEqual(self.results[0][:3], ("22:00", True, 200))
+        self.assertEqual(worker.retries, 2)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_at_the_deadline(self):
+        """Test that a failing server is retried only until the deadline."""
+        # Arrange
+        worker = self.make_worker(lambda method, path, headers: (500, {}, b""), deadline=0.3,
+                                  retry_min=0.05, retry_max=0.1)
+
+        # Act
+        started = time.monotonic()
+        worker.submit("22:00")
+        self.wait_for_results(worker)
+        duration = time.monotonic() - started
+
+        # Assert
+        self.assertEqual(self.results[0][:3], ("22:00", False, 500))
+        self.assertEqual(worker.failures, 1)
+        self.assertGreater(worker.retries, 0)
+        self.assertLess(duration, 0.5)
+
+    def test_client_errors_are_not_retried(self):
+        """Test that a 4xx answer fails at once."""
+        # Arrange
+        worker = self.make_worker(lambda method, path, headers: (403, {}, b"bad key"))
+
+        # Act
+        worker.submit("22:00")
+        self.wait_for_results(worker)
+
+        # Assert
+        self.assertEqual(self.results[0][:3], ("22:00", False, 403))
+        self.assertEqual(worker.retries, 0)
+
+    def test_idle_worker_does_not_wake_up(self):
+        """Test that an idle worker blocks instead of polling and still takes the next press."""
+        # Arrange
+        sleep_patcher = patch.object(self.request_worker, '_sleep_ms')
+        sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        worker = self.make_worker()
+        time.sleep(0.1)
+
+        # Act
+        worker.submit("21:30")
+        self.wait_for_results(worker)
+
+        # Assert
+        sleep.assert_not_called()
+        self.assertEqual(self.results[0][:3], ("21:30", True, 200))
+
+    def test_job_runs_on_the_worker_and_completes_on_the_polling_thread(self):
+        """Test that run() calls the job off the main thread and done() in poll()."""
+        # Arrange
+        worker = self.make_worker()
+        threads = []
+
+        # Act
+        worker.run(lambda: threads.append(threading.current_thread()) or "state",
+                   lambda result: self.results.append((result, threading.current_thread())))
+        self.wait_for_results(worker)
+
+        # Assert
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertEqual(self.results, [("state", threading.current_thread())])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+"""Tests for the platform-independent Rotary decoder."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import fake_micropython_module
+
+# CLK/DT pin states for one detent in each direction (full-step encoder)
+CW_STEP = (2, 0, 1, 3)
+CCW_STEP = (1, 0, 2, 3)
+
+
+class RotaryTestCase(unittest.TestCase):
+    """Imports rotary with a patched micropython module."""
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {'micropython': fake_micropython_module()})
+        self.patcher.start()
+        for name in ('rotary', 'event_queue'):
+            sys.modules.pop(name, None)
+        import rotary
+        self.rotary = rotary
+
+        class PinRotary(rotary.Rotary):
+            """Rotary driven by a pins attribute instead of real GPIOs."""
+            pins = 3
+
+            def _hal_get_clk_value(self):
+                return self.pins >> 1
+
+            def _hal_get_dt_value(self):
+                return self.pins & 1
+
+            def _hal_enable_irq(self):
+                pass
+
+            def _hal_disable_irq(self):
+                pass
+
+            def turn(self, steps):
+                sequence = CW_STEP if steps > 0 else CCW_STEP
+                for _ in range(abs(steps)):
+                    for pins in sequence:
+                        self.pins = pins
+                        self._process_rotary_pins(None)
+
+        self.PinRotary = PinRotary
+
+    def tearDown(self):
+        self.patcher.stop()
+        for name in ('rotary', 'event_queue'):
+            sys.modules.pop(name, None)
+
+    def make_rotary(self, min_val=0, max_val=80, range_mode=None, delivery=None):
+        Rotary = self.rotary.Rotary
+        return self.PinRotary(
+            min_val, max_val, 1, False,
+            range_mode or Rotary.RANGE_BOUNDED, False, False,
+            delivery or Rotary.DELIVERY_IMMEDIATE)
+
+
+class TestRotaryDelivery(RotaryTestCase):
+
+    def test_immediate_mode_calls_listener_per_step(self):
+        """Test that the default mode still calls listeners for every step."""
+        # Arrange
+        encoder = self.make_rotary()
+        listener = MagicMock()
+        encoder.add_listener(listener)
+
+        # Act
+        encoder.turn(3)
+
+        # Assert
+        self.assertEqual([c.args for c in listener.call_args_list], [(1,), (2,), (3,)])
+
+    def test_latest_mode_coalesces_fast_spin(self):
+        """Test that a fast spin gives one listener call with the net delta."""
+        # Arrange
+        encoder = self.make_rotary(delivery=self.rotary.Rotary.DELIVERY_LATEST)
+        listener = MagicMock()
+        encoder.add_listener(listener)
+
+        # Act
+        encoder.turn(25)
+        calls_before_poll = listener.call_count
+        delta = encoder.poll()
+        second_delta = encoder.poll()
+
+        # Assert
+        self.assertEqual(calls_before_poll, 0)
+        self.assertEqual(delta, 25)
+        self.assertEqual(second_delta, 0)
+        listener.assert_called_once_with(25, 25)
+
+    def test_latest_mode_reports_negative_delta(self):
+        """Test net delta when turning back."""
+        # Arrange
+        encoder = self.make_rotary(delivery=self.rotary.Rotary.DELIVERY_LATEST)
+        listener = MagicMock()
+        encoder.add_listener(listener)
+        encoder.turn(10)
+        encoder.poll()
+
+        # Act
+        encoder.turn(-4)
+        encoder.poll()
+
+        # Assert
+        self.assertEqual(listener.call_args_list[-1].args, (6, -4))
+
+    def test_latest_mode_skips_net_zero_change(self):
+        """Test that turning forth and back between polls delivers nothing."""
+        # Arrange
+        encoder = self.make_rotary(delivery=self.rotary.Rotary.DELIVERY_LATEST)
+        listener = MagicMock()
+        encoder.add_listener(listener)
+
+        # Act
+        encoder.turn(3)
+        encoder.turn(-3)
+        delta = encoder.poll()
+
+        # Assert
+        self.assertEqual(delta, 0)
+        listener.assert_not_called()
+
+    def test_latest_mode_wrap_uses_shortest_delta(self):
+        """Test that wrapping past the maximum gives a small positive delta."""
+        # Arrange
+        encoder = self.make_rotary(max_val=9, range_mode=self.rotary.Rotary.RANGE_WRAP,
+                                   delivery=self.rotary.Rotary.DELIVERY_LATEST)
+        encoder.set(value=8)
+
+        # Act
+        encoder.turn(3)
+        delta = encoder.poll()
+
+        # Assert
+        self.assertEqual(encoder.value(), 1)
+        self.assertEqual(delta, 3)
+
+    def test_reset_is_not_reported_as_a_change(self):
+        """Test that reset() by the application is not delivered as input."""
+        # Arrange
+        encoder = self.make_rotary(delivery=self.rotary.Rotary.DELIVERY_LATEST)
+        listener = MagicMock()
+        encoder.add_listener(listener)
+        encoder.turn(5)
+        encoder.poll()
+
+        # Act
+        encoder.reset()
+        delta = encoder.poll()
+
+        # Assert
+        self.assertEqual(delta, 0)
+        self.assertEqual(listener.call_count, 1)
+
+    def test_latest_mode_with_event_queue_pushes_once_per_poll(self):
+        """Test that one event per poll is queued instead of one per step."""
+        # Arrange
+        import event_queue
+        queue = event_queue.EventQueue(4)
+        encoder = self.make_rotary(delivery=self.rotary.Rotary.DELIVERY_LATEST)
+        encoder.set_event_queue(queue, event_queue.EVT_ROTARY)
+
+        # Act
+        encoder.turn(12)
+        encoder.poll()
+
+        # Assert
+        self.assertEqual(queue.pop(), (event_queue.EVT_ROTARY, 12))
+        self.assertIsNone(queue.pop())
+        self.assertEqual(queue.overflows, 0)
+
+
+class TestRotaryDecoder(RotaryTestCase):
+
+    def test_transition_tables_are_flat_bytes(self):
+        """Test the compact table layout used by the IRQ decoder."""
+        # Arrange
+        rotary = self.rotary
+
+        # Act
+        tables = (rotary._transition_table, rotary._transition_table_half_step)
+
+        # Assert
+        for table in tables:
+            self.assertIsInstance(table, bytes)
+            self.assertEqual(len(table), 32)
+
+    def test_bounded_range_clamps(self):
+        """Test that bounded mode stops at both ends."""
+        # Arrange
+        encoder = self.make_rotary(max_val=5)
+
+        # Act
+        encoder.turn(8)
+        at_top = encoder.value()
+        encoder.turn(-9)
+
+        # Assert
+        self.assertEqual(at_top, 5)
+        self.assertEqual(encoder.value(), 0)
+
+    def test_unbounded_range_goes_negative(self):
+        """Test that unbounded mode keeps counting."""
+        # Arrange
+        encoder = self.make_rotary(range_mode=self.rotary.Rotary.RANGE_UNBOUNDED)
+
+        # Act
+        encoder.turn(-3)
+
+        # Assert
+        self.assertEqual(encoder.value(), -3)
+
+    def test_reverse_and_incr_are_applied_after_set(self):
+        """Test that set() recomputes the precomputed step sizes."""
+        # Arrange
+        encoder = self.make_rotary(range_mode=self.rotary.Rotary.RANGE_UNBOUNDED)
+        encoder.set(incr=5, reverse=True)
+
+        # Act
+        encoder.turn(2)
+
+        # Assert
+        self.assertEqual(encoder.value(), -10)
+
+    def test_invert_swaps_pin_levels(self):
+        """Test that inverted pins decode the inverted sequence as the same step."""
+        # Arrange
+        encoder = self.PinRotary(0, 10, 1, False, self.rotary.Rotary.RANGE_BOUNDED, False, True)
+
+        # Act
+        for pins in CW_STEP:
+            encoder.pins = pins ^ 0x03
+            encoder._process_rotary_pins(None)
+
+        # Assert
+        self.assertEqual(encoder.value(), 1)
+
+    def test_half_step_counts_two_per_cycle(self):
+        """Test that half-step mode counts at both rest positions."""
+        # Arrange
+        encoder = self.PinRotary(0, 10, 1, False, self.rotary.Rotary.RANGE_BOUNDED, True, False)
+
+        # Act
+        for pins in (1, 0, 2, 3):
+            encoder.pins = pins
+            encoder._process_rotary_pins(None)
+
+        # Assert
+        self.assertEqual(encoder.value(), 2)
+
+    def test_contact_bounce_does_not_add_steps(self):
+        """Test that a chattering contact within a detent is ignored."""
+        # Arrange
+        encoder = self.make_rotary()
+
+        # Act
+        for pins in (2, 3, 2, 0, 2, 0, 1, 3):
+            encoder.pins = pins
+            encoder._process_rotary_pins(None)
+
+        # Assert
+        self.assertEqual(encoder.value(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+"""Tests for the PCNT rotary backend with fake pulse counter hardware."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import fake_micropython_module
+from tests.mock_pcnt import FakeEncoder
+
+PCNT_MODULES = ['rotary', 'rotary_pcnt_esp', 'event_queue']
+
+
+class TestRotaryPCNT(unittest.TestCase):
+    """Test cases for RotaryPCNT."""
+
+    def setUp(self):
+        self.machine = MagicMock()
+        self.machine.Encoder.side_effect = lambda *args, **kwargs: FakeEncoder(*args, **kwargs)
+        self.patcher = patch.dict('sys.modules', {
+            'micropython': fake_micropython_module(),
+            'machine': self.machine,
+        })
+        self.patcher.start()
+        for name in PCNT_MODULES:
+            sys.modules.pop(name, None)
+        import rotary_pcnt_esp
+        self.RotaryPCNT = rotary_pcnt_esp.RotaryPCNT
+        self.encoder = FakeEncoder()
+
+    def tearDown(self):
+        self.patcher.stop()
+        for name in PCNT_MODULES:
+            sys.modules.pop(name, None)
+
+    def make_rotary(self, **kwargs):
+        kwargs.setdefault('encoder', self.encoder)
+        return self.RotaryPCNT(2, 1, **kwargs)
+
+    def test_value_reads_counter_on_demand(self):
+        """Test that value() follows the hardware count."""
+        # Arrange
+        encoder = self.make_rotary(max_val=80, range_mode=self.RotaryPCNT.RANGE_BOUNDED)
+
+        # Act
+        self.encoder.turn(7)
+        value = encoder.value()
+
+        # Assert
+        self.assertEqual(value, 7)
+
+    def test_starts_from_current_count(self):
+        """Test that counts from before construction are ignored."""
+        # Arrange
+        self.encoder.count = 1234
+
+        # Act
+        encoder = self.make_rotary()
+
+        # Assert
+        self.assertEqual(encoder.value(), 0)
+
+    def test_bounded_mode_clamps(self):
+        """Test bounded range handling on counter reads."""
+        # Arrange
+        encoder = self.make_rotary(max_val=10, range_mode=self.RotaryPCNT.RANGE_BOUNDED)
+
+        # Act
+        self.encoder.turn(25)
+        top = encoder.value()
+        self.encoder.turn(-3)
+
+        # Assert
+        self.assertEqual(top, 10)
+        self.assertEqual(encoder.value(), 7)
+
+    def test_wrap_mode_wraps(self):
+        """Test wrap range handling on counter reads."""
+        # Arrange
+        encoder = self.make_rotary(max_val=9, range_mode=self.RotaryPCNT.RANGE_WRAP)
+
+        # Act
+        self.encoder.turn(12)
+
+        # Assert
+        self.assertEqual(encoder.value(), 2)
+
+    def test_reverse_and_incr(self):
+        """Test that reverse and incr scale the counted steps."""
+        # Arrange
+        encoder = self.make_rotary(incr=2, reverse=True)
+
+        # Act
+        self.encoder.turn(3)
+
+        # Assert
+        self.assertEqual(encoder.value(), -6)
+
+    def test_reset_and_set(self):
+        """Test reset() and set() keep working against the counter."""
+        # Arrange
+        encoder = self.make_rotary(max_val=80, range_mode=self.RotaryPCNT.RANGE_BOUNDED)
+        self.encoder.turn(5)
+
+        # Act
+        encoder.reset()
+        after_reset = encoder.value()
+        encoder.set(value=40)
+        self.encoder.turn(2)
+
+        # Assert
+        self.assertEqual(after_reset, 0)
+        self.assertEqual(encoder.value(), 42)
+
+    def test_poll_calls_listeners_in_immediate_mode(self):
+        """Test that poll() delivers changes to classic listeners."""
+        # Arrange
+        encoder = self.make_rotary()
+        listener = MagicMock()
+        encoder.add_listener(listener)
+
+        # Act
+        self.encoder.turn(4)
+        encoder.poll()
+        encoder.poll()
+
+        # Assert
+        listener.assert_called_once_with(4)
+
+    def test_poll_delivers_delta_in_latest_mode(self):
+        """Test that latest-value delivery works with the PCNT backend."""
+        # Arrange
+        encoder = self.make_rotary(delivery=self.RotaryPCNT.DELIVERY_LATEST)
+        listener = MagicMock()
+        encoder.add_listener(listener)
+
+        # Act
+        self.encoder.turn(9)
+        delta = encoder.poll()
+
+        # Assert
+        self.assertEqual(delta, 9)
+        listener.assert_called_once_with(9, 9)
+
+    def test_poll_pushes_into_event_queue(self):
+        """Test event queue delivery from poll()."""
+        # Arrange
+        import event_queue
+        queue = event_queue.EventQueue(4)
+        encoder = self.make_rotary()
+        encoder.set_event_queue(queue, event_queue.EVT_ROTARY)
+
+        # Act
+        self.encoder.turn(-2)
+        encoder.poll()
+
+        # Assert
+        self.assertEqual(queue.pop(), (event_queue.EVT_ROTARY, -2))
+
+    def test_reset_is_not_reported(self):
+        """Test that reset() is not delivered as a change."""
+        # Arrange
+        encoder = self.make_rotary()
+        listener = MagicMock()
+        encoder.add_listener(listener)
+        self.encoder.turn(3)
+        encoder.poll()
+
+        # Act
+        encoder.reset()
+        encoder.poll()
+
+        # Assert
+        self.assertEqual(listener.call_count, 1)
+
+    def test_default_hardware_uses_glitch_filter(self):
+        """Test that the machine.Encoder is configured with the filter and phases."""
+        # Arrange
+        # (machine.Encoder is patched to build a FakeEncoder)
+
+        # Act
+        encoder = self.RotaryPCNT(2, 1, pull_up=True, half_step=True, unit=1, filter_ns=5000)
+
+        # Assert
+        hardware = encoder._encoder
+        self.assertEqual(hardware.unit, 1)
+        self.assertEqual(hardware.phases, 2)
+        self.assertEqual(hardware.filter_ns, 5000)
+
+    def test_close_deinits_hardware(self):
+        """Test that close() releases the PCNT unit."""
+        # Arrange
+        encoder = self.make_rotary()
+
+        # Act
+        encoder.close()
+
+        # Assert
+        self.assertTrue(self.encoder.deinit_called)
+
+
+if __name__ == '__main__':
+    unittest.main()
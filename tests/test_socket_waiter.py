@@ -0,0 +1,158 @@
+"""Tests for SocketWaiter with a socket-pair stand-in broker."""
+
+import socket
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_mqtt import MockMQTTClient
+from socket_waiter import SocketWaiter
+
+
+class SocketPairBroker:
+    """One end of a socketpair plays the broker, the other is the client socket."""
+
+    def __init__(self):
+        self.broker, self.client = socket.socketpair()
+
+    def publish(self, payload=b"\x30\x00", delay=0):
+        if delay:
+            threading.Timer(delay, self.broker.send, (payload,)).start()
+        else:
+            self.broker.send(payload)
+
+    def drain(self):
+        self.client.setblocking(False)
+        try:
+            return self.client.recv(1024)
+        except OSError:
+            return b""
+
+    def close(self):
+        self.broker.close()
+        self.client.close()
+
+
+class TestSocketWaiter(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = SocketPairBroker()
+        self.addCleanup(self.broker.close)
+
+    def test_times_out_without_data(self):
+        """Test that wait() sleeps for the timeout when the broker is quiet."""
+        # Arrange
+        waiter = SocketWaiter()
+        waiter.watch(self.broker.client)
+
+        # Act
+        started = time.perf_counter()
+        ready = waiter.wait(50)
+        elapsed = time.perf_counter() - started
+
+        # Assert
+        self.assertFalse(ready)
+        self.assertGreaterEqual(elapsed, 0.04)
+
+    def test_wakes_up_when_broker_sends(self):
+        """Test that a message ends the wait early."""
+        # Arrange
+        waiter = SocketWaiter()
+        waiter.watch(self.broker.client)
+        self.broker.publish(delay=0.02)
+
+        # Act
+        started = time.perf_counter()
+        ready = waiter.wait(1000)
+        elapsed = time.perf_counter() - started
+
+        # Assert
+        self.assertTrue(ready)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(waiter.wakeups, 1)
+
+    def test_sleeps_without_socket(self):
+        """Test that wait() without a watched socket just sleeps."""
+        # Arrange
+        waiter = SocketWaiter()
+
+        # Act
+        started = time.perf_counter()
+        ready = waiter.wait(30)
+
+        # Assert
+        self.assertFalse(ready)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.02)
+
+    def test_watch_switches_to_new_socket(self):
+        """Test that a reconnect's new socket replaces the old one."""
+        # Arrange
+        waiter = SocketWaiter()
+        waiter.watch(self.broker.client)
+        second = SocketPairBroker()
+        self.addCleanup(second.close)
+
+        # Act
+        waiter.watch(second.client)
+        self.broker.publish()
+        old_ready = waiter.wait(20)
+        second.publish()
+        new_ready = waiter.wait(20)
+
+        # Assert
+        self.assertFalse(old_ready)
+        self.assertTrue(new_ready)
+
+    def test_idle_loop_barely_iterates(self):
+        """Test a main-loop style iteration: it runs once per frame when idle and
+        handles broker messages as soon as they arrive."""
+        # Arrange
+        MockMQTTClient.reset_global_flags()
+        patcher = patch.dict('sys.modules', {
+            'umqtt': MagicMock(),
+            'umqtt.simple': MagicMock(MQTTClient=MagicMock(side_effect=MockMQTTClient)),
+            'mqtt_client': MagicMock(NonBlockingMQTTClient=MagicMock(side_effect=MockMQTTClient)),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sys.modules.pop('mqtt_service', None)
+        self.addCleanup(sys.modules.pop, 'mqtt_service', None)
+        from mqtt_service import MQTTService
+        service = MQTTService("broker", "user", "pass", "client")
+        service.connect_and_subscribe()
+        service.client.sock = self.broker.client
+        received = []
+        service.add_listener(received.append)
+        waiter = SocketWaiter()
+        frame_ms = 20
+        iterations = 0
+
+        def on_readable():
+            # What umqtt's check_msg would do: read the packet off the socket
+            self.broker.drain()
+            service.client.simulate_message("msb/state", '{"open": true}')
+            service.check_msg()
+
+        self.broker.publish(delay=0.05)
+
+        # Act
+        end = time.perf_counter() + 0.2
+        while time.perf_counter() < end:
+            iterations += 1
+            waiter.watch(service.socket())
+            if waiter.wait(frame_ms):
+                on_readable()
+
+        # Assert
+        self.assertLess(iterations, 0.2 * 1000 / frame_ms + 3)
+        self.assertEqual(received, [{"open": True}])
+        self.assertEqual(waiter.wakeups, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
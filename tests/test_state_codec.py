@@ -0,0 +1,69 @@
+"""Tests for the compact binary state payload."""
+
+import json
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from state_codec import STATE_MAGIC, decode_state, encode_state, is_binary
+
+
+class TestStateCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Test that decoding an encoded state gives the JSON dict back."""
+        # Arrange
+        state = {"open": True, "openUntil": "22:30"}
+
+        # Act
+        payload = encode_state(state)
+
+        # Assert
+        self.assertEqual(len(payload), 4)
+        self.assertEqual(decode_state(payload), state)
+
+    def test_iso_closing_time(self):
+        """Test that an ISO date-time openUntil is reduced to HH:MM."""
+        # Act
+        payload = encode_state({"open": True, "openUntil": "2024-06-01T23:45:00+02:00"})
+
+        # Assert
+        self.assertEqual(decode_state(payload), {"open": True, "openUntil": "23:45"})
+
+    def test_closed_without_time(self):
+        """Test a closed state carries no openUntil."""
+        # Act
+        state = decode_state(encode_state({"open": False}))
+
+        # Assert
+        self.assertEqual(state, {"open": False})
+
+    def test_invalid_payloads_raise(self):
+        """Test that truncated payloads and impossible times are rejected."""
+        # Arrange
+        payloads = [
+            bytes((STATE_MAGIC, 1, 0)),
+            bytes((STATE_MAGIC, 3, 0x05, 0xA0)),  # 1440 minutes
+            b"\x00\x01\x00\x00",
+        ]
+
+        # Act / Assert
+        for payload in payloads:
+            with self.assertRaises(ValueError):
+                decode_state(payload)
+
+    def test_json_is_not_detected_as_binary(self):
+        """Test the header byte check against JSON and empty payloads."""
+        # Arrange
+        json_payload = json.dumps({"open": True}).encode()
+
+        # Act / Assert
+        self.assertFalse(is_binary(json_payload))
+        self.assertFalse(is_binary(b""))
+        self.assertTrue(is_binary(encode_state({"open": True})))
+
+
+if __name__ == '__main__':
+    unittest.main()
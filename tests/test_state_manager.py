@@ -0,0 +1,255 @@
+"""Tests for StateManager against a local stand-in API server."""
+
+import json
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_http import StandInHTTPServer
+from tests.mock_micropython import FakeTicksTime
+
+MODULES = ['http_client', 'state_manager']
+
+
+class FakeMQTTService:
+
+    def __init__(self):
+        self.connected = False
+        self.state = {"open": False}
+        self.applied = []
+
+    def is_connected(self):
+        return self.connected
+
+    def get_state(self):
+        return self.state
+
+    def apply_state(self, data):
+        self.state = data
+        self.applied.append(data)
+
+
+class ManualWorker:
+    """Stands in for RequestWorker: a job from run() waits until finish() runs it."""
+
+    def __init__(self):
+        self.job = None
+
+    def run(self, job, done=None):
+        self.job = (job, done)
+
+    def finish(self):
+        job, done = self.job
+        self.job = None
+        result = job()
+        if done is not None:
+            done(result)
+
+
+class StateAPI:
+    """State endpoint answering conditional requests like the status API."""
+
+    def __init__(self):
+        self.state = {"open": True, "openUntil": "22:00"}
+        self.version = 1
+
+    def change(self, state):
+        self.state = state
+        self.version += 1
+
+    def __call__(self, method, path, headers):
+        etag = '"{}"'.format(self.version)
+        if headers.get('if-none-match') == etag:
+            return 304, {'ETag': etag}, b""
+        return 200, {'ETag': etag}, json.dumps(self.state).encode()
+
+
+class StateManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        for name in MODULES:
+            sys.modules.pop(name, None)
+        import http_client
+        import state_manager
+        self.state_manager = state_manager
+        self.ticks = FakeTicksTime()
+        self.patches = [
+            patch.object(http_client, 'time', self.ticks),
+            patch.object(state_manager, 'time', self.ticks),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+        for patcher in self.patches:
+            patcher.stop()
+        for name in MODULES:
+            sys.modules.pop(name, None)
+
+
+class TestStateManagerKeepAlive(StateManagerTestCase):
+
+    def test_send_time_keeps_the_connection(self):
+        """Test that repeated presses reuse the API connection."""
+        # Arrange
+        self.server = StandInHTTPServer()
+        manager = self.state_manager.StateManager("test-key")
+        manager.time_url = self.server.url + "/api/msb/state/openUntil/"
+        self.addCleanup(lambda: manager.connection.close())
+
+        # Act
+        statuses = [manager.sendTime("21:30"), manager.sendTime("21:45")]
+
+        # Assert
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.requests[1][:2], ("GET", "/api/msb/state/openUntil/21:45"))
+        self.assertEqual(self.server.requests[1][2]['msb-key'], "test-key")
+        self.assertEqual(manager.connection.reuses, 1)
+
+    def test_send_time_failure_returns_none(self):
+        """Test that an unreachable API is logged, not raised."""
+        # Arrange
+        manager = self.state_manager.StateManager("test-key")
+        manager.time_url = "http://127.0.0.1:1/api/msb/state/openUntil/"
+
+        # Act
+        status = manager.sendTime("21:30")
+
+        # Assert
+        self.assertIsNone(status)
+
+
+class TestStateManagerPolling(StateManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = StateAPI()
+        self.server = StandInHTTPServer(self.api)
+        self.mqtt = FakeMQTTService()
+        self.worker = ManualWorker()
+        self.manager = self.state_manager.StateManager("test-key", self.mqtt, self.worker)
+        self.manager.state_url = self.server.url + "/api/msb/state"
+        self.addCleanup(lambda: self.manager.poll_connection and self.manager.poll_connection.close())
+
+    def poll(self):
+        self.manager.poll_state()
+        if self.worker.job is not None:
+            self.worker.finish()
+
+    def poll_after(self, seconds):
+        self.ticks.now += seconds * 1000
+        self.poll()
+
+    def test_poll_runs_on_the_worker(self):
+        """Test that poll_state() only queues the request and returns."""
+        # Arrange
+        manager = self.manager
+
+        # Act
+        manager.poll_state()
+        manager.poll_state()
+
+        # Assert
+        self.assertTrue(manager.polling)
+        self.assertIsNotNone(self.worker.job)
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(self.mqtt.applied, [])
+
+    def test_polls_state_while_mqtt_is_down(self):
+        """Test that the polled state is applied to the MQTT service."""
+        # Arrange
+        manager = self.manager
+
+        # Act
+        self.poll()
+
+        # Assert
+        self.assertTrue(manager.polling)
+        self.assertEqual(self.mqtt.applied, [{"open": True, "openUntil": "22:00"}])
+        self.assertNotIn('if-none-match', self.server.requests[0][2])
+
+    def test_not_modified_is_not_parsed(self):
+        """Test that a 304 answer to If-None-Match skips JSON parsing."""
+        # Arrange
+        self.poll()
+        loads = MagicMock(wraps=json.loads)
+
+        # Act
+        with patch.object(self.state_manager.json, 'loads', loads):
+            self.poll_after(self.manager.POLL_MIN_INTERVAL)
+
+        # Assert
+        self.assertEqual(self.server.requests[1][2]['if-none-match'], '"1"')
+        self.assertEqual(self.manager.not_modified, 1)
+        loads.assert_not_called()
+        self.assertEqual(len(self.mqtt.applied), 1)
+
+    def test_interval_backs_off_until_the_state_changes(self):
+        """Test that unchanged polls double the interval and a change resets it."""
+        # Arrange
+        self.poll()
+        self.poll_after(10)
+        backed_off = self.manager.poll_interval
+        self.poll_after(backed_off - 1)
+        requests_before_due = len(self.server.requests)
+
+        # Act
+        self.api.change({"open": False})
+        self.poll_after(1)
+
+        # Assert
+        self.assertEqual(backed_off, 2 * self.manager.POLL_MIN_INTERVAL)
+        self.assertEqual(requests_before_due, 2)
+        self.assertEqual(self.mqtt.applied[-1], {"open": False})
+        self.assertEqual(self.manager.poll_interval, self.manager.POLL_MIN_INTERVAL)
+
+    def test_stops_polling_when_mqtt_reconnects(self):
+        """Test that a connected MQTT service switches back to push."""
+        # Arrange
+        self.poll()
+
+        # Act
+        self.mqtt.connected = True
+        self.poll_after(self.manager.POLL_MAX_INTERVAL)
+
+        # Assert
+        self.assertFalse(self.manager.polling)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_result_after_mqtt_reconnects_is_dropped(self):
+        """Test that a poll finishing after MQTT came back does not overwrite the pushed state."""
+        # Arrange
+        self.manager.poll_state()
+        fetch = self.worker.job
+
+        # Act
+        self.mqtt.connected = True
+        self.manager.poll_state()
+        fetch[1](fetch[0]())
+
+        # Assert
+        self.assertEqual(self.mqtt.applied, [])
+        self.assertFalse(self.manager.polling)
+
+    def test_no_poll_while_offline(self):
+        """Test that nothing is requested without WiFi."""
+        # Arrange
+        manager = self.manager
+
+        # Act
+        manager.poll_state(online=False)
+
+        # Assert
+        self.assertIsNone(self.worker.job)
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""Tests for the optimistic state store with confirmation and rollback."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import FakeTicksTime
+
+
+class FakeMQTTService:
+    """Delivers msb/state messages to the listeners like MQTTService does."""
+
+    def __init__(self, state=None):
+        self.state = state
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def get_state(self):
+        return self.state
+
+    def announce(self, state):
+        self.state = state
+        for listener in self.listeners:
+            listener(state)
+
+
+class TestStateStore(unittest.TestCase):
+
+    def setUp(self):
+        sys.modules.pop('state_store', None)
+        import state_store
+        self.ticks = FakeTicksTime()
+        self.time_patcher = patch.object(state_store, 'time', self.ticks)
+        self.time_patcher.start()
+        self.service = FakeMQTTService({"open": False})
+        self.store = state_store.StateStore(self.service, confirm_timeout=15)
+        self.outcomes = []
+        self.store.add_listener(lambda time_string, outcome: self.outcomes.append((time_string, outcome)))
+
+    def tearDown(self):
+        self.time_patcher.stop()
+        sys.modules.pop('state_store', None)
+
+    def test_request_is_shown_at_once(self):
+        """Test that a requested closing time is displayed before any confirmation."""
+        # Arrange
+        version = self.store.get_state_version()
+
+        # Act
+        self.store.request("22:00")
+
+        # Assert
+        state = self.store.get_state()
+        self.assertTrue(state['open'])
+        self.assertEqual(state['openUntil'], "22:00")
+        self.assertTrue(state['pending'])
+        self.assertNotEqual(self.store.get_state_version(), version)
+
+    def test_matching_state_confirms(self):
+        """Test that msb/state with the requested openUntil confirms the request."""
+        # Arrange
+        self.store.request("22:00")
+        self.ticks.now += 400
+
+        # Act
+        self.service.announce({"open": True, "openUntil": "2026-10-19T22:00:00+02:00"})
+
+        # Assert
+        self.assertIsNone(self.store.pending)
+        self.assertNotIn('pending', self.store.get_state())
+        self.assertEqual(self.outcomes, [("22:00", self.store.CONFIRMED)])
+        self.assertEqual(self.store.confirmations, 1)
+        self.assertEqual(self.store.last_confirm_ms, 400)
+
+    def test_other_state_does_not_confirm(self):
+        """Test that an unrelated state change keeps the request pending."""
+        # Arrange
+        self.store.request("22:00")
+
+        # Act
+        self.service.announce({"open": True, "openUntil": "21:00"})
+
+        # Assert
+        self.assertEqual(self.store.get_state()['openUntil'], "22:00")
+        self.assertEqual(self.store.confirmed['openUntil'], "21:00")
+        self.assertEqual(self.outcomes, [])
+
+    def test_unconfirmed_request_rolls_back_after_deadline(self):
+        """Test that the confirmed state returns once the deadline passes."""
+        # Arrange
+        self.store.request("22:00")
+        self.ticks.now += 14999
+        self.store.poll()
+        pending_before_deadline = self.store.pending
+
+        # Act
+        self.ticks.now += 1
+        self.store.poll()
+
+        # Assert
+        self.assertEqual(pending_before_deadline, "22:00")
+        self.assertEqual(self.store.get_state(), {"open": False})
+        self.assertEqual(self.outcomes, [("22:00", self.store.ROLLED_BACK)])
+        self.assertEqual(self.store.rollbacks, 1)
+
+    def test_rollback_ignores_superseded_request(self):
+        """Test that a failure of an older request leaves the newer one pending."""
+        # Arrange
+        self.store.request("22:00")
+        self.store.request("23:00")
+
+        # Act
+        self.store.rollback("22:00")
+
+        # Assert
+        self.assertEqual(self.store.pending, "23:00")
+        self.assertEqual(self.store.rollbacks, 0)
+
+    def test_request_for_current_state_is_not_pending(self):
+        """Test that requesting the time already shown needs no confirmation."""
+        # Arrange
+        self.service.announce({"open": True, "openUntil": "22:00"})
+
+        # Act
+        self.store.request("22:00")
+
+        # Assert
+        self.assertIsNone(self.store.pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+"""Tests for the MQTT closing time command with HTTP fallback."""
+
+import json
+import sys
+import os
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_broker import StandInBroker
+from tests.mock_micropython import FakeTicksTime, HostTicksTime
+from tests.mock_mqtt import MockMQTTClient, fake_socket_module, fake_umqtt_simple_module
+
+MODULES = ['mqtt_client', 'mqtt_service', 'time_command']
+
+
+class TestMQTTTimeCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_client = None
+        MockMQTTClient.reset_global_flags()
+
+        def mock_mqtt_client_factory(*args, **kwargs):
+            self.mock_client = MockMQTTClient(*args, **kwargs)
+            return self.mock_client
+
+        mock_client_class = MagicMock(side_effect=mock_mqtt_client_factory)
+        self.patcher = patch.dict('sys.modules', {
+            'umqtt': MagicMock(),
+            'umqtt.simple': MagicMock(MQTTClient=mock_client_class),
+            'mqtt_client': MagicMock(NonBlockingMQTTClient=mock_client_class)
+        })
+        self.patcher.start()
+        for name in MODULES[1:]:
+            sys.modules.pop(name, None)
+        import mqtt_service
+        import time_command
+        self.ticks = FakeTicksTime()
+        self.time_patcher = patch.object(time_command, 'time', self.ticks)
+        self.time_patcher.start()
+
+        self.service = mqtt_service.MQTTService("broker", "user", "pass", "button1")
+        self.http_calls = []
+        self.command = time_command.MQTTTimeCommand(self.service, fallback=self.http_calls.append)
+        self.service.connect_and_subscribe()
+
+    def tearDown(self):
+        self.time_patcher.stop()
+        MockMQTTClient.reset_global_flags()
+        self.patcher.stop()
+        for name in MODULES[1:]:
+            sys.modules.pop(name, None)
+
+    def sent_commands(self):
+        return [json.loads(msg) for topic, msg, _, _ in self.mock_client.published
+                if topic == self.command.COMMAND_TOPIC]
+
+    def acknowledge(self, command_id, ok=True):
+        ack = json.dumps({"id": command_id, "ok": ok})
+        self.mock_client.simulate_message(self.command.ack_topic, ack)
+        self.service.check_msg()
+
+    def test_command_is_published_with_id_and_ack_topic(self):
+        """Test the command payload and the ack subscription."""
+        # Act
+        self.command("22:30")
+
+        # Assert
+        self.assertEqual(self.sent_commands(), [
+            {"openUntil": "22:30", "id": 1, "ack": "msb/cmd/ack/button1"},
+        ])
+        self.assertIn(("msb/cmd/ack/button1", 0), self.mock_client.subscriptions)
+        self.assertTrue(self.command.is_pending())
+
+    def test_acknowledgement_records_latency(self):
+        """Test that a matching ack completes the command without HTTP."""
+        # Arrange
+        self.command("22:30")
+        self.ticks.now += 120
+
+        # Act
+        self.acknowledge(1)
+        self.ticks.now += 10000
+        self.command.poll()
+
+        # Assert
+        self.assertEqual(self.command.acks, 1)
+        self.assertEqual(self.command.last_latency_ms, 120)
+        self.assertEqual(self.http_calls, [])
+
+    def test_missing_ack_falls_back_to_http(self):
+        """Test the HTTP fallback after ack_timeout_ms."""
+        # Arrange
+        self.command("23:00")
+
+        # Act
+        self.ticks.now += self.command.ack_timeout_ms - 1
+        self.command.poll()
+        before_timeout = list(self.http_calls)
+        self.ticks.now += 1
+        self.command.poll()
+        self.command.poll()
+
+        # Assert
+        self.assertEqual(before_timeout, [])
+        self.assertEqual(self.http_calls, ["23:00"])
+        self.assertEqual(self.command.timeouts, 1)
+
+    def test_disconnected_uses_http_at_once(self):
+        """Test that no command is queued without a broker connection."""
+        # Arrange
+        self.service._set_connected(False)
+
+        # Act
+        self.command("21:15")
+
+        # Assert
+        self.assertEqual(self.http_calls, ["21:15"])
+        self.assertFalse(self.command.is_pending())
+
+    def test_rejection_and_stale_acks(self):
+        """Test that a rejected command is not retried and old ids are ignored."""
+        # Arrange
+        self.command("22:00")
+        self.ticks.now += self.command.ack_timeout_ms
+        self.command.poll()  # times out, HTTP fallback
+        self.command("22:15")
+
+        # Act
+        self.acknowledge(1)
+        still_pending = self.command.is_pending()
+        self.acknowledge(2, ok=False)
+
+        # Assert
+        self.assertTrue(still_pending)
+        self.assertEqual(self.command.rejects, 1)
+        self.assertEqual(self.command.acks, 0)
+        self.assertEqual(self.http_calls, ["22:00"])
+
+
+class TestMQTTTimeCommandAgainstBroker(unittest.TestCase):
+    """Press-to-confirmation over a real socket to a local stand-in broker."""
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {
+            'umqtt': MagicMock(),
+            'umqtt.simple': fake_umqtt_simple_module(),
+        })
+        self.patcher.start()
+        for name in MODULES:
+            sys.modules.pop(name, None)
+        import mqtt_client
+        import mqtt_service
+        import time_command
+        self.patches = [
+            patch.object(mqtt_client, 'socket', fake_socket_module()),
+            patch.object(time_command, 'time', HostTicksTime()),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+        self.mqtt_service = mqtt_service
+        self.time_command = time_command
+        self.broker = StandInBroker(on_publish=self.backend)
+
+    def tearDown(self):
+        if self.service.client is not None and self.service.client.sock is not None:
+            self.service.client.sock.close()
+        self.broker.close()
+        for patcher in self.patches:
+            patcher.stop()
+        self.patcher.stop()
+        for name in MODULES:
+            sys.modules.pop(name, None)
+
+    def backend(self, topic, payload):
+        """Stand-in for the status backend: acknowledge, then publish the new state."""
+        if topic != self.time_command.MQTTTimeCommand.COMMAND_TOPIC:
+            return
+        command = json.loads(payload)
+        self.broker.publish(command["ack"], json.dumps({"id": command["id"], "ok": True}).encode())
+        self.broker.publish("msb/state", json.dumps({"open": True, "openUntil": command["openUntil"]}).encode())
+
+    def poll_until(self, condition, timeout=2):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            self.service.check_msg()
+            self.command.poll()
+            if condition():
+                return
+            time.sleep(0.001)
+        self.fail("condition not reached")
+
+    def test_press_to_confirmation_latency(self):
+        """Measure the time from the button press to the acknowledgement and the new state."""
+        # Arrange
+        self.service = self.mqtt_service.MQTTService("127.0.0.1", "user", "pass", "button1",
+                                                     port=self.broker.port)
+        http_calls = []
+        self.command = self.time_command.MQTTTimeCommand(self.service, fallback=http_calls.append)
+        states = []
+        self.service.add_listener(states.append)
+        self.poll_until(self.service.is_connected)
+
+        # Act
+        pressed = time.perf_counter()
+        self.command("22:45")
+        self.poll_until(lambda: self.command.acks == 1)
+        acknowledged = time.perf_counter()
+        self.poll_until(lambda: states)
+        confirmed = time.perf_counter()
+
+        # Assert
+        self.assertEqual(http_calls, [])
+        self.assertEqual(states, [{"open": True, "openUntil": "22:45"}])
+        self.assertLess(acknowledged - pressed, 0.5)
+        self.assertLess(confirmed - pressed, 0.5)
+        self.assertIsNotNone(self.command.last_latency_ms)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Tests for the quarter-hour closing time slot table."""
+
+import sys
+import os
+import calendar
+import math
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import timezone
+from time_slots import ClosingTimeSlots
+
+
+def utc(*args):
+    return calendar.timegm(args + (0,) * (6 - len(args)))
+
+
+def reference_time_from_counter(zone, t, counter):
+    """The previous time_from_counter(): tuple round trip through mktime.
+
+    MicroPython's localtime()/mktime() work in UTC, hence gmtime/timegm.
+    """
+    now = time.gmtime(t + zone.offset(t) + (counter + 2) * 60*15)
+    x = (now[0], now[1], now[2], now[3], math.floor(now[4]/15)*15, now[5], 0, 0, 0)
+    now = time.gmtime(calendar.timegm(x))
+    return "{:02d}:{:02d}".format(now[3], now[4])
+
+
+class TestClosingTimeSlots(unittest.TestCase):
+
+    def test_first_slot_is_half_an_hour_ahead_floored(self):
+        """Test the first offered closing time."""
+        # Arrange
+        slots = ClosingTimeSlots(timezone.TimeZone())
+
+        # Act
+        first = slots.lookup(0, utc(2024, 6, 1, 16, 7, 30))  # 18:07:30 CEST
+
+        # Assert
+        self.assertEqual(first, "18:30")
+
+    def test_rebuilds_only_at_quarter_hour_boundaries(self):
+        """Test that lookups inside a quarter hour reuse the table."""
+        # Arrange
+        slots = ClosingTimeSlots(timezone.TimeZone())
+        start = utc(2024, 6, 1, 16, 0)
+
+        # Act
+        for second in range(0, 30 * 60, 10):
+            for counter in range(81):
+                slots.lookup(counter, start + second)
+
+        # Assert
+        self.assertEqual(slots.rebuilds, 2)
+
+    def test_counter_outside_table_is_computed(self):
+        """Test that counters beyond the table still give a time."""
+        # Arrange
+        slots = ClosingTimeSlots(timezone.TimeZone(), count=4)
+        t = utc(2024, 6, 1, 16, 0)
+
+        # Act
+        inside = slots.lookup(3, t)
+        outside = slots.lookup(4, t)
+
+        # Assert
+        self.assertEqual(inside, "19:15")
+        self.assertEqual(outside, "19:30")
+
+    def test_table_is_updated_in_place(self):
+        """Test that rebuilding does not allocate a new list."""
+        # Arrange
+        slots = ClosingTimeSlots(timezone.TimeZone())
+        table = slots._slots
+
+        # Act
+        slots.lookup(0, utc(2024, 6, 1, 16, 0))
+        slots.lookup(0, utc(2024, 6, 1, 17, 0))
+
+        # Assert
+        self.assertIs(slots._slots, table)
+
+    def test_matches_previous_function_across_dst_and_midnight(self):
+        """Stress test against the tuple based implementation."""
+        # Arrange
+        zone = timezone.TimeZone()
+        slots = ClosingTimeSlots(zone)
+        windows = [
+            utc(2024, 3, 30, 18),   # spring forward
+            utc(2024, 10, 26, 18),  # fall back
+            utc(2024, 12, 31, 18),  # midnight and new year
+            utc(2024, 2, 28, 18),   # leap day
+        ]
+
+        # Act / Assert
+        for start in windows:
+            for step in range(0, 14 * 3600, 7 * 60 + 13):
+                t = start + step
+                for counter in range(81):
+                    expected = reference_time_from_counter(zone, t, counter)
+                    self.assertEqual(slots.lookup(counter, t), expected, (t, counter))
+
+    def test_other_zone_with_half_hour_offset(self):
+        """Test the table against the reference in a UTC+5:30 zone."""
+        # Arrange
+        zone = timezone.TimeZone("<+0530>-5:30")
+        slots = ClosingTimeSlots(zone)
+        start = utc(2024, 6, 1, 12)
+
+        # Act / Assert
+        for step in range(0, 4 * 3600, 11 * 60 + 7):
+            for counter in (0, 1, 40, 80):
+                t = start + step
+                self.assertEqual(slots.lookup(counter, t), reference_time_from_counter(zone, t, counter))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+"""Tests for the background NTP sync against a local UDP stand-in server."""
+
+import socket
+import struct
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import FakeTicksTime
+
+NTP_DELTA = 2208988800
+
+
+class World:
+    """True time in ms, shared by the stand-in server and the fake RTC."""
+
+    def __init__(self):
+        self.true_ms = 1700000000000
+
+
+class FakeClock:
+    """RTC stand-in: true time plus an error that adjust_ms() corrects."""
+
+    def __init__(self, world, error_ms=0):
+        self.world = world
+        self.error_ms = error_ms
+        self.adjustments = []
+
+    def now_ms(self):
+        return int(self.world.true_ms + self.error_ms)
+
+    def adjust_ms(self, delta_ms):
+        self.adjustments.append(delta_ms)
+        self.error_ms += delta_ms
+
+
+class StandInNTPServer:
+    """Answers NTP requests on 127.0.0.1 with the world's true time."""
+
+    def __init__(self, world):
+        self.world = world
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self.mode = 'answer'  # 'answer', 'drop', 'kiss'
+        self.requests = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, address = self.sock.recvfrom(48)
+            except OSError:
+                continue
+            self.requests += 1
+            if self.mode == 'drop':
+                continue
+            ms = self.world.true_ms
+            seconds, fraction = ms // 1000 + NTP_DELTA, (ms % 1000) * 4294967296 // 1000
+            reply = bytearray(48)
+            reply[0] = 0x1C  # LI=0, VN=3, Mode=4 (server)
+            reply[1] = 0 if self.mode == 'kiss' else 2
+            reply[24:32] = data[40:48]
+            struct.pack_into('!IIII', reply, 32, seconds, fraction, seconds, fraction)
+            self.sock.sendto(reply, address)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.sock.close()
+
+
+class TimeSyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = patch.dict('sys.modules', {'machine': MagicMock()})
+        self.patcher.start()
+        sys.modules.pop('time_sync', None)
+        import time_sync
+        self.time_sync = time_sync
+        self.ticks = FakeTicksTime()
+        self.time_patcher = patch.object(time_sync, 'time', self.ticks)
+        self.time_patcher.start()
+        self.world = World()
+        self.server = StandInNTPServer(self.world)
+
+    def tearDown(self):
+        self.server.close()
+        self.time_patcher.stop()
+        self.patcher.stop()
+        sys.modules.pop('time_sync', None)
+
+    def make_sync(self, error_ms=0, **kwargs):
+        self.clock = FakeClock(self.world, error_ms)
+        sync = self.time_sync.TimeSync('127.0.0.1', self.server.port, clock=self.clock, **kwargs)
+        self.addCleanup(sync.close)
+        return sync
+
+    def run_until_idle(self, sync):
+        sync.poll()
+        for _ in range(200):
+            if sync.state == sync.IDLE:
+                return
+            time.sleep(0.005)
+            sync.poll()
+        self.fail("no NTP answer")
+
+    def advance(self, seconds, drift_ppm=0):
+        self.ticks.now += seconds * 1000
+        self.world.true_ms += seconds * 1000
+        self.clock.error_ms += seconds * drift_ppm / 1000
+
+
+class TestTimeSync(TimeSyncTestCase):
+
+    def test_first_sync_steps_the_clock(self):
+        """Test that the first answer corrects the RTC at once."""
+        # Arrange
+        sync = self.make_sync(error_ms=-90000)
+
+        # Act
+        self.run_until_idle(sync)
+
+        # Assert
+        self.assertEqual(sync.syncs, 1)
+        self.assertAlmostEqual(self.clock.error_ms, 0, delta=5)
+        self.assertAlmostEqual(sync.last_offset_ms, 90000, delta=5)
+        self.assertEqual(sync.sync_age(), 0)
+
+    def test_poll_does_not_wait_for_the_answer(self):
+        """Test that poll() returns immediately while the server is silent."""
+        # Arrange
+        self.server.mode = 'drop'
+        sync = self.make_sync()
+
+        # Act
+        started = time.perf_counter()
+        for _ in range(100):
+            sync.poll()
+        duration = time.perf_counter() - started
+
+        # Assert
+        self.assertEqual(sync.state, sync.WAITING)
+        self.assertLess(duration, 0.5)
+
+    def test_timeout_backs_off(self):
+        """Test that lost answers are retried with a growing delay."""
+        # Arrange
+        self.server.mode = 'drop'
+        sync = self.make_sync(retry_min=5, retry_max=20)
+        delays = []
+
+        # Act
+        for _ in range(4):
+            sync.poll()
+            self.ticks.now += sync.REQUEST_TIMEOUT_MS
+            delays.append(sync.retry_delay)
+            sync.poll()
+            self.ticks.now += sync.retry_delay * 1000
+
+        # Assert
+        self.assertEqual(sync.failures, 4)
+        self.assertEqual(delays, [5, 10, 20, 20])
+        self.assertIsNone(sync.sync_age())
+
+    def test_kiss_of_death_is_a_failure(self):
+        """Test that a stratum 0 answer does not set the clock."""
+        # Arrange
+        self.server.mode = 'kiss'
+        sync = self.make_sync(error_ms=5000)
+
+        # Act
+        self.run_until_idle(sync)
+
+        # Assert
+        self.assertEqual(sync.failures, 1)
+        self.assertEqual(self.clock.adjustments, [])
+
+    def test_not_polled_while_offline(self):
+        """Test that no request is sent without a network connection."""
+        # Arrange
+        sync = self.make_sync()
+
+        # Act
+        sync.poll(online=False)
+
+        # Assert
+        self.assertEqual(sync.state, sync.IDLE)
+        self.assertEqual(self.server.requests, 0)
+
+    def test_interval_doubles_after_good_syncs(self):
+        """Test the resync backoff up to max_interval."""
+        # Arrange
+        sync = self.make_sync(min_interval=100, max_interval=300)
+        intervals = []
+
+        # Act
+        for _ in range(4):
+            self.run_until_idle(sync)
+            intervals.append(sync.interval)
+            self.advance(sync.interval)
+
+        # Assert
+        self.assertEqual(intervals, [100, 200, 300, 300])
+
+    def test_small_offset_is_slewed(self):
+        """Test that a small error is corrected in steps, not at once."""
+        # Arrange
+        sync = self.make_sync(slew_step_ms=50)
+        self.run_until_idle(sync)
+        self.advance(sync.interval)
+        self.clock.error_ms += 300
+
+        # Act
+        self.run_until_idle(sync)
+        steps = []
+        for _ in range(10):
+            self.advance(1)
+            before = len(self.clock.adjustments)
+            sync.poll()
+            steps.extend(self.clock.adjustments[before:])
+
+        # Assert
+        self.assertTrue(all(abs(step) <= 50 for step in steps))
+        self.assertAlmostEqual(self.clock.error_ms, 0, delta=sync.MIN_ADJUST_MS + 5)
+
+    def test_drift_is_estimated_and_compensated(self):
+        """Test that a constant RTC drift is learned and corrected between syncs."""
+        # Arrange
+        sync = self.make_sync(min_interval=600, max_interval=600)
+        self.run_until_idle(sync)
+
+        # Act: the RTC gains 200 ppm
+        for _ in range(4):
+            for _ in range(600):
+                self.advance(1, drift_ppm=200)
+                sync.poll()
+            self.run_until_idle(sync)
+        error_before_last_sync = sync.last_offset_ms
+
+        # Assert
+        self.assertAlmostEqual(sync.drift_ppm, 200, delta=20)
+        self.assertLess(abs(error_before_last_sync), 40)
+
+    def test_listener_receives_offset(self):
+        """Test the sync listener and that listener errors are contained."""
+        # Arrange
+        sync = self.make_sync(error_ms=2000)
+        received = []
+        sync.add_listener(lambda offset: 1 / 0)
+        sync.add_listener(received.append)
+
+        # Act
+        self.run_until_idle(sync)
+
+        # Assert
+        self.assertEqual(len(received), 1)
+        self.assertAlmostEqual(received[0], -2000, delta=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+"""Tests for the POSIX TZ rule engine."""
+
+import sys
+import os
+import calendar
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    from datetime import datetime, timezone as dt_timezone
+    ZoneInfo('Europe/Berlin')
+    HAVE_ZONEINFO = True
+except Exception:
+    HAVE_ZONEINFO = False
+
+
+def utc(*args):
+    return calendar.timegm(args + (0,) * (6 - len(args)))
+
+
+class TestTimeZoneRules(unittest.TestCase):
+
+    def test_central_europe_transitions(self):
+        """Test the EU rule: last Sundays of March and October at 01:00 UTC."""
+        # Arrange
+        zone = timezone.TimeZone(timezone.CENTRAL_EUROPE)
+
+        # Act
+        transitions = zone.transitions(2024)
+
+        # Assert
+        self.assertEqual(transitions, (utc(2024, 3, 31, 1), utc(2024, 10, 27, 1)))
+
+    def test_central_europe_offsets_around_transitions(self):
+        """Test offsets one second before and at each transition."""
+        # Arrange
+        zone = timezone.TimeZone()
+        start, end = utc(2025, 3, 30, 1), utc(2025, 10, 26, 1)
+
+        # Act
+        offsets = [zone.offset(start - 1), zone.offset(start), zone.offset(end - 1), zone.offset(end)]
+
+        # Assert
+        self.assertEqual(offsets, [3600, 7200, 7200, 3600])
+
+    def test_us_eastern_rule(self):
+        """Test a rule with a west-of-UTC offset and second-Sunday start."""
+        # Arrange
+        zone = timezone.TimeZone("EST5EDT,M3.2.0,M11.1.0")
+
+        # Act
+        transitions = zone.transitions(2024)
+
+        # Assert
+        self.assertEqual(transitions, (utc(2024, 3, 10, 7), utc(2024, 11, 3, 6)))
+        self.assertEqual(zone.offset(utc(2024, 7, 1)), -4 * 3600)
+
+    def test_southern_hemisphere_dst_spans_new_year(self):
+        """Test a rule whose daylight period crosses the year boundary."""
+        # Arrange
+        zone = timezone.TimeZone("AEST-10AEDT,M10.1.0,M4.1.0/3")
+
+        # Act
+        new_year = zone.offset(utc(2025, 1, 1))
+        winter = zone.offset(utc(2025, 7, 1))
+
+        # Assert
+        self.assertEqual(new_year, 11 * 3600)
+        self.assertEqual(winter, 10 * 3600)
+        self.assertEqual(zone.transitions(2024), (utc(2024, 10, 5, 16), utc(2024, 4, 6, 16)))
+
+    def test_fixed_offset_with_minutes_and_quoted_name(self):
+        """Test a rule without DST and a non-hour offset."""
+        # Arrange
+        zone = timezone.TimeZone("<+0530>-5:30")
+
+        # Act
+        offset = zone.offset(utc(2024, 6, 1))
+
+        # Assert
+        self.assertEqual(offset, 5 * 3600 + 30 * 60)
+        self.assertIsNone(zone.transitions(2024))
+        self.assertFalse(zone.is_dst(utc(2024, 6, 1)))
+
+    def test_julian_day_rule_skips_february_29(self):
+        """Test that Jn counts the same calendar day in leap years."""
+        # Arrange
+        zone = timezone.TimeZone("XST0XDT,J60,J300")
+
+        # Act
+        start_leap, _ = zone.transitions(2024)
+        start_common, _ = zone.transitions(2023)
+
+        # Assert
+        self.assertEqual(start_leap, utc(2024, 3, 1, 2))
+        self.assertEqual(start_common, utc(2023, 3, 1, 2))
+
+    def test_invalid_rule_raises(self):
+        """Test that malformed rules are rejected."""
+        for rule in ("C-1", "CET-1CEST,M3.5", "CET-1CEST,M3.5.0,M10.5.0/3x"):
+            with self.subTest(rule=rule):
+                with self.assertRaises(ValueError):
+                    timezone.TimeZone(rule)
+
+
+class TestTimeZoneCache(unittest.TestCase):
+
+    def test_transitions_are_cached_per_year(self):
+        """Test that a year's pair is computed once."""
+        # Arrange
+        zone = timezone.TimeZone()
+
+        # Act
+        first = zone.transitions(2030)
+        second = zone.transitions(2030)
+
+        # Assert
+        self.assertIs(first, second)
+
+    def test_offset_reuses_interval_until_next_transition(self):
+        """Test that offset() does not rebuild inside the current interval."""
+        # Arrange
+        zone = timezone.TimeZone()
+        zone.offset(utc(2024, 5, 1))
+        until = zone._until
+
+        # Act
+        for hour in range(0, 24 * 60, 7):
+            zone.offset(utc(2024, 5, 1) + hour * 3600)
+
+        # Assert
+        self.assertEqual(zone._until, until)
+        self.assertEqual(until, utc(2024, 10, 27, 1))
+
+    def test_hhmm_formats_local_clock(self):
+        """Test the cached "HH:MM" string, including the DST switch."""
+        # Arrange
+        zone = timezone.TimeZone()
+        start = utc(2024, 3, 31, 1)
+
+        # Act
+        before = zone.hhmm(start - 60)
+        same_minute = zone.hhmm(start - 30)
+        after = zone.hhmm(start)
+
+        # Assert
+        self.assertEqual(before, "01:59")
+        self.assertIs(same_minute, before)
+        self.assertEqual(after, "03:00")
+
+    def test_localtime_returns_local_tuple(self):
+        """Test the local time tuple."""
+        # Arrange
+        zone = timezone.TimeZone()
+
+        # Act
+        local = zone.localtime(utc(2024, 12, 31, 23, 30))
+
+        # Assert
+        self.assertEqual(tuple(local[:5]), (2025, 1, 1, 0, 30))
+
+
+@unittest.skipUnless(HAVE_ZONEINFO, "zoneinfo database not available")
+class TestTimeZoneAgainstZoneinfo(unittest.TestCase):
+
+    def check(self, rule, name, years):
+        zone = timezone.TimeZone(rule)
+        reference = ZoneInfo(name)
+        t = utc(years[0], 1, 1)
+        end = utc(years[1], 1, 1)
+        while t < end:
+            expected = datetime.fromtimestamp(t, dt_timezone.utc).astimezone(reference).utcoffset()
+            self.assertEqual(zone.offset(t), int(expected.total_seconds()), (name, t))
+            t += 3 * 3600 + 17 * 60
+
+    def test_berlin(self):
+        """Test hourly offsets against the zoneinfo database for Berlin."""
+        self.check(timezone.CENTRAL_EUROPE, 'Europe/Berlin', (2020, 2036))
+
+    def test_new_york(self):
+        """Test offsets against the zoneinfo database for New York."""
+        self.check("EST5EDT,M3.2.0,M11.1.0", 'America/New_York', (2010, 2030))
+
+    def test_sydney(self):
+        """Test offsets against the zoneinfo database for Sydney."""
+        self.check("AEST-10AEDT,M10.1.0,M4.1.0/3", 'Australia/Sydney', (2010, 2030))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Tests for the wildcard topic router."""
+
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from topic_router import TopicRouter
+
+
+class Recorder:
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def __call__(self, topic, msg):
+        self.calls.append((self.name, topic, msg))
+
+
+class TestTopicRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = TopicRouter()
+        self.calls = []
+
+    def add(self, pattern, qos=0):
+        self.router.add(pattern, Recorder(pattern, self.calls), qos)
+
+    def matched(self, topic):
+        return sorted(handler.name for handler in self.router.match(topic))
+
+    def test_exact_and_single_level_wildcard(self):
+        """Test that + matches exactly one level."""
+        # Arrange
+        self.add("msb/state")
+        self.add("msb/+")
+        self.add("msb/+/config")
+
+        # Act / Assert
+        self.assertEqual(self.matched("msb/state"), ["msb/+", "msb/state"])
+        self.assertEqual(self.matched("msb/button/config"), ["msb/+/config"])
+        self.assertEqual(self.matched("msb/button/config/x"), [])
+        self.assertEqual(self.matched("msb"), [])
+
+    def test_multi_level_wildcard_includes_parent(self):
+        """Test that # matches any depth including the parent level."""
+        # Arrange
+        self.add("msb/#")
+        self.add("#")
+
+        # Act / Assert
+        self.assertEqual(self.matched("msb"), ["#", "msb/#"])
+        self.assertEqual(self.matched("msb/a/b/c"), ["#", "msb/#"])
+        self.assertEqual(self.matched("other"), ["#"])
+
+    def test_dollar_topics_skip_leading_wildcards(self):
+        """Test that $SYS topics only match patterns naming them."""
+        # Arrange
+        self.add("#")
+        self.add("+/broker/uptime")
+        self.add("$SYS/#")
+
+        # Act / Assert
+        self.assertEqual(self.matched("$SYS/broker/uptime"), ["$SYS/#"])
+
+    def test_dispatch_passes_bytes_topic_and_counts_handlers(self):
+        """Test dispatch with the bytes topics umqtt delivers."""
+        # Arrange
+        self.add("msb/state")
+
+        # Act
+        handled = self.router.dispatch(b"msb/state", b"{}")
+        unhandled = self.router.dispatch(b"msb/other", b"{}")
+
+        # Assert
+        self.assertEqual(handled, 1)
+        self.assertEqual(unhandled, 0)
+        self.assertEqual(self.calls, [("msb/state", b"msb/state", b"{}")])
+
+    def test_handler_error_does_not_stop_other_handlers(self):
+        """Test that one failing handler does not hide the message from others."""
+        # Arrange
+        self.router.add("msb/#", lambda topic, msg: 1 / 0)
+        self.add("msb/state")
+
+        # Act
+        self.router.dispatch("msb/state", b"x")
+
+        # Assert
+        self.assertEqual(len(self.calls), 1)
+
+    def test_repeated_topics_do_not_walk_the_trie(self):
+        """Test that dispatch cost does not grow with the number of patterns."""
+        # Arrange
+        for index in range(200):
+            self.add(f"space/{index}/+")
+        self.add("msb/state")
+        walks = []
+        real_walk = self.router._walk
+
+        def counting_walk(*args):
+            walks.append(args[2])
+            return real_walk(*args)
+
+        # Act
+        with patch.object(self.router, '_walk', counting_walk):
+            for _ in range(1000):
+                self.router.dispatch(b"msb/state", b"{}")
+
+        # Assert
+        self.assertEqual(len(self.calls), 1000)
+        self.assertLessEqual(len(walks), 3)
+
+    def test_adding_a_pattern_invalidates_cached_matches(self):
+        """Test that a new pattern is seen by topics dispatched before."""
+        # Arrange
+        self.add("msb/state")
+        self.router.dispatch("msb/state", b"1")
+
+        # Act
+        self.add("msb/+")
+        self.router.dispatch("msb/state", b"2")
+
+        # Assert
+        self.assertEqual([name for name, _, msg in self.calls if msg == b"2"], ["msb/state", "msb/+"])
+
+    def test_subscriptions_are_unique_with_highest_qos(self):
+        """Test the subscription list sent on reconnect."""
+        # Arrange
+        self.add("msb/state")
+        self.add("msb/cmd/#", qos=1)
+        self.add("msb/state", qos=1)
+
+        # Act
+        subscriptions = self.router.subscriptions()
+
+        # Assert
+        self.assertEqual(subscriptions, [("msb/state", 1), ("msb/cmd/#", 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,369 @@
+"""Tests for WifiManager with a stand-in network module."""
+
+import json
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tests.mock_micropython import FakeTicksTime
+from tests.mock_network import MockNetworkModule, scan_entry
+
+LOBBY = b'\x00\x11\x22\x33\x44\x55'
+WORKSHOP = b'\x66\x77\x88\x99\xaa\xbb'
+
+
+class WifiManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.network = MockNetworkModule()
+        self.patcher = patch.dict('sys.modules', {'network': self.network})
+        self.patcher.start()
+        sys.modules.pop('wifi_manager', None)
+        import wifi_manager
+        self.wifi_manager = wifi_manager
+        self.ticks = FakeTicksTime()
+        self.time_patcher = patch.object(wifi_manager, 'time', self.ticks)
+        self.time_patcher.start()
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_file = os.path.join(directory.name, 'wifi.json')
+        self.sta = self.network.sta
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, channel=6)]
+        self.sta.connect_after_polls = 2
+
+    def tearDown(self):
+        self.time_patcher.stop()
+        self.patcher.stop()
+        sys.modules.pop('wifi_manager', None)
+
+    def make_manager(self):
+        return self.wifi_manager.WifiManager({"Space": "secret"}, cache_file=self.cache_file)
+
+
+class TestWifiCachedConnect(WifiManagerTestCase):
+
+    def test_first_connect_scans_and_saves_the_cache(self):
+        """Test that a scan connect stores SSID, BSSID and channel."""
+        # Arrange
+        manager = self.make_manager()
+
+        # Act
+        connected = manager.connect_wifi()
+
+        # Assert
+        self.assertTrue(connected)
+        self.assertEqual(manager.last_connect_method, 'scan')
+        with open(self.cache_file) as f:
+            cache = json.load(f)
+        self.assertEqual(cache['ssid'], "Space")
+        self.assertEqual(cache['bssid'], LOBBY.hex())
+        self.assertEqual(cache['channel'], 6)
+
+    def test_reconnect_uses_cache_without_scan(self):
+        """Test that a saved access point is connected to directly."""
+        # Arrange
+        self.make_manager().connect_wifi()
+        self.sta.drop_link()
+        scans_before = self.sta.scan_call_count
+        manager = self.make_manager()  # as after a reboot
+
+        # Act
+        connected = manager.connect_wifi()
+
+        # Assert
+        self.assertTrue(connected)
+        self.assertEqual(self.sta.scan_call_count, scans_before)
+        self.assertEqual(self.sta.connect_calls[-1], ("Space", "secret", {'bssid': LOBBY}))
+        self.assertEqual(self.sta.config_values['channel'], 6)
+        self.assertEqual(manager.last_connect_method, 'cached')
+        self.assertEqual(manager.cached_connects, 1)
+
+    def test_cached_connect_waits_for_the_dhcp_lease(self):
+        """Test that a cached connect only reports connected with an address."""
+        # Arrange
+        self.make_manager().connect_wifi()
+        self.sta.drop_link()
+        manager = self.make_manager()
+        addresses = []
+        manager.add_state_listener(lambda step: addresses.append(self.sta.ifconfig()[0]))
+
+        # Act
+        connected = manager.connect_wifi()
+
+        # Assert
+        self.assertTrue(connected)
+        self.assertEqual(manager.last_connect_method, 'cached')
+        self.assertEqual(addresses[-1], '192.168.1.50')
+        self.assertEqual(self.sta.ifconfig_calls, [])
+
+    def test_failed_cached_connect_falls_back_to_scan(self):
+        """Test that a vanished access point falls back to a scan."""
+        # Arrange
+        self.make_manager().connect_wifi()
+        self.sta.drop_link()
+        self.sta.scan_results = [scan_entry("Space", bssid=WORKSHOP, channel=11)]
+        manager = self.make_manager()
+
+        # Act
+        connected = manager.connect_wifi()
+
+        # Assert
+        self.assertTrue(connected)
+        self.assertEqual(manager.last_connect_method, 'scan')
+        self.assertEqual(self.sta.connect_calls[-1], ("Space", "secret", {'bssid': WORKSHOP}))
+        self.assertEqual(manager.cache['bssid'], WORKSHOP.hex())
+        self.assertEqual(manager.cache['channel'], 11)
+
+    def test_time_to_connected_is_recorded(self):
+        """Test that each connect reports how long it took."""
+        # Arrange
+        manager = self.make_manager()
+        self.sta.connect_after_polls = 3
+        started = self.ticks.now
+
+        # Act
+        manager.connect_wifi()
+
+        # Assert
+        self.assertGreater(manager.last_connect_ms, 0)
+        self.assertEqual(manager.last_connect_ms, self.ticks.now - started)
+
+    def test_unknown_cached_ssid_is_ignored(self):
+        """Test that a cache for a network no longer configured is not used."""
+        # Arrange
+        with open(self.cache_file, 'w') as f:
+            json.dump({'ssid': "Old", 'bssid': LOBBY.hex(), 'channel': 1}, f)
+
+        # Act
+        manager = self.make_manager()
+
+        # Assert
+        self.assertIsNone(manager.cache)
+
+
+class TestWifiSupervision(WifiManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.wifi_manager.WifiManager({"Space": "secret"})
+        self.steps = []
+        self.manager.add_state_listener(self.steps.append)
+
+    def test_poll_takes_one_step_without_sleeping(self):
+        """Test that each poll() advances one step and never waits."""
+        # Arrange
+        manager = self.manager
+        self.sta.connect_after_polls = 3
+
+        # Act
+        for _ in range(10):
+            manager.poll()
+
+        # Assert
+        self.assertEqual(self.ticks.now, 10000)
+        self.assertEqual(self.steps, [manager.WIFI_SCAN_START, manager.WIFI_SCANNING,
+                                      manager.WIFI_CONNECTING, manager.WIFI_CONNECTED])
+        self.assertTrue(manager.check_and_reconnect())
+
+    def test_timeout_backs_off_and_retries(self):
+        """Test that a connect timeout waits out a doubling delay before the next attempt."""
+        # Arrange
+        manager = self.manager
+        self.sta.connect_after_polls = None
+        for _ in range(3):
+            manager.poll()
+        self.ticks.now += manager.CONNECTION_TIMEOUT * 1000
+        manager.poll()
+        in_backoff = manager.step
+
+        # Act
+        self.ticks.now += manager.RETRY_DELAY * 1000 - 1
+        manager.poll()
+        still_waiting = manager.step
+        self.ticks.now += 1
+        manager.poll()
+
+        # Assert
+        self.assertEqual(in_backoff, manager.WIFI_BACKOFF)
+        self.assertEqual(still_waiting, manager.WIFI_BACKOFF)
+        self.assertEqual(manager.step, manager.WIFI_SCAN_START)
+        self.assertEqual(manager.retry_delay, 2 * manager.RETRY_DELAY)
+        self.assertEqual(manager.attempts, 1)
+
+    def test_no_known_network_backs_off(self):
+        """Test that a scan without known networks fails the attempt."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Neighbour")]
+
+        # Act
+        for _ in range(3):
+            self.manager.poll()
+
+        # Assert
+        self.assertEqual(self.manager.step, self.manager.WIFI_BACKOFF)
+        self.assertEqual(self.sta.connect_call_count, 0)
+
+    def test_lost_link_is_reconnected(self):
+        """Test that a dropped link starts a new attempt from the connected step."""
+        # Arrange
+        self.assertTrue(self.manager.connect_wifi())
+        self.sta.drop_link()
+
+        # Act
+        connected = self.manager.check_and_reconnect()
+
+        # Assert
+        self.assertFalse(connected)
+        self.assertEqual(self.manager.step, self.manager.WIFI_SCAN_START)
+
+    def test_connect_wifi_returns_false_after_timeout(self):
+        """Test that the blocking wrapper gives up after one failed attempt."""
+        # Arrange
+        self.sta.connect_after_polls = None
+
+        # Act
+        connected = self.manager.connect_wifi()
+
+        # Assert
+        self.assertFalse(connected)
+        self.assertEqual(self.manager.step, self.manager.WIFI_BACKOFF)
+
+
+class TestWifiNetworkSelection(WifiManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.wifi_manager.WifiManager({"Space": "secret", "Space-5G": "secret5"},
+                                                     priorities={"Space-5G": 1})
+
+    def connected_bssid(self):
+        return self.sta.connect_calls[-1][2].get('bssid')
+
+    def test_strongest_known_access_point_wins(self):
+        """Test that RSSI, not scan order, selects the access point."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-85),
+                                 scan_entry("Cafe", rssi=-40),
+                                 scan_entry("Space", bssid=WORKSHOP, rssi=-50)]
+
+        # Act
+        self.manager.connect_wifi()
+
+        # Assert
+        self.assertEqual(self.connected_bssid(), WORKSHOP)
+
+    def test_priority_breaks_near_ties(self):
+        """Test that a configured priority decides between similar signals."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-61),
+                                 scan_entry("Space-5G", bssid=WORKSHOP, rssi=-62)]
+
+        # Act
+        self.manager.connect_wifi()
+
+        # Assert
+        self.assertEqual(self.sta.connect_calls[-1][0], "Space-5G")
+
+    def test_priority_applies_relative_to_the_strongest_signal(self):
+        """Test that a priority wins within the margin of the strongest signal, wherever that lies."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-60),
+                                 scan_entry("Space-5G", bssid=WORKSHOP, rssi=-61)]
+
+        # Act
+        self.manager.connect_wifi()
+
+        # Assert
+        self.assertEqual(self.sta.connect_calls[-1][0], "Space-5G")
+
+    def test_priority_does_not_beat_a_clearly_stronger_signal(self):
+        """Test that a signal beyond the margin wins over a higher priority."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space-5G", bssid=WORKSHOP, rssi=-66),
+                                 scan_entry("Space", bssid=LOBBY, rssi=-61)]
+
+        # Act
+        self.manager.connect_wifi()
+
+        # Assert
+        self.assertEqual(self.sta.connect_calls[-1][0], "Space")
+
+    def test_retry_uses_cached_scan_and_next_access_point(self):
+        """Test that a failed access point is skipped without a rescan."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-50),
+                                 scan_entry("Space", bssid=WORKSHOP, rssi=-70)]
+        self.sta.dead_bssids = {LOBBY}
+        self.assertFalse(self.manager.connect_wifi())
+        self.manager.SCAN_CACHE_TTL = self.manager.CONNECTION_TIMEOUT + self.manager.RETRY_DELAY + 5
+
+        # Act
+        self.ticks.now += self.manager.RETRY_DELAY * 1000
+        connected = self.manager.connect_wifi()
+
+        # Assert
+        self.assertTrue(connected)
+        self.assertEqual(self.connected_bssid(), WORKSHOP)
+        self.assertEqual(self.sta.scan_call_count, 1)
+        self.assertEqual(self.manager.cached_scans, 1)
+
+    def test_expired_scan_cache_rescans(self):
+        """Test that old scan results are not reused."""
+        # Arrange
+        self.manager.connect_wifi()
+        self.sta.drop_link()
+        self.ticks.now += self.manager.SCAN_CACHE_TTL * 1000
+
+        # Act
+        self.manager.connect_wifi()
+
+        # Assert
+        self.assertEqual(self.sta.scan_call_count, 2)
+
+    def test_weak_link_roams_to_stronger_access_point(self):
+        """Test that a link below the threshold moves to a clearly better access point."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-60)]
+        self.manager.connect_wifi()
+        self.sta.rssi = -82
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-82),
+                                 scan_entry("Space", bssid=WORKSHOP, rssi=-58)]
+        self.ticks.now += self.manager.ROAM_CHECK_INTERVAL * 1000
+
+        # Act
+        for _ in range(5):
+            self.manager.poll()
+
+        # Assert
+        self.assertEqual(self.manager.roams, 1)
+        self.assertEqual(self.connected_bssid(), WORKSHOP)
+        self.assertEqual(self.manager.step, self.manager.WIFI_CONNECTED)
+        self.assertEqual(self.manager.last_connect_method, 'roam')
+
+    def test_no_roaming_without_clear_gain(self):
+        """Test that a slightly stronger access point is not worth a switch."""
+        # Arrange
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-60)]
+        self.manager.connect_wifi()
+        self.sta.rssi = -80
+        self.sta.scan_results = [scan_entry("Space", bssid=LOBBY, rssi=-80),
+                                 scan_entry("Space", bssid=WORKSHOP, rssi=-76)]
+        connects = self.sta.connect_call_count
+        self.ticks.now += self.manager.ROAM_CHECK_INTERVAL * 1000
+
+        # Act
+        self.manager.poll()
+
+        # Assert
+        self.assertEqual(self.manager.roams, 0)
+        self.assertEqual(self.sta.connect_call_count, connects)
+        self.assertEqual(self.manager.rssi, -80)
+
+
+if __name__ == '__main__':
+    unittest.main()
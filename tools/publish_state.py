@@ -0,0 +1,86 @@
+"""
+Publish an msb/state payload from a host, in the compact binary format or
+as JSON. Speaks just enough MQTT 3.1.1 (CONNECT, PUBLISH, DISCONNECT) to
+need no client library.
+
+Usage:
+    python3 tools/publish_state.py --host broker --open --until 22:30
+    python3 tools/publish_state.py --host broker --closed --format json
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from state_codec import encode_state  # noqa: E402
+
+
+def _string(value):
+    value = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(value)) + value
+
+
+def _packet(first_byte, body):
+    header = bytearray((first_byte,))
+    size = len(body)
+    while size > 0x7F:
+        header.append((size & 0x7F) | 0x80)
+        size >>= 7
+    header.append(size)
+    return bytes(header) + body
+
+
+def build_payload(state, fmt):
+    if fmt == 'binary':
+        return encode_state(state)
+    return json.dumps(state).encode()
+
+
+def publish(host, port, topic, payload, user=None, password=None, retain=True,
+            client_id="msb-state-publisher", timeout=5):
+    flags = 0x02
+    payload_fields = _string(client_id)
+    if user:
+        flags |= 0xC0
+        payload_fields += _string(user) + _string(password or "")
+    connect = b"\x00\x04MQTT\x04" + bytes((flags,)) + struct.pack("!H", 30) + payload_fields
+
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(_packet(0x10, connect))
+        connack = sock.recv(4)
+        if len(connack) != 4 or connack[0] != 0x20 or connack[3] != 0:
+            raise ConnectionError("Broker refused the connection: {!r}".format(connack))
+        sock.sendall(_packet(0x30 | (1 if retain else 0), _string(topic) + payload))
+        sock.sendall(b"\xe0\x00")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--topic', default='msb/state')
+    state = parser.add_mutually_exclusive_group(required=True)
+    state.add_argument('--open', dest='open', action='store_true')
+    state.add_argument('--closed', dest='open', action='store_false')
+    parser.add_argument('--until', help='closing time, HH:MM')
+    parser.add_argument('--format', choices=('binary', 'json'), default='binary')
+    parser.add_argument('--no-retain', dest='retain', action='store_false')
+    args = parser.parse_args()
+
+    state = {'open': args.open}
+    if args.until:
+        state['openUntil'] = args.until
+    payload = build_payload(state, args.format)
+    publish(args.host, args.port, args.topic, payload, args.user, args.password, args.retain)
+    print("Published {} bytes to {}: {!r}".format(len(payload), args.topic, payload))
+
+
+if __name__ == '__main__':
+    main()